@@ -1,17 +1,23 @@
 import os
-import subprocess
 import sys
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import zipfile
-import urllib.request
-import shutil
-import webbrowser
-import csv
-import json
-
-# Global variable to store the path to ffprobe
-ffprobe_path = 'ffprobe'  # Default to 'ffprobe', assuming it's in PATH
+import queue
+import threading
+
+from videofilter.backends import BackendUnavailable, get_backend
+from videofilter.cache import MetadataCache
+from videofilter.checkpoint import ScanJournal, discard_checkpoint, find_checkpoint, scan_identity
+from videofilter.duplicates import find_duplicates, group_results
+from videofilter.export import PathSink, write_csv, write_failures
+from videofilter.expr import parse_ratio
+from videofilter.probe import DEFAULT_PROBE_WORKERS, is_ffmpeg_installed, install_ffmpeg
+from videofilter.progress import format_progress
+from videofilter.index import MetadataIndex
+from videofilter.scan import parse_criteria, refilter_index, run_scan
+
+# How often (ms) the GUI drains events coming from the scan thread
+SCAN_POLL_INTERVAL_MS = 50
 
 # Function to check and install dependencies
 def check_dependencies():
@@ -23,184 +29,6 @@ def check_dependencies():
         messagebox.showerror("Error", f"Failed to install dependencies: {e}")
         sys.exit(1)
 
-# Function to check if FFmpeg is installed
-def is_ffmpeg_installed():
-    try:
-        subprocess.run([ffprobe_path, '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        return True
-    except FileNotFoundError:
-        return False
-
-# Function to install FFmpeg
-def install_ffmpeg():
-    ffmpeg_url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
-    ffmpeg_zip = "ffmpeg.zip"
-    install_path = os.path.join(os.getcwd(), "ffmpeg")
-
-    try:
-        print("Downloading FFmpeg...")
-        urllib.request.urlretrieve(ffmpeg_url, ffmpeg_zip)
-
-        print("Extracting FFmpeg...")
-        with zipfile.ZipFile(ffmpeg_zip, 'r') as zip_ref:
-            zip_ref.extractall(install_path)
-
-        # Find the bin folder inside the extracted FFmpeg directory
-        extracted_folders = os.listdir(install_path)
-        if not extracted_folders:
-            raise Exception("No files found after extracting FFmpeg.")
-        ffmpeg_root_folder = os.path.join(install_path, extracted_folders[0])
-        ffmpeg_bin = os.path.join(ffmpeg_root_folder, "bin")
-
-        if not os.path.isdir(ffmpeg_bin):
-            raise Exception(f"FFmpeg bin folder not found at {ffmpeg_bin}")
-
-        # Add FFmpeg to PATH
-        os.environ["PATH"] = ffmpeg_bin + os.pathsep + os.environ["PATH"]
-
-        # Update the global ffprobe_path variable
-        global ffprobe_path
-        ffprobe_path = os.path.join(ffmpeg_bin, 'ffprobe.exe')
-
-        # Clean up
-        os.remove(ffmpeg_zip)
-        print("FFmpeg installed and added to PATH.")
-    except Exception as e:
-        raise Exception(f"Failed to install FFmpeg: {e}")
-
-# Updated get_video_info function
-def get_video_info(file_path):
-    try:
-        env = os.environ.copy()  # Copy the environment variables
-        result = subprocess.run(
-            [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
-             'stream=codec_name,width,height,duration,bit_rate,r_frame_rate,display_aspect_ratio,sample_aspect_ratio,color_space,bits_per_raw_sample,pix_fmt', '-of', 'json', file_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            env=env
-        )
-        if result.returncode == 0:
-            ffprobe_data = json.loads(result.stdout)
-            # Extract stream info
-            stream = ffprobe_data['streams'][0]
-            # Now extract the fields with proper handling
-            codec_name = stream.get('codec_name', 'Unknown')
-            width = int(stream.get('width', 0))
-            height = int(stream.get('height', 0))
-            duration = float(stream.get('duration', 0))
-            bit_rate = int(stream.get('bit_rate', 0)) if stream.get('bit_rate') else 0
-            r_frame_rate = stream.get('r_frame_rate', '0/1')
-            display_aspect_ratio = stream.get('display_aspect_ratio', 'Unknown')
-            sample_aspect_ratio = stream.get('sample_aspect_ratio', 'Unknown')
-            color_space = stream.get('color_space', 'Unknown')
-            bits_per_raw_sample = stream.get('bits_per_raw_sample', 'N/A')
-            pix_fmt = stream.get('pix_fmt', 'Unknown')
-
-            # Calculate framerate
-            if r_frame_rate != 'N/A':
-                num, denom = r_frame_rate.split('/')
-                framerate = float(num) / float(denom) if float(denom) != 0 else 0
-            else:
-                framerate = 0
-
-            file_size = os.path.getsize(file_path)
-            # Check if bitrate is variable or constant
-            bitrate_mode = 'Constant' if bit_rate != 0 else 'Variable'
-            # Handle missing bitrate
-            bitrate = bit_rate if bit_rate != 0 else 0
-
-            # Handle bit depth
-            if bits_per_raw_sample != 'N/A' and bits_per_raw_sample.isdigit():
-                bit_depth = int(bits_per_raw_sample)
-            else:
-                # Attempt to infer bit depth from pix_fmt
-                bit_depth = infer_bit_depth_from_pix_fmt(pix_fmt)
-
-            # Infer color space from pix_fmt
-            color_space = infer_color_space_from_pix_fmt(pix_fmt)
-
-            # Calculate display aspect ratio if it's 'Unknown' or '0:1' or 'N/A'
-            if display_aspect_ratio in ['Unknown', '0:1', 'N/A']:
-                gcd = lambda a, b: gcd(b, a % b) if b else a
-                ratio_gcd = gcd(width, height)
-                display_aspect_ratio = f"{width // ratio_gcd}:{height // ratio_gcd}"
-
-            return {
-                'codec': codec_name,
-                'width': width,
-                'height': height,
-                'duration': duration,
-                'bitrate': bitrate,
-                'bitrate_mode': bitrate_mode,
-                'size': file_size,
-                'framerate': framerate,
-                'display_aspect_ratio': display_aspect_ratio,
-                'color_space': color_space,
-                'bit_depth': bit_depth
-            }
-        else:
-            print(f"ffprobe error: {result.stderr}")
-            return None
-    except Exception as e:
-        print(f"Error analyzing file {file_path}: {e}")
-        return None
-
-# Function to infer bit depth from pixel format
-def infer_bit_depth_from_pix_fmt(pix_fmt):
-    # Common pixel formats and their bit depths
-    pix_fmt_bit_depth = {
-        'yuv420p': 8,
-        'yuv422p': 8,
-        'yuv444p': 8,
-        'yuv420p10le': 10,
-        'yuv422p10le': 10,
-        'yuv444p10le': 10,
-        'yuv420p12le': 12,
-        'yuv422p12le': 12,
-        'yuv444p12le': 12,
-        'yuv420p16le': 16,
-        'yuv422p16le': 16,
-        'yuv444p16le': 16,
-        'rgb24': 8,
-        'rgba': 8,
-        'rgb48le': 16,
-        'gbrp': 8,
-        'gbrp10le': 10,
-        'gbrp12le': 12,
-        'gbrp16le': 16,
-        # Add more mappings as needed
-    }
-    return pix_fmt_bit_depth.get(pix_fmt, 0)
-
-# Function to infer color space from pixel format
-def infer_color_space_from_pix_fmt(pix_fmt):
-    # Mapping of pix_fmt to color space
-    pix_fmt_color_space = {
-        'yuv420p': 'YUV',
-        'yuv422p': 'YUV',
-        'yuv444p': 'YUV',
-        'yuv420p10le': 'YUV',
-        'yuv422p10le': 'YUV',
-        'yuv444p10le': 'YUV',
-        'yuv420p12le': 'YUV',
-        'yuv422p12le': 'YUV',
-        'yuv444p12le': 'YUV',
-        'yuv420p16le': 'YUV',
-        'yuv422p16le': 'YUV',
-        'yuv444p16le': 'YUV',
-        'nv12': 'YUV',
-        'rgb24': 'RGB',
-        'rgba': 'RGB',
-        'rgb48le': 'RGB',
-        'gbrp': 'RGB',
-        'gbrp10le': 'RGB',
-        'gbrp12le': 'RGB',
-        'gbrp16le': 'RGB',
-        # Add more mappings as needed
-    }
-    return pix_fmt_color_space.get(pix_fmt, 'Unknown')
-
 # Tooltip class
 class ToolTip:
     def __init__(self, widget, text='widget info'):
@@ -229,12 +57,302 @@ class ToolTip:
         if self.tw:
             self.tw.destroy()
 
+# Columns of the results table; "Group" (the duplicate group of a file) is only shown for duplicate searches
+RESULT_COLUMNS = ("Group", "Name", "Size (MB)", "Format", "Codec", "Bitrate (kbps)", "Bitrate Mode", "Peak (kbps)", "Framerate", "DAR", "Color Space", "Bit Depth", "Audio")
+MATCH_DISPLAY_COLUMNS = RESULT_COLUMNS[1:]
+
+# Function to format one result as the values of a results table row
+def result_row_values(result):
+    file_path = result['path']
+    info = result['info']
+    file_name = os.path.basename(file_path)
+    return (
+        result.get('duplicate_group', ''),
+        file_name,
+        f"{info['size'] / 1_048_576:.2f}",
+        os.path.splitext(file_name)[1].lstrip('.').upper(),
+        info['codec'],
+        f"{info['bitrate'] / 1000:.2f}",
+        info['bitrate_mode'],
+        f"{info['peak_bitrate'] / 1000:.2f}" if info['peak_bitrate'] else '',
+        f"{info['framerate']:.2f}",
+        info['display_aspect_ratio'],
+        info['color_space'],
+        info['bit_depth'],
+        audio_description(info)
+    )
+
+# Function to summarize the first audio stream, e.g. "aac 2ch 48 kHz"
+def audio_description(info):
+    if info['audio_codec'] in ('none', 'Unknown'):
+        return info['audio_codec']
+    return f"{info['audio_codec']} {info['audio_channels']}ch {info['audio_sample_rate'] / 1000:g} kHz"
+
+# Typed sort values of a result's text and number columns; None (unknown) always sorts last
+def text_sort_key(value):
+    return None if value == 'Unknown' else str(value).casefold()
+
+def number_sort_key(value):
+    return value if isinstance(value, (int, float)) else None
+
+# Sort value of each results table column, computed from the result rather than its formatted cell
+RESULT_SORT_KEYS = {
+    "Group": lambda result: result.get('duplicate_group'),
+    "Name": lambda result: os.path.basename(result['path']).casefold(),
+    "Size (MB)": lambda result: result['info']['size'],
+    "Format": lambda result: os.path.splitext(result['path'])[1].lstrip('.').casefold(),
+    "Codec": lambda result: text_sort_key(result['info']['codec']),
+    "Bitrate (kbps)": lambda result: number_sort_key(result['info']['bitrate']),
+    "Bitrate Mode": lambda result: text_sort_key(result['info']['bitrate_mode']),
+    "Peak (kbps)": lambda result: result['info']['peak_bitrate'] or None,
+    "Framerate": lambda result: number_sort_key(result['info']['framerate']),
+    "DAR": lambda result: parse_ratio(result['info']['display_aspect_ratio']),
+    "Color Space": lambda result: text_sort_key(result['info']['color_space']),
+    "Bit Depth": lambda result: number_sort_key(result['info']['bit_depth']),
+    "Audio": lambda result: text_sort_key(result['info']['audio_codec']),
+}
+
+# Virtual results table: the Treeview only holds enough rows ("slots") to fill the window plus a
+# few spare ones, and scrolling re-fills those slots from the result list. Opening, scrolling and
+# adding matches cost the same whether there are a hundred results or a million.
+#
+# Clicking a heading sorts by that column (again to reverse), Shift+click adds it as a further
+# sort column. Sorting works on typed values from sort_keys, computed once per column, and the
+# sorted order of each single column is kept until the results change.
+class ResultsView:
+    # Extra slots below the viewport, so a partly visible last row and keyboard moves have a row to land on
+    BUFFER_ROWS = 5
+
+    def __init__(self, parent, columns, sort_keys=None):
+        self.columns = columns
+        self.display_columns = columns
+        self.sort_keys = sort_keys or {}
+        self.results = []
+        # Result indices in display order, or None for the order of the result list
+        self.order = None
+        # Index (in display order) of the row shown in the first slot
+        self.first = 0
+        self.slots = []
+        self.slot_rows = []
+        # Index of the selected result, kept while its row is scrolled out of view
+        self.selected = None
+        self.row_height = None
+        self.header_height = 0
+        # Sort columns as (column, reverse), most significant first
+        self.sort_spec = []
+        # Sort values per column and sorted orders per (column, reverse), for the current results
+        self.key_columns = {}
+        self.permutations = {}
+
+        self.scrollbar = ttk.Scrollbar(parent, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(parent, columns=columns, show='headings', selectmode='browse',
+                                 yscrollcommand=self.on_tree_scrolled)
+        self.tree.pack(expand=True, fill='both')
+        for col in columns:
+            self.tree.heading(col, text=col, command=(lambda _col=col: self.sort_by(_col)) if col in self.sort_keys else '')
+            self.tree.column(col, anchor='w')
+
+        self.tree.bind("<Configure>", lambda event: self.render())
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Shift-Button-1>", self.on_shift_click)
+
+    def __len__(self):
+        return len(self.results) if self.order is None else len(self.order)
+
+    # Show only these columns (in this order); the others keep their values but are hidden
+    def show_columns(self, columns):
+        self.display_columns = columns
+        self.tree['displaycolumns'] = columns
+
+    def row_index(self, position):
+        return position if self.order is None else self.order[position]
+
+    # Show a new result list (display order is reset)
+    def set_results(self, results):
+        self.results = results
+        self.order = None
+        self.first = 0
+        self.selected = None
+        self.sort_spec = []
+        self.key_columns = {}
+        self.permutations = {}
+        self.update_headings()
+        self.render()
+
+    # Show results appended to the current list since the last call; while sorted they are
+    # listed after the sorted rows until the next sort
+    def refresh(self):
+        if self.order is not None and len(self.order) < len(self.results):
+            self.order.extend(range(len(self.order), len(self.results)))
+        self.render()
+
+    # Drop the row of a result that was deleted from the result list
+    def remove(self, row):
+        if self.order is not None:
+            self.order = [index - (index > row) for index in self.order if index != row]
+        for keys in self.key_columns.values():
+            if row < len(keys):
+                del keys[row]
+        self.permutations = {}
+        self.selected = None
+        self.render()
+
+    # Sort values of a column, extended when results were added since the last call
+    def key_column(self, col):
+        keys = self.key_columns.setdefault(col, [])
+        if len(keys) < len(self.results):
+            keys.extend(map(self.sort_keys[col], self.results[len(keys):]))
+        return keys
+
+    # Stable sort of order (all results by default) on one column, unknown values last.
+    # Full sorts are cached per (column, reverse) and must not be modified.
+    def permutation(self, col, reverse, order=None):
+        keys = self.key_column(col)
+        cacheable = order is None
+        if cacheable:
+            cached = self.permutations.get((col, reverse))
+            if cached is not None and len(cached) == len(self.results):
+                return cached
+            order = range(len(self.results))
+        known = [row for row in order if keys[row] is not None]
+        known.sort(key=keys.__getitem__, reverse=reverse)
+        if len(known) < len(order):
+            known.extend(row for row in order if keys[row] is None)
+        if cacheable:
+            self.permutations[(col, reverse)] = known
+        return known
+
+    # Sort by col alone (a second click reverses it), or with add=True keep the current sort
+    # columns and add col as the least significant one (or reverse it if it is already used)
+    def sort_by(self, col, add=False):
+        if add and self.sort_spec:
+            spec = dict(self.sort_spec)
+            if col in spec:
+                self.sort_spec = [(c, not r if c == col else r) for c, r in self.sort_spec]
+            else:
+                self.sort_spec.append((col, False))
+        else:
+            reverse = self.sort_spec == [(col, False)]
+            self.sort_spec = [(col, reverse)]
+
+        # Stable sorts from the least to the most significant column
+        col, reverse = self.sort_spec[-1]
+        order = self.permutation(col, reverse)
+        for col, reverse in reversed(self.sort_spec[:-1]):
+            order = self.permutation(col, reverse, order)
+        self.order = list(order)
+        self.update_headings()
+        self.render()
+
+    def update_headings(self):
+        positions = {col: (position, reverse) for position, (col, reverse) in enumerate(self.sort_spec, 1)}
+        for col in self.columns:
+            text = col
+            if col in positions:
+                position, reverse = positions[col]
+                text += " \u25bc" if reverse else " \u25b2"
+                if len(self.sort_spec) > 1:
+                    text += str(position)
+            self.tree.heading(col, text=text)
+
+    def on_shift_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != 'heading':
+            return None
+        column = self.tree.identify_column(event.x)
+        col = self.display_columns[int(column.lstrip('#')) - 1]
+        if col in self.sort_keys:
+            self.sort_by(col, add=True)
+        return "break"
+
+    def selected_result(self):
+        if self.selected is None or self.selected >= len(self.results):
+            return None
+        return self.results[self.selected]
+
+    # Number of rows that fit in the window, measured from a rendered row once one exists
+    def visible_rows(self):
+        if self.row_height is None and self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                self.header_height, self.row_height = bbox[1], bbox[3]
+        row_height = self.row_height or 20
+        return max(1, (self.tree.winfo_height() - self.header_height) // row_height)
+
+    def render(self):
+        total = len(self)
+        visible = self.visible_rows()
+        self.first = max(0, min(self.first, total - visible))
+        count = max(0, min(visible + self.BUFFER_ROWS, total - self.first))
+
+        while len(self.slots) < count:
+            self.slots.append(self.tree.insert("", tk.END))
+        if len(self.slots) > count:
+            self.tree.delete(*self.slots[count:])
+            del self.slots[count:]
+
+        self.slot_rows = [self.row_index(self.first + n) for n in range(count)]
+        selected_slot = None
+        for slot, row in zip(self.slots, self.slot_rows):
+            result = self.results[row]
+            self.tree.item(slot, values=result_row_values(result), tags=(result['path'],))
+            if row == self.selected:
+                selected_slot = slot
+        if selected_slot is not None:
+            if self.tree.selection() != (selected_slot,):
+                self.tree.selection_set(selected_slot)
+            self.tree.focus(selected_slot)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        # Slots never scroll inside the Treeview; the virtual position lives in self.first
+        self.tree.yview_moveto(0)
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    # Scrollbar command: same arguments as Treeview.yview
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * len(self))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            self.first += amount * self.visible_rows() if args[2] == 'pages' else amount
+        self.render()
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-3 * delta)
+
+    # The Treeview scrolled its slots itself (keyboard navigation past the last visible row):
+    # turn that into a move of the virtual position
+    def on_tree_scrolled(self, first, last):
+        shift = round(float(first) * len(self.slots))
+        if shift:
+            self.first += shift
+            self.tree.after_idle(self.render)
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self.slots:
+            self.selected = self.slot_rows[self.slots.index(selection[0])]
+
 # GUI Application
 class VideoFilterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Video Filter App")
-        self.root.geometry("700x860")
+        self.root.geometry("700x975")
         self.root.resizable(False, False)  # Disable window resizing
 
         # Title and description
@@ -383,6 +501,58 @@ class VideoFilterApp:
         self.max_bit_depth_entry = tk.Entry(bit_depth_frame, width=15)
         self.max_bit_depth_entry.pack(side='left', padx=5)
 
+        # Filter expression input, ANDed with the checked filters
+        expression_frame = tk.Frame(main_frame)
+        expression_frame.pack(pady=5, fill='x')
+        expression_label = tk.Label(expression_frame, text="Expression:", width=20, anchor='w')
+        expression_label.pack(side='left', padx=5)
+        self.expression_entry = tk.Entry(expression_frame, width=50)
+        self.expression_entry.pack(side='left', padx=5)
+        ToolTip(self.expression_entry, "Optional filter expression, combined with the checked filters, e.g.\n"
+                                       "codec in (prores, hap_q) and height >= 2160 and not bitrate_mode == Variable\n"
+                                       "Supports and, or, not, in (...), like 'glob' and dar ~ 16:9 within 2%.")
+
+        # Probe workers input
+        workers_frame = tk.Frame(main_frame)
+        workers_frame.pack(pady=5, fill='x')
+        workers_label = tk.Label(workers_frame, text="Probe Workers:", width=20, anchor='w')
+        workers_label.pack(side='left', padx=5)
+        self.workers_var = tk.IntVar(value=DEFAULT_PROBE_WORKERS)
+        self.workers_spinbox = tk.Spinbox(workers_frame, from_=1, to=128, textvariable=self.workers_var, width=13)
+        self.workers_spinbox.pack(side='left', padx=5)
+        self.use_processes_var = tk.BooleanVar(value=False)
+        use_processes_checkbox = tk.Checkbutton(workers_frame, text="Use processes", variable=self.use_processes_var)
+        use_processes_checkbox.pack(side='left', padx=5)
+        ToolTip(self.workers_spinbox, "Number of files probed at the same time. Use 1 for a serial scan.")
+        ToolTip(use_processes_checkbox, "Run probes in a process pool instead of a thread pool.")
+        self.use_cache_var = tk.BooleanVar(value=True)
+        use_cache_checkbox = tk.Checkbutton(workers_frame, text="Use cache", variable=self.use_cache_var)
+        use_cache_checkbox.pack(side='left', padx=5)
+        self.incremental_var = tk.BooleanVar(value=False)
+        incremental_checkbox = tk.Checkbutton(workers_frame, text="Incremental", variable=self.incremental_var)
+        incremental_checkbox.pack(side='left', padx=5)
+        clear_cache_button = tk.Button(workers_frame, text="Clear Cache", command=self.clear_cache)
+        clear_cache_button.pack(side='left', padx=5)
+        ToolTip(use_cache_checkbox, "Reuse metadata from previous scans for files that have not changed.")
+        ToolTip(incremental_checkbox, "Remember folder listings and only re-read folders and files that changed since the last incremental scan (needs the cache).")
+        ToolTip(clear_cache_button, "Forget all cached metadata.")
+
+        # Probe backend selection
+        backend_frame = tk.Frame(main_frame)
+        backend_frame.pack(pady=5, fill='x')
+        backend_label = tk.Label(backend_frame, text="Probe Backend:", width=20, anchor='w')
+        backend_label.pack(side='left', padx=5)
+        self.backend_var = tk.StringVar(value='ffprobe')
+        backend_combobox = ttk.Combobox(backend_frame, textvariable=self.backend_var, values=['ffprobe', 'pyav'],
+                                        state='readonly', width=13)
+        backend_combobox.pack(side='left', padx=5)
+        ToolTip(backend_combobox, "ffprobe runs one process per file; pyav reads files in-process (needs PyAV).")
+        self.duplicates_var = tk.BooleanVar(value=False)
+        duplicates_checkbox = tk.Checkbutton(backend_frame, text="Find duplicates", variable=self.duplicates_var)
+        duplicates_checkbox.pack(side='left', padx=5)
+        ToolTip(duplicates_checkbox, "Only list matching files with identical content, grouped, to find copies that can be deleted.\n"
+                                     "Files are compared by size, then by their first and last blocks, and only then read in full.")
+
         # Option to scan for codec, resolution, duration, size, bitrate, or any combination
         options_label = tk.Label(main_frame, text="Filter by:")
         options_label.pack(pady=5)
@@ -451,8 +621,8 @@ class VideoFilterApp:
         ToolTip(resolution_checkbox, "Filter videos by resolution range.")
         ToolTip(duration_checkbox, "Filter videos by duration range (in seconds).")
         ToolTip(size_checkbox, "Filter videos by file size range (in MB).")
-        ToolTip(bitrate_checkbox, "Filter videos by bitrate range (in kbps).")
-        ToolTip(bitrate_mode_checkbox, "Filter videos by bitrate mode (Variable or Constant).")
+        ToolTip(bitrate_checkbox, "Filter videos by bitrate range (in kbps).\nThe bitrate is measured on a few short samples of each file.")
+        ToolTip(bitrate_mode_checkbox, "Filter videos by bitrate mode (Variable or Constant), measured on a few short samples of each file.")
         ToolTip(framerate_checkbox, "Filter videos by framerate range (in fps).")
         ToolTip(dar_checkbox, "Filter videos by Display Aspect Ratio.")
         ToolTip(color_space_checkbox, "Filter videos by Color Space.")
@@ -464,10 +634,21 @@ class VideoFilterApp:
         self.progress_label = tk.Label(root, text="")
         self.progress_label.pack()
 
-        # Run Button
-        run_button = tk.Button(root, text="Run", command=self.filter_videos)
-        run_button.pack(pady=10)
-        ToolTip(run_button, "Click to start filtering videos based on selected criteria.")
+        # Run, Pause and Cancel Buttons
+        scan_buttons_frame = tk.Frame(root)
+        scan_buttons_frame.pack(pady=10)
+        self.run_button = tk.Button(scan_buttons_frame, text="Run", command=self.filter_videos)
+        self.run_button.pack(side='left', padx=5)
+        ToolTip(self.run_button, "Click to start filtering videos based on selected criteria.")
+        self.refilter_button = tk.Button(scan_buttons_frame, text="Re-filter", command=lambda: self.filter_videos(refilter=True), state="disabled")
+        self.refilter_button.pack(side='left', padx=5)
+        ToolTip(self.refilter_button, "Apply the current criteria to the files of the last completed scan without scanning the folder again.")
+        self.pause_button = tk.Button(scan_buttons_frame, text="Pause", command=self.toggle_pause, state="disabled")
+        self.pause_button.pack(side='left', padx=5)
+        ToolTip(self.pause_button, "Pause or resume the running scan.")
+        self.cancel_button = tk.Button(scan_buttons_frame, text="Cancel", command=self.cancel_scan, state="disabled")
+        self.cancel_button.pack(side='left', padx=5)
+        ToolTip(self.cancel_button, "Stop the scan and keep the matches found so far.")
 
         # View Results Button (initially disabled)
         self.view_results_button = tk.Button(root, text="View Results", command=self.view_results)
@@ -484,6 +665,31 @@ class VideoFilterApp:
 
         # Store results
         self.result_files_info = []
+        # Whether result_files_info holds duplicate groups (see find_duplicates)
+        self.duplicate_results = False
+        self.results_window = None
+        self.results_view = None
+
+        # Index of every file seen by the last completed scan, used by Re-filter
+        self.scan_index = None
+        self.running_index = None
+
+        # Scan thread state; resume_event is cleared while paused
+        self.scan_thread = None
+        self.scan_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def clear_cache(self):
+        try:
+            cache = MetadataCache()
+            cache.clear()
+            cache.close()
+            messagebox.showinfo("Cache Cleared", "Cached metadata has been removed.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to clear cache: {e}")
 
     def select_folder(self):
         folder = filedialog.askdirectory()
@@ -533,274 +739,318 @@ class VideoFilterApp:
             "Linear RGB"
         ]
 
-    def filter_videos(self):
+    def filter_videos(self, refilter=False):
         folder = self.folder_path.get()
-        codec = self.codec_var.get()
-        min_resolution = self.min_resolution_entry.get()
-        max_resolution = self.max_resolution_entry.get()
-        min_duration = self.min_duration_entry.get()
-        max_duration = self.max_duration_entry.get()
-        min_size = self.min_size_entry.get()
-        max_size = self.max_size_entry.get()
-        min_bitrate = self.min_bitrate_entry.get()
-        max_bitrate = self.max_bitrate_entry.get()
-        bitrate_mode = self.bitrate_mode_var.get()
-        min_framerate = self.min_framerate_entry.get()
-        max_framerate = self.max_framerate_entry.get()
-        dar = self.dar_entry.get()
-        color_space = self.color_space_var.get()
-        min_bit_depth = self.min_bit_depth_entry.get()
-        max_bit_depth = self.max_bit_depth_entry.get()
-        scan_options = self.scan_options
+        form = {
+            'options': {name: var.get() for name, var in self.scan_options.items()},
+            'codec': self.codec_var.get(),
+            'min_resolution': self.min_resolution_entry.get(),
+            'max_resolution': self.max_resolution_entry.get(),
+            'min_duration': self.min_duration_entry.get(),
+            'max_duration': self.max_duration_entry.get(),
+            'min_size': self.min_size_entry.get(),
+            'max_size': self.max_size_entry.get(),
+            'min_bitrate': self.min_bitrate_entry.get(),
+            'max_bitrate': self.max_bitrate_entry.get(),
+            'bitrate_mode': self.bitrate_mode_var.get(),
+            'min_framerate': self.min_framerate_entry.get(),
+            'max_framerate': self.max_framerate_entry.get(),
+            'dar': self.dar_entry.get(),
+            'color_space': self.color_space_var.get(),
+            'min_bit_depth': self.min_bit_depth_entry.get(),
+            'max_bit_depth': self.max_bit_depth_entry.get(),
+            'expression': self.expression_entry.get()
+        }
 
         if not folder:
             messagebox.showerror("Error", "Please select a folder.")
             return
 
-        if scan_options['codec'].get() and not codec:
-            messagebox.showerror("Error", "Please specify a codec.")
+        # Validate and convert the criteria (same rules as the command line)
+        try:
+            criteria = parse_criteria(form)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        if scan_options['resolution'].get() and not (min_resolution or max_resolution):
-            messagebox.showerror("Error", "Please specify minimum and/or maximum resolution.")
+        # Probe workers
+        try:
+            workers = int(self.workers_var.get())
+            if workers < 1:
+                raise ValueError
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Invalid number of probe workers.")
             return
+        use_processes = self.use_processes_var.get()
 
-        if scan_options['duration'].get():
-            try:
-                min_duration = float(min_duration) if min_duration else 0
-                max_duration = float(max_duration) if max_duration else float('inf')
-            except ValueError:
-                messagebox.showerror("Error", "Invalid duration values.")
-                return
-        else:
-            min_duration = 0
-            max_duration = float('inf')
-
-        if scan_options['size'].get():
-            try:
-                min_size = float(min_size) * 1_048_576 if min_size else 0  # Convert MB to bytes
-                max_size = float(max_size) * 1_048_576 if max_size else float('inf')
-            except ValueError:
-                messagebox.showerror("Error", "Invalid file size values.")
-                return
-        else:
-            min_size = 0
-            max_size = float('inf')
-
-        if scan_options['bitrate'].get():
+        # The default ffprobe backend is checked at startup; others are checked before each scan
+        backend = None
+        if self.backend_var.get() != 'ffprobe':
             try:
-                min_bitrate = float(min_bitrate) * 1000 if min_bitrate else 0  # Convert kbps to bps
-                max_bitrate = float(max_bitrate) * 1000 if max_bitrate else float('inf')
-            except ValueError:
-                messagebox.showerror("Error", "Invalid bitrate values.")
+                backend = get_backend(self.backend_var.get())
+                backend.check()
+            except BackendUnavailable as e:
+                messagebox.showerror("Error", str(e))
                 return
-        else:
-            min_bitrate = 0
-            max_bitrate = float('inf')
 
-        # Framerate inputs
-        if scan_options['framerate'].get():
-            try:
-                min_framerate = float(min_framerate) if min_framerate else 0
-                max_framerate = float(max_framerate) if max_framerate else float('inf')
-            except ValueError:
-                messagebox.showerror("Error", "Invalid framerate values.")
-                return
+        # Re-filter answers from the index of the last completed scan of the same folder
+        if refilter and self.scan_index is not None and self.scan_index.folder == folder:
+            index = self.scan_index
         else:
-            min_framerate = 0
-            max_framerate = float('inf')
-
-        # Bit Depth inputs
-        if scan_options['bit_depth'].get():
+            refilter = False
+            index = MetadataIndex(folder)
+        self.running_index = index
+
+        # Scans are checkpointed; offer to resume an interrupted scan of the same folder and criteria
+        journal = None
+        if not refilter:
+            identity = scan_identity(folder, criteria)
+            checkpoint = find_checkpoint(identity)
+            resume = checkpoint is not None and messagebox.askyesno(
+                "Resume Scan",
+                f"A scan of this folder with the same criteria was interrupted after {checkpoint['files']} files. "
+                "Resume it?")
+            if checkpoint is not None and not resume:
+                discard_checkpoint(identity)
             try:
-                min_bit_depth = int(min_bit_depth) if min_bit_depth else 0
-                max_bit_depth = int(max_bit_depth) if max_bit_depth else float('inf')
-            except ValueError:
-                messagebox.showerror("Error", "Invalid bit depth values.")
-                return
-        else:
-            min_bit_depth = 0
-            max_bit_depth = float('inf')
-
-        # Resolution inputs
-        if scan_options['resolution'].get():
-            # Min resolution
-            if min_resolution:
-                try:
-                    min_width, min_height = map(int, min_resolution.lower().split('x'))
-                except ValueError:
-                    messagebox.showerror("Error", "Invalid minimum resolution format. Use 'WIDTHxHEIGHT'.")
-                    return
-            else:
-                min_width, min_height = 0, 0
-            # Max resolution
-            if max_resolution:
-                try:
-                    max_width, max_height = map(int, max_resolution.lower().split('x'))
-                except ValueError:
-                    messagebox.showerror("Error", "Invalid maximum resolution format. Use 'WIDTHxHEIGHT'.")
-                    return
-            else:
-                max_width, max_height = float('inf'), float('inf')
-        else:
-            min_width, min_height = 0, 0
-            max_width, max_height = float('inf'), float('inf')
-
-        # Display Aspect Ratio
-        if scan_options['dar'].get():
-            if dar:
-                dar = dar.strip()
-            else:
-                messagebox.showerror("Error", "Please specify a Display Aspect Ratio.")
+                journal = ScanJournal(identity, resume=resume)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to write the scan checkpoint: {e}")
                 return
-        else:
-            dar = None
-
-        # Color Space
-        if scan_options['color_space'].get():
-            if color_space == "Any":
-                color_space = None
-        else:
-            color_space = None
-
-        # Collect all video files
-        video_files = []
-        for root_dir, _, files in os.walk(folder):
-            for file in files:
-                if file.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv')):
-                    file_path = os.path.join(root_dir, file)
-                    video_files.append(file_path)
-
-        total_files = len(video_files)
-        if total_files == 0:
-            messagebox.showinfo("No Videos Found", "No video files found in the selected folder.")
-            return
-
-        # Configure progress bar
-        self.progress['maximum'] = total_files
-        self.progress['value'] = 0
-        self.progress_label.config(text="Processing videos...")
-        self.root.update_idletasks()
 
         # Clear previous results
+        duplicates = self.duplicates_var.get()
         self.result_files_info = []
+        self.duplicate_results = duplicates
+        self.refresh_results_tree()
 
-        # Search for videos
-        for idx, file_path in enumerate(video_files, 1):
-            info = get_video_info(file_path)
-            if info:
-                matches = True
-
-                if scan_options['codec'].get() and codec and info['codec'] != codec:
-                    matches = False
-
-                if scan_options['resolution'].get() and (
-                    info['width'] < min_width or info['width'] > max_width or
-                    info['height'] < min_height or info['height'] > max_height
-                ):
-                    matches = False
-
-                if scan_options['duration'].get() and not (min_duration <= info['duration'] <= max_duration):
-                    matches = False
-
-                if scan_options['size'].get() and not (min_size <= info['size'] <= max_size):
-                    matches = False
-
-                if scan_options['bitrate'].get() and not (min_bitrate <= info['bitrate'] <= max_bitrate):
-                    matches = False
-
-                if scan_options['bitrate_mode'].get():
-                    if bitrate_mode != "Any" and info['bitrate_mode'].lower() != bitrate_mode.lower():
-                        matches = False
-
-                if scan_options['framerate'].get() and not (min_framerate <= info['framerate'] <= max_framerate):
-                    matches = False
-
-                if scan_options['dar'].get():
-                    if dar and info['display_aspect_ratio'] != dar:
-                        matches = False
-
-                if scan_options['color_space'].get():
-                    if color_space and info['color_space'].lower() != color_space.lower():
-                        matches = False
+        # Configure progress bar
+        self.progress['value'] = 0
+        self.progress_label.config(text="Collecting video files...")
+        self.set_scanning(True)
+
+        # Walk and probe in a background thread; it reports back through scan_queue
+        self.scan_queue = queue.Queue()
+        self.cancel_event.clear()
+        self.resume_event.set()
+        self.scan_thread = threading.Thread(
+            target=self.scan_worker,
+            args=(folder, criteria, workers, use_processes, self.use_cache_var.get(),
+                  self.use_cache_var.get() and self.incremental_var.get(), index, refilter, backend, duplicates,
+                  journal),
+            daemon=True
+        )
+        self.scan_thread.start()
+        self.root.after(SCAN_POLL_INTERVAL_MS, self.poll_scan_queue)
+
+    # Runs in the scan thread: must not touch Tk widgets or variables
+    def scan_worker(self, folder, criteria, workers, use_processes, use_cache, incremental=False, index=None, refilter=False,
+                    backend=None, duplicates=False, journal=None):
+        # An interrupted scan keeps its journal so the next run can resume it
+        scan_complete = False
+        try:
+            cache = MetadataCache() if use_cache else None
+            # Matches are appended to output.txt as they are found, so a crash keeps what was found so far.
+            # Once the scan is over the file is rewritten in walk order (duplicates are only known then).
+            output = PathSink("output.txt")
+            # Files that could not be probed (corrupt, or ffprobe timed out) are listed in failed.txt
+            failures = []
 
-                if scan_options['bit_depth'].get() and not (min_bit_depth <= info['bit_depth'] <= max_bit_depth):
-                    matches = False
+            def on_match(result):
+                output.write(result)
+                self.scan_queue.put(('match', result))
 
-                if matches:
-                    self.result_files_info.append({'path': file_path, 'info': info})
+            try:
+                if refilter:
+                    results, cancelled, total_files = refilter_index(
+                        index, criteria, workers, use_processes, cache,
+                        on_total=lambda total: self.scan_queue.put(('total', total)),
+                        on_progress=lambda progress: self.scan_queue.put(('progress', progress)),
+                        cancel_event=self.cancel_event,
+                        resume_event=self.resume_event,
+                        backend=backend,
+                        on_failure=lambda *failure: failures.append(failure)
+                    )
+                else:
+                    results, cancelled, total_files = run_scan(
+                        folder, criteria, workers, use_processes, cache,
+                        on_total=lambda total: self.scan_queue.put(('total', total)),
+                        on_match=None if duplicates else on_match,
+                        on_progress=lambda progress: self.scan_queue.put(('progress', progress)),
+                        cancel_event=self.cancel_event,
+                        resume_event=self.resume_event,
+                        incremental=incremental,
+                        index=index,
+                        backend=backend,
+                        on_failure=lambda *failure: failures.append(failure),
+                        journal=journal
+                    )
+                    scan_complete = not cancelled
+                if duplicates:
+                    groups = []
+                    if not cancelled:
+                        groups, cancelled = find_duplicates(
+                            results, cache=cache,
+                            on_progress=lambda progress: self.scan_queue.put(('hash_progress', progress)),
+                            cancel_event=self.cancel_event,
+                            resume_event=self.resume_event
+                        )
+                    results = group_results(groups)
+                output.close()
+                with PathSink("output.txt.tmp") as ordered:
+                    ordered.write_all(results)
+                os.replace("output.txt.tmp", "output.txt")
+                if failures:
+                    write_failures(failures, "failed.txt")
+            finally:
+                if cache is not None:
+                    cache.close()
+                output.close()
+
+            self.scan_queue.put(('done', results, cancelled, len(failures)))
+        except Exception as e:
+            self.scan_queue.put(('error', str(e)))
+        finally:
+            if journal is not None:
+                journal.close(complete=scan_complete)
+
+    # Runs on the Tk thread: apply everything the scan thread reported since the last poll
+    def poll_scan_queue(self):
+        progress = None
+        new_matches = []
+        finished = None
+        try:
+            while finished is None:
+                event = self.scan_queue.get_nowait()
+                if event[0] == 'total':
+                    self.progress['maximum'] = max(event[1], 1)
+                    self.total_files = event[1]
+                    self.walk_finished = True
+                elif event[0] == 'progress':
+                    # Coalesced by the scan (about 10 per second): only the latest one matters
+                    progress = event[1]
+                    if not self.walk_finished:
+                        # The walk is still running: scale the bar to the estimated total
+                        self.total_files = progress['total']
+                        self.progress['maximum'] = max(progress['total'], 1)
+                elif event[0] == 'hash_progress':
+                    # Duplicate search after the scan: the bar restarts for the files being compared
+                    progress = dict(event[1], action="Comparing")
+                    self.progress['maximum'] = max(progress['total'], 1)
+                elif event[0] == 'match':
+                    new_matches.append(event[1])
+                else:
+                    finished = event
+        except queue.Empty:
+            pass
+
+        if new_matches:
+            self.result_files_info.extend(new_matches)
+            if self.results_view is not None:
+                self.results_view.refresh()
+            self.view_results_button.config(state="normal")
+
+        if progress is not None:
+            self.progress['value'] = progress['done']
+            self.progress_label.config(text=format_progress(progress, progress.get('action', "Processing")))
+
+        if finished is None:
+            self.root.after(SCAN_POLL_INTERVAL_MS, self.poll_scan_queue)
+            return
 
-            # Update progress bar
-            self.progress['value'] = idx
-            self.progress.update_idletasks()
-            self.progress_label.config(text=f"Processing {idx}/{total_files} files...")
-            self.root.update_idletasks()
+        if self.running_index is not None and self.running_index.complete:
+            self.scan_index = self.running_index
+        self.set_scanning(False)
+        if finished[0] == 'error':
+            self.progress_label.config(text="Processing failed.")
+            messagebox.showerror("Error", f"Scan failed: {finished[1]}")
+            return
 
-        # Save results to output.txt
-        with open("output.txt", "w") as f:
-            for result in self.result_files_info:
-                f.write(result['path'] + "\n")
+        _, results, cancelled, failure_count = finished
+        failed_note = f" {failure_count} files could not be read (listed in failed.txt)." if failure_count else ""
+        if not cancelled and self.total_files == 0:
+            self.progress_label.config(text="")
+            messagebox.showinfo("No Videos Found", "No video files found in the selected folder.")
+            return
 
-        self.progress_label.config(text="Processing completed.")
-        messagebox.showinfo("Completed", f"Found {len(self.result_files_info)} matching videos. Results saved to output.txt.")
+        self.result_files_info = results
+        self.refresh_results_tree()
+        if cancelled:
+            self.progress_label.config(text="Processing cancelled.")
+            messagebox.showinfo("Cancelled", f"Scan cancelled. Found {len(results)} matching videos so far. Results saved to output.txt.{failed_note}")
+        elif self.duplicate_results:
+            # Group numbers run from 1 in the order of the results
+            group_count = results[-1]['duplicate_group'] if results else 0
+            self.progress_label.config(text="Processing completed.")
+            messagebox.showinfo("Completed", f"Found {group_count} groups of duplicates ({len(results)} files). Results saved to output.txt.{failed_note}")
+        else:
+            self.progress_label.config(text="Processing completed.")
+            messagebox.showinfo("Completed", f"Found {len(results)} matching videos. Results saved to output.txt.{failed_note}")
 
         # Enable View Results button
-        self.view_results_button.config(state="normal")
+        if results:
+            self.view_results_button.config(state="normal")
+
+    def set_scanning(self, scanning):
+        self.run_button.config(state="disabled" if scanning else "normal")
+        self.refilter_button.config(state="normal" if not scanning and self.scan_index is not None else "disabled")
+        self.pause_button.config(state="normal" if scanning else "disabled", text="Pause")
+        self.cancel_button.config(state="normal" if scanning else "disabled")
+        if scanning:
+            self.total_files = 0
+            self.walk_finished = False
+            self.view_results_button.config(state="disabled")
+
+    def toggle_pause(self):
+        if self.resume_event.is_set():
+            self.resume_event.clear()
+            self.pause_button.config(text="Resume")
+            self.progress_label.config(text=self.progress_label.cget("text") + " Paused.")
+        else:
+            self.resume_event.set()
+            self.pause_button.config(text="Pause")
+
+    def cancel_scan(self):
+        self.cancel_event.set()
+        # Wake the scan thread if it is paused so it can stop
+        self.resume_event.set()
+        self.pause_button.config(state="disabled")
+        self.cancel_button.config(state="disabled")
+        self.progress_label.config(text="Cancelling...")
+
+    def on_close(self):
+        self.cancel_event.set()
+        self.resume_event.set()
+        self.root.destroy()
 
     def view_results(self):
         if not self.result_files_info:
             messagebox.showinfo("No Results", "No matching videos to display.")
             return
 
+        # Reuse the results window if it is already open; it keeps receiving matches during a scan
+        if self.results_window is not None:
+            self.results_window.lift()
+            return
+
         # Create a new top-level window
         results_window = tk.Toplevel(self.root)
         results_window.title("Filtered Videos")
         results_window.geometry("1000x600")
 
-        # Create a scrollbar
-        scrollbar = ttk.Scrollbar(results_window)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        # Create a Treeview widget
-        columns = ("Name", "Size (MB)", "Format", "Codec", "Bitrate (kbps)", "Bitrate Mode", "Framerate", "DAR", "Color Space", "Bit Depth")
-        tree = ttk.Treeview(results_window, columns=columns, show='headings', yscrollcommand=scrollbar.set)
-        tree.pack(expand=True, fill='both')
+        # Buttons go first so the table takes the remaining space
+        buttons_frame = tk.Frame(results_window)
+        buttons_frame.pack(side=tk.BOTTOM, pady=10)
 
-        # Configure the scrollbar
-        scrollbar.config(command=tree.yview)
+        # Virtual table: rows are only created for the visible part of the results
+        view = ResultsView(results_window, RESULT_COLUMNS, sort_keys=RESULT_SORT_KEYS)
+        tree = view.tree
+        view.show_columns(RESULT_COLUMNS if self.duplicate_results else MATCH_DISPLAY_COLUMNS)
+        view.set_results(self.result_files_info)
 
-        # Define headings
-        for col in columns:
-            tree.heading(col, text=col, command=lambda _col=col: self.treeview_sort_column(tree, _col, False))
-            tree.column(col, anchor='w')
-
-        # Insert data into the treeview
-        for result in self.result_files_info:
-            file_path = result['path']
-            info = result['info']
-            file_name = os.path.basename(file_path)
-            file_size_mb = f"{info['size'] / 1_048_576:.2f}"
-            file_format = os.path.splitext(file_name)[1].lstrip('.').upper()
-            codec = info['codec']
-            bitrate_kbps = f"{info['bitrate'] / 1000:.2f}"
-            bitrate_mode = info['bitrate_mode']
-            framerate = f"{info['framerate']:.2f}"
-            dar = info['display_aspect_ratio']
-            color_space = info['color_space']
-            bit_depth = info['bit_depth']
-
-            tree.insert("", tk.END, values=(
-                file_name,
-                file_size_mb,
-                file_format,
-                codec,
-                bitrate_kbps,
-                bitrate_mode,
-                framerate,
-                dar,
-                color_space,
-                bit_depth
-            ), tags=(file_path,))
+        self.results_window = results_window
+        self.results_view = view
+        results_window.bind("<Destroy>", self.on_results_window_destroy)
 
         # Bind double-click event to open file
         def on_double_click(event):
@@ -812,80 +1062,82 @@ class VideoFilterApp:
         tree.bind("<Double-1>", on_double_click)
 
         # Add buttons
-        buttons_frame = tk.Frame(results_window)
-        buttons_frame.pack(pady=10)
-
-        open_file_button = tk.Button(buttons_frame, text="Open File", command=lambda: self.open_selected_file(tree))
+        open_file_button = tk.Button(buttons_frame, text="Open File", command=lambda: self.open_selected_file(view))
         open_file_button.pack(side="left", padx=5)
 
-        open_folder_button = tk.Button(buttons_frame, text="Open Containing Folder", command=lambda: self.open_selected_folder(tree))
+        open_folder_button = tk.Button(buttons_frame, text="Open Containing Folder", command=lambda: self.open_selected_folder(view))
         open_folder_button.pack(side="left", padx=5)
 
-        copy_button = tk.Button(buttons_frame, text="Copy File", command=lambda: self.copy_selected_file(tree))
+        copy_button = tk.Button(buttons_frame, text="Copy File", command=lambda: self.copy_selected_file(view))
         copy_button.pack(side="left", padx=5)
 
-        delete_button = tk.Button(buttons_frame, text="Delete File", command=lambda: self.delete_selected_file(tree))
+        delete_button = tk.Button(buttons_frame, text="Delete File", command=lambda: self.delete_selected_file(view))
         delete_button.pack(side="left", padx=5)
 
         export_button = tk.Button(buttons_frame, text="Export to CSV", command=lambda: self.export_to_csv())
         export_button.pack(side="left", padx=5)
 
-    def treeview_sort_column(self, tv, col, reverse):
-        # Get the data to sort
-        data_list = [(tv.set(k, col), k) for k in tv.get_children('')]
-        # Try to convert data to float for numerical sorting
-        try:
-            data_list.sort(key=lambda t: float(t[0]), reverse=reverse)
-        except ValueError:
-            data_list.sort(reverse=reverse)
-        # Rearrange items in sorted positions
-        for index, (val, k) in enumerate(data_list):
-            tv.move(k, '', index)
-        # Reverse sort next time
-        tv.heading(col, command=lambda: self.treeview_sort_column(tv, col, not reverse))
-
-    def open_selected_file(self, tree):
-        selected_item = tree.selection()
-        if not selected_item:
+    # Show result_files_info again in the open results table (e.g. after a scan finishes in walk order)
+    def refresh_results_tree(self):
+        if self.results_view is None:
+            return
+        self.results_view.show_columns(RESULT_COLUMNS if self.duplicate_results else MATCH_DISPLAY_COLUMNS)
+        self.results_view.set_results(self.result_files_info)
+
+    def on_results_window_destroy(self, event):
+        if event.widget is self.results_window:
+            self.results_window = None
+            self.results_view = None
+
+    def open_selected_file(self, view):
+        selected = view.selected_result()
+        if selected is None:
             messagebox.showwarning("No Selection", "Please select a file.")
             return
-        file_path = tree.item(selected_item[0], 'tags')[0]
+        file_path = selected['path']
         os.startfile(file_path)
 
-    def open_selected_folder(self, tree):
-        selected_item = tree.selection()
-        if not selected_item:
+    def open_selected_folder(self, view):
+        selected = view.selected_result()
+        if selected is None:
             messagebox.showwarning("No Selection", "Please select a file.")
             return
-        file_path = tree.item(selected_item[0], 'tags')[0]
+        file_path = selected['path']
         folder_path = os.path.dirname(file_path)
         os.startfile(folder_path)
 
-    def copy_selected_file(self, tree):
-        selected_item = tree.selection()
-        if not selected_item:
+    def copy_selected_file(self, view):
+        selected = view.selected_result()
+        if selected is None:
             messagebox.showwarning("No Selection", "Please select a file.")
             return
-        file_path = tree.item(selected_item[0], 'tags')[0]
+        file_path = selected['path']
         destination = filedialog.askdirectory(title="Select Destination Folder")
         if destination:
+            import shutil
+
             try:
                 shutil.copy(file_path, destination)
                 messagebox.showinfo("Success", f"File copied to {destination}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to copy file: {e}")
 
-    def delete_selected_file(self, tree):
-        selected_item = tree.selection()
-        if not selected_item:
+    def delete_selected_file(self, view):
+        selected = view.selected_result()
+        if selected is None:
             messagebox.showwarning("No Selection", "Please select a file.")
             return
-        file_path = tree.item(selected_item[0], 'tags')[0]
+        # The view shows result_files_info, so its selected index is the row in that list
+        row = view.selected
+        file_path = selected['path']
         confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {os.path.basename(file_path)}?")
         if confirm:
             try:
                 os.remove(file_path)
-                tree.delete(selected_item[0])
+                del self.result_files_info[row]
+                view.remove(row)
+                if self.scan_index is not None:
+                    self.scan_index.discard(file_path)
                 messagebox.showinfo("Deleted", "File deleted successfully.")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete file: {e}")
@@ -901,32 +1153,14 @@ class VideoFilterApp:
         if file_path:
             try:
                 with open(file_path, mode='w', newline='', encoding='utf-8') as csv_file:
-                    fieldnames = [
-                        'File Path', 'File Name', 'Size (MB)', 'Format', 'Codec',
-                        'Bitrate (kbps)', 'Bitrate Mode', 'Framerate', 'DAR', 'Color Space', 'Bit Depth'
-                    ]
-                    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for result in self.result_files_info:
-                        info = result['info']
-                        writer.writerow({
-                            'File Path': result['path'],
-                            'File Name': os.path.basename(result['path']),
-                            'Size (MB)': f"{info['size'] / 1_048_576:.2f}",
-                            'Format': os.path.splitext(result['path'])[1].lstrip('.').upper(),
-                            'Codec': info['codec'],
-                            'Bitrate (kbps)': f"{info['bitrate'] / 1000:.2f}",
-                            'Bitrate Mode': info['bitrate_mode'],
-                            'Framerate': f"{info['framerate']:.2f}",
-                            'DAR': info['display_aspect_ratio'],
-                            'Color Space': info['color_space'],
-                            'Bit Depth': info['bit_depth']
-                        })
+                    write_csv(self.result_files_info, csv_file, duplicates=self.duplicate_results)
                 messagebox.showinfo("Export Successful", f"Results exported to {file_path}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to export results: {e}")
 
     def open_website(self):
+        import webbrowser
+
         webbrowser.open("https://clement.business")
 
 # Check dependencies and run the application
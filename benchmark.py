@@ -0,0 +1,399 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from videofilter.backends import FFprobeBackend, FakeBackend
+from videofilter.cache import MetadataCache
+from videofilter.export import write_csv
+from videofilter.probe import DEFAULT_PROBE_WORKERS, get_video_info
+from videofilter.scan import VIDEO_EXTENSIONS, parse_criteria, run_scan
+from videofilter.timing import ScanTimings, summarize
+
+# Offline benchmark of the scan pipeline: builds a synthetic folder tree of fake video files and
+# probes it with a stub ffprobe (or the in-process fake backend) that returns canned metadata after a
+# configurable delay, so results are reproducible without FFmpeg or real media, e.g. in CI:
+#
+#   python benchmark.py --files 10000 --latency 0.005 -o bench.json
+#   python benchmark.py --files 10000 --latency 0.005 --baseline bench.json
+#
+# Measures: scan (walk + probe + filter, like the Run button, without and with the metadata cache),
+# get_video_info latency, results table work (row formatting, sort keys, and the virtual table
+# when a display is available) and CSV export. Startup is timed in fresh processes: importing the
+# command line, time to the first streamed result (with and without the ffprobe found by an
+# earlier run in the config cache) and time to the first drawn window of VFAPP.py.
+
+# Extensions in a generated corpus; about video_share of the files get a video extension
+OTHER_EXTENSIONS = ('.jpg', '.txt', '.wav', '.srt', '.json')
+
+# Manifest written at the root of a corpus; a corpus with the same settings is reused
+CORPUS_MANIFEST = '.videofilter-corpus.json'
+
+# Scan filter used by default: every probed file matches, so the rendering and export
+# benchmarks get one result per video file
+DEFAULT_WHERE = "width >= 0"
+
+STUB_SCRIPT = '''import json
+import sys
+import time
+
+sys.path.insert(0, {root!r})
+from videofilter.backends import FakeBackend
+
+# Stub ffprobe generated by benchmark.py: canned metadata derived from the file name
+if '-version' in sys.argv:
+    print("ffprobe version stub (videofilter benchmark)")
+    sys.exit(0)
+time.sleep({latency!r})
+media = FakeBackend(error_rate={error_rate!r}).probe_file(sys.argv[-1])
+if media is None:
+    sys.stderr.write(sys.argv[-1] + ": Invalid data found when processing input\\n")
+    sys.exit(1)
+json.dump(media, sys.stdout)
+'''
+
+WINDOW_SCRIPT = '''import sys
+import tkinter as tk
+
+sys.path.insert(0, {root!r})
+import VFAPP
+from videofilter import probe
+
+# Startup of VFAPP.py up to its first drawn window, generated by benchmark.py
+probe.ffprobe_path = {ffprobe!r}
+if not probe.is_ffmpeg_installed({config_path!r}):
+    sys.exit(1)
+try:
+    root = tk.Tk()
+except tk.TclError:
+    sys.exit(2)
+app = VFAPP.VideoFilterApp(root)
+root.update()
+print("ready", flush=True)
+root.destroy()
+'''
+
+# Function to create (or reuse) a synthetic corpus of files under root: nested folders of
+# files_per_dir files, fanout subfolders per level, small files of random size. Returns the manifest.
+def generate_corpus(root, files, files_per_dir=50, fanout=8, video_share=0.8, max_size=4096, seed=0):
+    settings = {'files': files, 'files_per_dir': files_per_dir, 'fanout': fanout,
+                'video_share': video_share, 'max_size': max_size, 'seed': seed}
+    manifest_path = os.path.join(root, CORPUS_MANIFEST)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['settings'] == settings:
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rng = random.Random(seed)
+    videos = 0
+    folders = set()
+    started = time.perf_counter()
+    for number in range(files):
+        # Folder number in base fanout gives the nesting, e.g. 123 -> d1/d2/d3
+        folder = number // files_per_dir
+        parts = []
+        while True:
+            folder, digit = divmod(folder, fanout)
+            parts.append(f"d{digit}")
+            if not folder:
+                break
+        directory = os.path.join(root, *reversed(parts))
+        if directory not in folders:
+            os.makedirs(directory, exist_ok=True)
+            folders.add(directory)
+        if rng.random() < video_share:
+            extension = rng.choice(VIDEO_EXTENSIONS)
+            videos += 1
+        else:
+            extension = rng.choice(OTHER_EXTENSIONS)
+        with open(os.path.join(directory, f"clip_{number:07d}{extension}"), 'wb') as f:
+            f.truncate(rng.randint(256, max_size))
+
+    manifest = {'settings': settings, 'videos': videos, 'folders': len(folders),
+                'generated_in': time.perf_counter() - started}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+# Function to write the stub ffprobe into directory; returns the path to run
+def write_stub_ffprobe(directory, latency=0.0, error_rate=0.0):
+    os.makedirs(directory, exist_ok=True)
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = STUB_SCRIPT.format(root=root, latency=latency, error_rate=error_rate)
+    if os.name == 'nt':
+        script_path = os.path.join(directory, 'ffprobe_stub.py')
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(script)
+        path = os.path.join(directory, 'ffprobe.cmd')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'@"{sys.executable}" "{script_path}" %*\n')
+    else:
+        path = os.path.join(directory, 'ffprobe')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n" + script)
+        os.chmod(path, 0o755)
+    return path
+
+# Function to run measure() repeat times; returns the best time and the value of the last run
+def best_of(repeat, measure):
+    times = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = measure()
+        times.append(time.perf_counter() - started)
+    return min(times), value
+
+def bench_scan(corpus, criteria, backend, workers, use_processes, cache=None):
+    timer = ScanTimings()
+    results, _, total_files = run_scan(corpus, criteria, workers, use_processes, cache, backend=backend, timer=timer)
+    timer.finish()
+    return results, total_files, timer.report()
+
+def bench_get_video_info(paths, backend):
+    latencies = []
+    for path in paths:
+        started = time.perf_counter()
+        get_video_info(path, backend)
+        latencies.append(time.perf_counter() - started)
+    stats = summarize(latencies)
+    stats.pop('histogram', None)
+    return stats
+
+# Results table work that does not need a display: formatting every row (what inserting every row
+# used to cost) and computing and sorting each column's sort keys
+def bench_table_data(results):
+    from VFAPP import RESULT_SORT_KEYS, result_row_values
+
+    measurements = {}
+    started = time.perf_counter()
+    for result in results:
+        result_row_values(result)
+    measurements['format_all_rows'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in RESULT_SORT_KEYS.values():
+        keys = list(map(key, results))
+        known = [row for row in range(len(keys)) if keys[row] is not None]
+        known.sort(key=keys.__getitem__)
+    measurements['sort_all_columns'] = time.perf_counter() - started
+    return measurements
+
+# The virtual results table itself: open it, page through it and sort it. Needs a display.
+def bench_table_view(results, pages=200):
+    import tkinter as tk
+    from VFAPP import RESULT_COLUMNS, RESULT_SORT_KEYS, ResultsView
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {'skipped': f"no display ({e})"}
+    try:
+        root.withdraw()
+        window = tk.Toplevel(root)
+        window.geometry("1000x600")
+        measurements = {}
+        started = time.perf_counter()
+        view = ResultsView(window, RESULT_COLUMNS, sort_keys=RESULT_SORT_KEYS)
+        view.set_results(results)
+        window.update()
+        measurements['open'] = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(pages):
+            view.yview('scroll', 1, 'pages')
+            window.update_idletasks()
+        measurements['scroll_page'] = (time.perf_counter() - started) / pages
+        started = time.perf_counter()
+        view.sort_by('DAR')
+        window.update_idletasks()
+        measurements['sort_first'] = time.perf_counter() - started
+        started = time.perf_counter()
+        view.sort_by('DAR')
+        view.sort_by('DAR')
+        window.update_idletasks()
+        measurements['sort_cached'] = (time.perf_counter() - started) / 2
+        return measurements
+    finally:
+        root.destroy()
+
+# Function to time a command from its start until it prints its first line (e.g. its first result);
+# the process is stopped there. Returns None when it exits without printing anything.
+def time_to_first_line(command):
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        line = process.stdout.readline()
+        elapsed = time.perf_counter() - started
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+    return elapsed if line.strip() else None
+
+# Startup in fresh processes, best of repeat runs: the bare interpreter for reference, importing the
+# command line, the first result of a streamed scan with a cold and a warm config cache (the cold one
+# runs ffprobe -version) and the first drawn window of the GUI (skipped without a display)
+def bench_startup(corpus, ffprobe, work_dir, repeat):
+    config_path = os.path.join(work_dir, 'config.json')
+    window_script = os.path.join(work_dir, 'startup_window.py')
+    with open(window_script, 'w', encoding='utf-8') as f:
+        f.write(WINDOW_SCRIPT.format(root=os.path.dirname(os.path.abspath(__file__)), ffprobe=ffprobe,
+                                     config_path=config_path))
+    scan = [sys.executable, '-m', 'videofilter', corpus, '--where', DEFAULT_WHERE, '--stream', '--no-cache',
+            '--ffprobe', ffprobe, '--config-path', config_path]
+    commands = {
+        'startup_python': ([sys.executable, '-c', 'print("ready")'], False),
+        'startup_import_cli': ([sys.executable, '-c', 'import videofilter.cli; print("ready")'], False),
+        'startup_first_result_cold': (scan, True),
+        'startup_first_result': (scan, False),
+        'startup_window': ([sys.executable, window_script], False),
+    }
+    measurements = {}
+    for name, (command, cold) in commands.items():
+        times = []
+        for _ in range(repeat):
+            if cold and os.path.exists(config_path):
+                os.remove(config_path)
+            times.append(time_to_first_line(command))
+        measurements[name] = min(times) if None not in times else None
+    return measurements
+
+def bench_csv_export(results, path):
+    started = time.perf_counter()
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        write_csv(results, csv_file)
+    return time.perf_counter() - started
+
+# Function to compare the timings of two reports; returns [(name, baseline, current, ratio)]
+def compare(baseline, current):
+    rows = []
+    for name, value in current['seconds'].items():
+        base = baseline.get('seconds', {}).get(name)
+        if base:
+            rows.append((name, base, value, value / base))
+    return rows
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline benchmark of folder scans with a synthetic corpus and a stub ffprobe.")
+    parser.add_argument('--files', type=int, default=10_000, help="Number of files in the corpus (default 10000).")
+    parser.add_argument('--corpus', metavar='DIR', help="Where to generate the corpus (default: a folder in the temp directory, reused between runs).")
+    parser.add_argument('--files-per-dir', type=int, default=50)
+    parser.add_argument('--fanout', type=int, default=8, help="Subfolders per folder level.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=['stub', 'fake'], default='stub',
+                        help="stub: run the stub ffprobe executable per file (measures process spawn); fake: in-process fake backend.")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds each probe takes (default 0.005).")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="Share of files the probe fails on.")
+    parser.add_argument('--workers', type=int, default=None, help="Probe workers (default: same as the app).")
+    parser.add_argument('--processes', action='store_true')
+    parser.add_argument('--where', default=DEFAULT_WHERE, help=f"Scan filter expression (default '{DEFAULT_WHERE}').")
+    parser.add_argument('--sample', type=int, default=200, help="Files timed one by one with get_video_info.")
+    parser.add_argument('--repeat', type=int, default=1, help="Run each measurement N times and keep the best.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write the report as JSON to FILE.")
+    parser.add_argument('--baseline', metavar='FILE', help="Compare with an earlier report.")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="With --baseline, exit with status 1 when a timing is this much slower (default 0.25 = 25%%).")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workers = args.workers or DEFAULT_PROBE_WORKERS
+    corpus = args.corpus or os.path.join(tempfile.gettempdir(), f"videofilter-corpus-{args.files}-{args.seed}")
+    work_dir = tempfile.mkdtemp(prefix='videofilter-bench-')
+    try:
+        print(f"Generating corpus in {corpus}...", file=sys.stderr)
+        manifest = generate_corpus(corpus, args.files, args.files_per_dir, args.fanout, seed=args.seed)
+        if args.backend == 'stub':
+            backend = FFprobeBackend(write_stub_ffprobe(os.path.join(work_dir, 'bin'), args.latency, args.error_rate))
+        else:
+            backend = FakeBackend(latency=args.latency, error_rate=args.error_rate)
+        criteria = parse_criteria({'expression': args.where})
+
+        seconds = {}
+        report = {
+            'settings': dict(vars(args), workers=workers),
+            'environment': {'python': sys.version.split()[0], 'platform': platform.platform(),
+                            'cpus': os.cpu_count()},
+            'corpus': manifest,
+            'seconds': seconds,
+        }
+
+        print("Scanning...", file=sys.stderr)
+        seconds['scan'], (results, total_files, timings) = best_of(
+            args.repeat, lambda: bench_scan(corpus, criteria, backend, workers, args.processes))
+        report['scan'] = {'files': total_files, 'matches': len(results),
+                          'files_per_sec': total_files / seconds['scan'] if seconds['scan'] else None,
+                          'timings': timings}
+
+        cache_path = os.path.join(work_dir, 'cache.db')
+
+        def cached_scan():
+            cache = MetadataCache(cache_path)
+            try:
+                return bench_scan(corpus, criteria, backend, workers, args.processes, cache)
+            finally:
+                cache.close()
+
+        if args.backend == 'stub':
+            print("Scanning with the metadata cache...", file=sys.stderr)
+            seconds['scan_cache_fill'], _ = best_of(1, cached_scan)
+            seconds['scan_cache_warm'], _ = best_of(args.repeat, cached_scan)
+
+        print("Timing get_video_info...", file=sys.stderr)
+        sample = [result['path'] for result in results[:args.sample]]
+        report['get_video_info'] = bench_get_video_info(sample, backend)
+        if report['get_video_info']['count']:
+            seconds['get_video_info_p50'] = report['get_video_info']['p50']
+
+        print("Timing the results table and CSV export...", file=sys.stderr)
+        try:
+            table = bench_table_data(results)
+            report['table_view'] = bench_table_view(results)
+        except ImportError as e:
+            table = {}
+            report['table_view'] = {'skipped': str(e)}
+        seconds.update(table)
+        seconds.update((f"view_{name}", value) for name, value in report['table_view'].items() if name != 'skipped')
+        seconds['csv_export'], _ = best_of(args.repeat, lambda: bench_csv_export(results, os.path.join(work_dir, 'export.csv')))
+
+        print("Timing startup...", file=sys.stderr)
+        startup_ffprobe = write_stub_ffprobe(os.path.join(work_dir, 'startup-bin'), args.latency, args.error_rate)
+        report['startup'] = bench_startup(corpus, startup_ffprobe, work_dir, args.repeat)
+        seconds.update((name, value) for name, value in report['startup'].items() if value is not None)
+
+        exit_code = 0
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            rows = compare(baseline, report)
+            report['comparison'] = [{'name': name, 'baseline': base, 'current': value, 'ratio': ratio}
+                                    for name, base, value, ratio in rows]
+            for name, base, value, ratio in rows:
+                flag = "  REGRESSION" if ratio > 1 + args.max_regression else ""
+                print(f"{name:<26} {base:10.4f}s -> {value:10.4f}s  x{ratio:.2f}{flag}", file=sys.stderr)
+                if flag:
+                    exit_code = 1
+
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        for name, value in seconds.items():
+            print(f"{name:<26} {value:10.4f}s", file=sys.stderr)
+        return exit_code
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
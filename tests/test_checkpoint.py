@@ -0,0 +1,83 @@
+import json
+
+from videofilter.checkpoint import ScanJournal, checkpoint_path, find_checkpoint, read_journal
+from videofilter.records import VideoInfo
+
+IDENTITY = {'root': '/library', 'criteria': 'true', 'max_depth': None, 'symlinks': 'files',
+            'sample_bitrate': True, 'shard': None, 'info_fields': []}
+
+SIGNATURE = (1000, 1_700_000_000_000_000_000, 42)
+
+def make_info():
+    return VideoInfo('h264', 1920, 1080, 60.0, 5_000_000, 'Variable', 1000, 25.0, '16:9', 'YUV', 8)
+
+def new_journal(directory, *paths):
+    journal = ScanJournal(IDENTITY, directory=str(directory))
+    for path in paths:
+        journal.record(path, SIGNATURE, make_info(), True)
+    journal.close()
+    return checkpoint_path(IDENTITY, str(directory))
+
+def append_bytes(path, data):
+    with open(path, 'ab') as f:
+        f.write(data)
+
+def test_records_are_read_back(tmp_path):
+    journal_path = new_journal(tmp_path, '/a', '/b')
+    header, dirs, files, end = read_journal(journal_path)
+    assert header['scan'] == IDENTITY
+    assert dirs == {}
+    assert list(files) == ['/a', '/b']
+    assert files['/a'] == (SIGNATURE, make_info().to_dict())
+    with open(journal_path, 'rb') as f:
+        assert end == len(f.read())
+    assert find_checkpoint(IDENTITY, str(tmp_path))['files'] == 2
+
+def test_torn_line_is_cut_off_before_appending(tmp_path):
+    journal_path = new_journal(tmp_path, '/a')
+    append_bytes(journal_path, b'{"path": "/b", "sig')
+    assert list(read_journal(journal_path)[2]) == ['/a']
+
+    journal = ScanJournal(IDENTITY, resume=True, directory=str(tmp_path))
+    assert journal.resumed
+    journal.record('/c', SIGNATURE, make_info(), True)
+    journal.record('/d', SIGNATURE, None, False)
+    journal.close()
+
+    _, _, files, _ = read_journal(journal_path)
+    assert list(files) == ['/a', '/c', '/d']
+    assert files['/d'] == (SIGNATURE, None)
+
+    # A second resume still sees every record
+    journal = ScanJournal(IDENTITY, resume=True, directory=str(tmp_path))
+    assert list(journal.files) == ['/a', '/c', '/d']
+    journal.close()
+
+def test_record_without_newline_is_incomplete(tmp_path):
+    journal_path = new_journal(tmp_path, '/a')
+    complete_end = read_journal(journal_path)[3]
+    append_bytes(journal_path, json.dumps({'path': '/b', 'signature': list(SIGNATURE), 'info': None,
+                                           'match': False}).encode('utf-8'))
+    _, _, files, end = read_journal(journal_path)
+    assert list(files) == ['/a']
+    assert end == complete_end
+
+    journal = ScanJournal(IDENTITY, resume=True, directory=str(tmp_path))
+    journal.record('/c', SIGNATURE, None, False)
+    journal.close()
+    assert list(read_journal(journal_path)[2]) == ['/a', '/c']
+
+def test_unchanged_files_are_answered_from_the_journal(tmp_path):
+    new_journal(tmp_path, '/a')
+    journal = ScanJournal(IDENTITY, resume=True, directory=str(tmp_path))
+    assert journal.lookup('/a', SIGNATURE) == (SIGNATURE, make_info())
+    changed = (SIGNATURE[0] + 1,) + SIGNATURE[1:]
+    assert journal.lookup('/a', changed) == (changed, None)
+    journal.close()
+
+def test_completed_journal_is_deleted(tmp_path):
+    journal = ScanJournal(IDENTITY, directory=str(tmp_path))
+    journal.record('/a', SIGNATURE, None, False)
+    journal.close(complete=True)
+    assert read_journal(checkpoint_path(IDENTITY, str(tmp_path))) is None
+    assert find_checkpoint(IDENTITY, str(tmp_path)) is None
@@ -0,0 +1,109 @@
+import pytest
+
+from videofilter import cli
+from videofilter.expr import TRUE, compile_predicate, format_expression, parse_expression
+from videofilter.records import VideoInfo
+
+def make_info(**fields):
+    info = VideoInfo('h264', 1920, 1080, 60.0, 5_000_000, 'Variable', 1000, 25.0, '16:9', 'YUV', 8)
+    for name, value in fields.items():
+        setattr(info, name, value)
+    return info
+
+def matches(text, path='/library/clip.mp4', **fields):
+    return compile_predicate(parse_expression(text))(path, None, make_info(**fields))
+
+def test_comparison_values_are_converted():
+    assert parse_expression('height >= 2160') == ('cmp', 'height', '>=', 2160)
+    assert parse_expression('size > 1.5mb') == ('cmp', 'size', '>', 1572864)
+    assert parse_expression('fps = 25') == ('cmp', 'framerate', '==', 25)
+    assert parse_expression('bitrate_mode == Variable') == ('cmp', 'bitrate_mode', '==', 'variable')
+    assert parse_expression('') == TRUE
+
+def test_and_binds_tighter_than_or():
+    a, b, c = (('cmp', 'height', '==', value) for value in (1, 2, 3))
+    assert parse_expression('height == 1 or height == 2 and height == 3') == ('or', (a, ('and', (b, c))))
+    assert parse_expression('height == 1 and height == 2 or height == 3') == ('or', (('and', (a, b)), c))
+    assert parse_expression('(height == 1 or height == 2) and height == 3') == ('and', (('or', (a, b)), c))
+
+def test_not_binds_tighter_than_and():
+    a, b = (('cmp', 'height', '==', value) for value in (1, 2))
+    assert parse_expression('not height == 1 and height == 2') == ('and', (('not', a), b))
+    assert parse_expression('not (height == 1 and height == 2)') == ('not', ('and', (a, b)))
+    assert parse_expression('not not height == 1') == ('not', ('not', a))
+
+def test_precedence_in_predicates():
+    assert matches('codec == hevc or codec == h264 and height == 1080')
+    assert not matches('codec == hevc or codec == h264 and height == 720')
+    assert not matches('(codec == hevc or codec == h264) and height == 720')
+    assert matches('not codec == hevc and height == 1080')
+    assert not matches('not (codec == h264 and height == 1080)')
+
+def test_in_lists():
+    assert parse_expression('codec in (prores, h264)') == ('cmp', 'codec', 'in', ('prores', 'h264'))
+    assert parse_expression('height in 1080') == ('cmp', 'height', 'in', (1080,))
+    assert parse_expression('codec not in (prores, hap)') == ('not', ('cmp', 'codec', 'in', ('prores', 'hap')))
+    assert matches('codec in (prores, h264)')
+    assert not matches('codec in (prores, hap)')
+    assert matches('height in (720, 1080) and width in (1920)')
+    assert matches('codec not in (prores, hap)')
+    assert not matches('bitrate_mode not in (Variable, constant)')
+
+@pytest.mark.parametrize('text', ['codec in ()', 'codec in (h264', 'codec in (h264,)', 'codec in (h264 hevc)'])
+def test_malformed_in_lists(text):
+    with pytest.raises(ValueError):
+        parse_expression(text)
+
+def test_unknown_field():
+    with pytest.raises(ValueError, match="Unknown field 'colour'"):
+        parse_expression('colour == red')
+    with pytest.raises(ValueError, match="Unknown field 'bogus'"):
+        parse_expression('height > 100 and bogus == 1')
+
+@pytest.mark.parametrize('text', ['height >=', 'height', 'height == 1 and', 'not', 'codec in', '(height == 1'])
+def test_trailing_operators(text):
+    with pytest.raises(ValueError):
+        parse_expression(text)
+
+@pytest.mark.parametrize('text', ['height >= and width == 1', 'height == 1 height == 2', 'height == 1)',
+                                  'codec ~ h264', 'mtime in (1, 2)', 'height == big'])
+def test_invalid_expressions(text):
+    with pytest.raises(ValueError):
+        parse_expression(text)
+
+def test_trailing_operator_is_a_usage_error(tmp_path, capsys):
+    assert cli.main([str(tmp_path), '--where', 'height >=']) == cli.EXIT_USAGE
+    assert 'Unexpected end of filter expression' in capsys.readouterr().err
+
+def test_quoted_values_keep_operators():
+    assert parse_expression("codec == 'h264 and height > 1'") == ('cmp', 'codec', '==', 'h264 and height > 1')
+    assert parse_expression('codec == "a, (b) or c"') == ('cmp', 'codec', '==', 'a, (b) or c')
+    assert parse_expression(r"codec == 'it\'s'") == ('cmp', 'codec', '==', "it's")
+    assert parse_expression("path like '*a != b*'") == ('cmp', 'path', 'like', ('*a != b*',))
+    assert matches("codec == 'x or y'", codec='x or y')
+    assert not matches("codec == 'x or y'")
+    assert matches("path like '*a != b*'", path='/library/a != b.mp4')
+
+@pytest.mark.parametrize('text', [
+    'height >= 2160',
+    'codec in (prores, hap_q) and height >= 2160 and not bitrate_mode == variable',
+    '(codec == h264 or codec == hevc) and (width >= 3840 or height >= 2160)',
+    'not (height == 1 and width == 2)',
+    'not not height == 1',
+    'codec not in (prores, hap)',
+    "codec == 'h264 and height > 1'",
+    "codec == 'it\\'s'",
+    "codec == 'and'",
+    "path like ('*a != b*', '*.mov')",
+    'ext in (mp4, mkv)',
+    'dar ~ 16:9 within 2%',
+    'fps ~ 23.976',
+    'size >= 1.5gb and duration < 1:30',
+    "mtime >= '2024-01-02 03:04:05'",
+    'true',
+])
+def test_format_expression_round_trips(text):
+    node = parse_expression(text)
+    formatted = format_expression(node)
+    assert parse_expression(formatted) == node
+    assert format_expression(parse_expression(formatted)) == formatted
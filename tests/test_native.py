@@ -0,0 +1,256 @@
+import struct
+
+import pytest
+
+from videofilter import native
+from videofilter.probe import video_info_from_media
+
+# MP4/MOV and Matroska files are built here box by box and element by element, so the header
+# readers can be checked against the fields ffprobe reports without FFmpeg or real media.
+
+# Writes the fixed and exp-Golomb fields of an H.264 parameter set
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def u(self, bits, value):
+        self.bits.extend((value >> shift) & 1 for shift in range(bits - 1, -1, -1))
+
+    def ue(self, value):
+        value += 1
+        self.u(2 * value.bit_length() - 1, value)
+
+    def rbsp(self):
+        bits = self.bits + [1]
+        bits += [0] * (-len(bits) % 8)
+        return bytes(int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8))
+
+# Function to build a baseline-profile SPS for width x height (multiples of 16, with a crop for 1080)
+def h264_sps(width, height):
+    w = BitWriter()
+    w.u(8, 66)  # profile_idc
+    w.u(16, 30)  # constraint flags, level
+    w.ue(0)  # seq_parameter_set_id
+    w.ue(0)  # log2_max_frame_num_minus4
+    w.ue(2)  # pic_order_cnt_type
+    w.ue(1)  # max_num_ref_frames
+    w.u(1, 0)  # gaps_in_frame_num_value_allowed_flag
+    coded_height = (height + 15) // 16 * 16
+    w.ue(width // 16 - 1)
+    w.ue(coded_height // 16 - 1)
+    w.u(1, 1)  # frame_mbs_only_flag
+    w.u(1, 1)  # direct_8x8_inference_flag
+    if coded_height != height:
+        w.u(1, 1)  # frame_cropping_flag
+        for crop in (0, 0, 0, (coded_height - height) // 2):
+            w.ue(crop)
+    else:
+        w.u(1, 0)
+    w.u(1, 0)  # vui_parameters_present_flag
+    return b'\x67' + w.rbsp()
+
+def avcc(width, height):
+    sps = h264_sps(width, height)
+    return bytes((1, 66, 0, 30, 0xFF, 0xE1)) + struct.pack('>H', len(sps)) + sps + b'\x00'
+
+# AAC LC, 44.1 kHz, stereo
+AAC_CONFIG = bytes((0x12, 0x10))
+
+# MP4 ------------------------------------------------------------------------------------------
+
+def box(box_type, *children):
+    body = b''.join(children)
+    return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+def full_box(box_type, body, version=0):
+    return box(box_type, bytes((version, 0, 0, 0)), body)
+
+IDENTITY_MATRIX = struct.pack('>9I', *native.IDENTITY_MATRIX)
+
+def tkhd(width, height):
+    return full_box(b'tkhd', bytes(20) + bytes(16) + IDENTITY_MATRIX + struct.pack('>II', width << 16, height << 16))
+
+def mdhd(timescale, duration):
+    return full_box(b'mdhd', bytes(8) + struct.pack('>II', timescale, duration) + bytes(4))
+
+def hdlr(handler):
+    return full_box(b'hdlr', bytes(4) + handler + bytes(12) + b'\x00')
+
+def stsd(entry):
+    return full_box(b'stsd', struct.pack('>I', 1) + entry)
+
+def visual_entry(fourcc, width, height, *children):
+    body = bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HH', width, height) \
+        + bytes(4 + 4 + 4) + struct.pack('>H', 1) + bytes(32) + struct.pack('>Hh', 24, -1) + b''.join(children)
+    return struct.pack('>I4s', 8 + len(body), fourcc) + body
+
+def mp4a_entry():
+    es = bytes((0x03, 22)) + bytes((0, 1, 0)) \
+        + bytes((0x04, 17, 0x40, 0x15)) + bytes(3 + 4 + 4) \
+        + bytes((0x05, len(AAC_CONFIG))) + AAC_CONFIG
+    body = bytes(6) + struct.pack('>H', 1) + bytes(8) + struct.pack('>HHHHI', 2, 16, 0, 0, 44100 << 16) \
+        + full_box(b'esds', es)
+    return struct.pack('>I4s', 8 + len(body), b'mp4a') + body
+
+# 10 seconds of 25 fps video with 1000-byte samples
+VIDEO_TIMESCALE = 12800
+FRAME_DELTA = 512
+FRAME_COUNT = 250
+FRAME_SIZE = 1000
+
+def video_trak(width=1920, height=1080, fourcc=b'avc1', config=None):
+    if config is None:
+        config = box(b'avcC', avcc(width, height))
+    stbl = box(b'stbl',
+               stsd(visual_entry(fourcc, width, height, config)),
+               full_box(b'stts', struct.pack('>III', 1, FRAME_COUNT, FRAME_DELTA)),
+               full_box(b'stsz', struct.pack('>II', 0, FRAME_COUNT) + struct.pack('>I', FRAME_SIZE) * FRAME_COUNT))
+    return box(b'trak', tkhd(width, height),
+               box(b'mdia', mdhd(VIDEO_TIMESCALE, FRAME_DELTA * FRAME_COUNT), hdlr(b'vide'),
+                   box(b'minf', stbl)))
+
+def audio_trak():
+    return box(b'trak', tkhd(0, 0),
+               box(b'mdia', mdhd(44100, 441000), hdlr(b'soun'),
+                   box(b'minf', box(b'stbl', stsd(mp4a_entry())))))
+
+def mp4_file(*traks):
+    mvhd = full_box(b'mvhd', bytes(8) + struct.pack('>II', 1000, 10000) + bytes(80))
+    return box(b'ftyp', b'isom', bytes(4), b'isommp41') + box(b'moov', mvhd, *traks)
+
+# Matroska ------------------------------------------------------------------------------------
+
+def element(element_id, *children):
+    body = b''.join(children)
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + b'\x01' + len(body).to_bytes(7, 'big') + body
+
+def uint_element(element_id, value):
+    return element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big'))
+
+def float_element(element_id, value):
+    return element(element_id, struct.pack('>d', value))
+
+def mkv_video_track(width=1920, height=1080, codec_id=b'V_MPEG4/ISO/AVC', codec_private=None):
+    if codec_private is None:
+        codec_private = avcc(width, height)
+    return element(native.MKV_TRACK_ENTRY,
+                   uint_element(native.MKV_TRACK_TYPE, 1),
+                   element(native.MKV_CODEC_ID, codec_id),
+                   element(native.MKV_CODEC_PRIVATE, codec_private),
+                   uint_element(native.MKV_DEFAULT_DURATION, 40_000_000),
+                   element(native.MKV_VIDEO,
+                           uint_element(native.MKV_PIXEL_WIDTH, width),
+                           uint_element(native.MKV_PIXEL_HEIGHT, height)))
+
+def mkv_audio_track():
+    return element(native.MKV_TRACK_ENTRY,
+                   uint_element(native.MKV_TRACK_TYPE, 2),
+                   element(native.MKV_CODEC_ID, b'A_AAC'),
+                   element(native.MKV_CODEC_PRIVATE, AAC_CONFIG),
+                   element(native.MKV_AUDIO,
+                           float_element(native.MKV_SAMPLING_FREQUENCY, 44100.0),
+                           uint_element(native.MKV_CHANNELS, 2)))
+
+def mkv_file(*tracks):
+    return element(native.EBML_HEADER, element(0x4282, b'matroska')) + element(
+        native.MKV_SEGMENT,
+        element(native.MKV_INFO,
+                uint_element(native.MKV_TIMESTAMP_SCALE, 1_000_000),
+                float_element(native.MKV_DURATION, 10_000.0)),
+        element(native.MKV_TRACKS, *tracks))
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+# Tests ---------------------------------------------------------------------------------------
+
+def test_h264_sps():
+    assert native.parse_avcc(avcc(1920, 1080)) == {
+        'width': 1920, 'height': 1080, 'sar': (0, 1), 'pix_fmt': 'yuv420p', 'bits_per_raw_sample': 8
+    }
+
+def test_mp4_matches_ffprobe_fields(tmp_path):
+    path = write(tmp_path, 'movie.mp4', mp4_file(video_trak(), audio_trak()))
+    media = native.read_media_info(path)
+    video, audio = media['streams']
+    assert video == {
+        'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'r_frame_rate': '25/1',
+        'pix_fmt': 'yuv420p', 'duration': '10.000000', 'bit_rate': str(FRAME_COUNT * FRAME_SIZE * 8 // 10),
+        'bits_per_raw_sample': '8'
+    }
+    assert audio == {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2, 'sample_rate': '44100'}
+    assert media['format']['format_name'] == native.MP4_FORMAT_NAME
+    assert media['format']['duration'] == '10.000000'
+
+    info = video_info_from_media(media, path)
+    assert (info['codec'], info['width'], info['height']) == ('h264', 1920, 1080)
+    assert info['framerate'] == 25.0
+    assert info['duration'] == 10.0
+    assert info['bitrate'] == 200_000
+    assert info['display_aspect_ratio'] == '16:9'
+    assert (info['bit_depth'], info['color_space']) == (8, 'YUV')
+    assert (info['audio_codec'], info['audio_channels'], info['audio_sample_rate']) == ('aac', 2, 44100)
+    assert (info['video_streams'], info['audio_streams'], info['subtitle_streams']) == (1, 1, 0)
+
+def test_mkv_matches_ffprobe_fields(tmp_path):
+    path = write(tmp_path, 'movie.mkv', mkv_file(mkv_video_track(), mkv_audio_track()))
+    media = native.read_media_info(path)
+    video, audio = media['streams']
+    assert video == {
+        'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'r_frame_rate': '25/1',
+        'pix_fmt': 'yuv420p', 'sample_aspect_ratio': '1:1', 'display_aspect_ratio': '16:9',
+        'bits_per_raw_sample': '8'
+    }
+    assert audio == {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2, 'sample_rate': '44100'}
+    assert media['format']['format_name'] == native.MKV_FORMAT_NAME
+
+    info = video_info_from_media(media, path)
+    assert (info['codec'], info['width'], info['height'], info['framerate']) == ('h264', 1920, 1080, 25.0)
+    # Matroska streams have no duration or bitrate of their own; the container's stand in
+    assert info['duration'] == 10.0
+    assert info['bitrate'] == info['container_bitrate'] == int(len(open(path, 'rb').read()) * 8 / 10)
+    assert (info['audio_codec'], info['audio_channels'], info['audio_sample_rate']) == ('aac', 2, 44100)
+
+@pytest.mark.parametrize('name, data', [
+    ('movie.mp4', mp4_file(video_trak(), audio_trak())),
+    ('movie.mkv', mkv_file(mkv_video_track(), mkv_audio_track())),
+], ids=['mp4', 'mkv'])
+def test_truncated_files_fall_back(tmp_path, name, data):
+    # Cut anywhere inside the headers, a file is left to ffprobe instead of half read
+    for length in range(len(data)):
+        assert native.read_media_info(write(tmp_path, name, data[:length])) is None, length
+
+def test_oversized_boxes_fall_back(tmp_path):
+    data = mp4_file(video_trak(), audio_trak())
+    moov = data.index(b'moov') - 4
+    # moov claiming more bytes than the file has
+    oversized = data[:moov] + struct.pack('>I', len(data)) + data[moov + 4:]
+    assert native.read_media_info(write(tmp_path, 'oversized.mp4', oversized)) is None
+    # 64-bit size far past the end
+    large = data[:moov] + struct.pack('>I4sQ', 1, b'moov', 2 ** 40) + data[moov + 8:]
+    assert native.read_media_info(write(tmp_path, 'large.mp4', large)) is None
+    # A size smaller than the box header
+    tiny = data[:moov] + struct.pack('>I', 4) + data[moov + 4:]
+    assert native.read_media_info(write(tmp_path, 'tiny.mp4', tiny)) is None
+
+def test_oversized_elements_fall_back(tmp_path):
+    tracks = element(native.MKV_TRACKS, mkv_video_track())
+    data = mkv_file(mkv_video_track())
+    start = data.index(tracks)
+    # Tracks claiming more bytes than the file has
+    size_at = start + len(native.MKV_TRACKS.to_bytes(4, 'big'))
+    oversized = data[:size_at] + b'\x01' + (len(tracks) * 2).to_bytes(7, 'big') + data[size_at + 8:]
+    assert native.read_media_info(write(tmp_path, 'oversized.mkv', oversized)) is None
+
+@pytest.mark.parametrize('width, height', [(0, 1080), (1920, 0)])
+def test_zero_picture_size_falls_back(tmp_path, width, height):
+    # ProRes carries no parameter set, so the container's picture size is all there is
+    mp4 = mp4_file(video_trak(width, height, fourcc=b'apcn', config=b''))
+    assert native.read_media_info(write(tmp_path, 'prores.mov', mp4)) is None
+    mkv = mkv_file(mkv_video_track(width, height, codec_id=b'V_PRORES', codec_private=b'apcn'))
+    assert native.read_media_info(write(tmp_path, 'prores.mkv', mkv)) is None
+
+def test_other_extensions_are_left_to_ffprobe(tmp_path):
+    assert native.read_media_info(write(tmp_path, 'movie.avi', mp4_file(video_trak()))) is None
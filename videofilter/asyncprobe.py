@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import time
+
+from . import probe
+from .backends import RETRY_DELAY, FFprobeBackend, ProbeError, ProbeTimeout, media_described, parse_packet_line
+from .bitrate import MAX_SAMPLED_PACKETS, bitrate_stats, sample_intervals
+from .expr import compile_predicate
+from .native import read_media_info, read_video_packets
+
+# Asyncio probe engine: ffprobe runs as asyncio subprocesses on one event loop instead of one pool
+# thread blocked per process, so many probes can be in flight cheaply. Each run is killed when it
+# exceeds the backend's timeout and retried as the backend's retry policy says (see backends.py).
+# Header parsing and backends that don't run ffprobe (pyav, fake) run in the loop's worker
+# threads under the same timeout; a thread stuck in a read can't be killed, but the scan moves on.
+
+# Runs probes as asyncio tasks on an event loop in a background thread, at most `workers` at a
+# time. submit() returns a concurrent.futures.Future like the pool executors do, so probe_videos
+# schedules every engine the same way; cancelling the future kills the probe's ffprobe process.
+class AsyncProbeExecutor:
+    def __init__(self, workers):
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(max(1, workers))
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-probe', daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        return asyncio.run_coroutine_threadsafe(self.limited(function, *args), self.loop)
+
+    async def limited(self, function, *args):
+        async with self.semaphore:
+            return await function(*args)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        async def finish():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if cancel_futures:
+                for task in tasks:
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if wait:
+            asyncio.run_coroutine_threadsafe(finish(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+# Function to run a blocking call in a worker thread, giving up on it after the backend's timeout
+async def run_blocking(backend, function, *args):
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(function, *args), backend.timeout)
+    except asyncio.TimeoutError:
+        raise ProbeTimeout(f"reading the file did not finish within {backend.timeout:g} s")
+
+# Function to await function(*args) with the backend's retry policy (see FFprobeBackend.retry)
+async def retry_async(backend, function, *args):
+    for attempt in range(backend.retries + 1):
+        try:
+            return await function(*args)
+        except (ProbeTimeout, OSError):
+            if attempt == backend.retries:
+                raise
+            await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+
+# Function to run one ffprobe command and parse its JSON output; a run past the timeout (or a
+# cancelled probe) is killed
+async def run_ffprobe(command, timeout):
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise ProbeTimeout(f"ffprobe did not finish within {timeout:g} s and was stopped")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise ProbeError(f"ffprobe error: {stderr.decode('utf-8', 'replace').strip()}")
+    return json.loads(stdout)
+
+# Function to probe a file with the backend, like ProbeBackend.probe_file
+async def probe_file_async(backend, file_path):
+    if not isinstance(backend, FFprobeBackend):
+        return await run_blocking(backend, backend.probe_file, file_path)
+    commands = backend.probe_commands(file_path)
+    for number, command in enumerate(commands):
+        media = await retry_async(backend, run_ffprobe, command, backend.timeout)
+        if number == len(commands) - 1 or media_described(media):
+            return media
+
+# Function to read ffprobe's packet list for the intervals, like FFprobeBackend.sample_packets
+async def sample_packets_async(backend, file_path, intervals, max_packets):
+    process = await asyncio.create_subprocess_exec(*backend.sample_command(file_path, intervals),
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    packets = []
+
+    async def read():
+        async for line in process.stdout:
+            packet = parse_packet_line(line.decode('utf-8', 'replace'))
+            if packet is not None:
+                packets.append(packet)
+                if len(packets) >= max_packets:
+                    break
+
+    try:
+        await asyncio.wait_for(read(), backend.timeout)
+    except asyncio.TimeoutError:
+        # Keep the packets read so far
+        pass
+    finally:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+    return packets or None
+
+# Function to measure the bitrate of a file like probe.sample_video_bitrate
+async def sample_video_bitrate_async(file_path, duration, backend):
+    intervals = sample_intervals(duration)
+    packets = None
+    if probe.native_parser_enabled and backend.use_native:
+        packets = await run_blocking(backend, read_video_packets, file_path, intervals, MAX_SAMPLED_PACKETS)
+    if packets is None:
+        if isinstance(backend, FFprobeBackend):
+            packets = await sample_packets_async(backend, file_path, intervals, MAX_SAMPLED_PACKETS)
+        else:
+            packets = await run_blocking(backend, backend.sample_packets, file_path, intervals, MAX_SAMPLED_PACKETS)
+    return bitrate_stats(packets) if packets else None
+
+# Function to probe one file like probe.probe_video; returns (info, None) or (None, reason)
+async def probe_video_async(file_path, backend=None, sample_bitrate=None):
+    if backend is None:
+        backend = FFprobeBackend(probe.ffprobe_path)
+    try:
+        media = None
+        if probe.native_parser_enabled and backend.use_native:
+            media = await run_blocking(backend, read_media_info, file_path)
+        if media is None:
+            media = await probe_file_async(backend, file_path)
+            if media is None:
+                return probe.probe_failure(file_path, "no metadata could be read")
+        info = probe.video_info_from_media(media, file_path)
+        if sample_bitrate is not None and compile_predicate(sample_bitrate)(file_path, None, info):
+            stats = await sample_video_bitrate_async(file_path, info['duration'], backend)
+            if stats is not None:
+                info.apply_bitrate_stats(stats, keep_bitrate=bool(probe.first_video_stream(media).get('bit_rate')))
+        return info, None
+    except Exception as e:
+        return probe.probe_failure(file_path, e)
+
+# Function to probe one file while timing it, like probe.timed_video_info; phases are not split up
+# since the loop interleaves many probes
+async def timed_probe_video_async(file_path, backend=None, sample_bitrate=None):
+    start = time.perf_counter()
+    result = await probe_video_async(file_path, backend, sample_bitrate)
+    return result, time.perf_counter() - start, []
@@ -0,0 +1,424 @@
+import json
+import os
+import subprocess
+import threading
+import time
+import zlib
+
+from .config import CONFIG_PATH, load_config, save_config
+from .timing import phase
+
+# Probe backends turn a file into the JSON document of `ffprobe -show_format -show_streams`:
+# {'streams': [...], 'format': {...}}, or None when the file can't be read. Every stream has a
+# codec_type; the first video stream has codec_name, width, height, duration, bit_rate,
+# r_frame_rate, display_aspect_ratio, sample_aspect_ratio, pix_fmt, ..., audio streams
+# codec_name, channels and sample_rate, and the format has format_name, duration and bit_rate.
+# probe.get_video_info turns that into the info record used for filtering, so every backend
+# filters the same way, and one call per file answers video, audio and container criteria.
+# For bitrate sampling, a backend can also list the packets of a few intervals of the stream.
+#
+# Backends are small picklable objects so they can be handed to process pool workers.
+
+# Seconds an ffprobe run may take before it is killed: a corrupt file or a stalled network read
+# must not hang a whole scan
+DEFAULT_PROBE_TIMEOUT = 30.0
+
+# Times a probe that timed out or could not start is tried again
+DEFAULT_PROBE_RETRIES = 1
+
+# Pause before the first retry, doubled for each further one
+RETRY_DELAY = 0.5
+
+# Data ffprobe reads to find the streams (-probesize, bytes) and to analyze them (-analyzeduration,
+# seconds) on the first try; files whose video stream is not described within that are probed
+# again with ffprobe's own limits. Headers of most files fit easily, so far less is read.
+DEFAULT_PROBESIZE = 2_000_000
+DEFAULT_ANALYZE_DURATION = 2.0
+
+# Raised when a backend can't be used here (e.g. PyAV is not installed)
+class BackendUnavailable(Exception):
+    pass
+
+# Raised by a backend when a file can't be probed; the message says why
+class ProbeError(Exception):
+    pass
+
+# Raised when a probe took longer than the backend's timeout and was stopped
+class ProbeTimeout(ProbeError):
+    pass
+
+# Function to check that probe output describes a video stream well enough to filter on it
+# (a probe limited by -probesize can stop before the codec parameters are found)
+def media_described(media):
+    return any(stream.get('codec_type') == 'video' and stream.get('codec_name') and stream.get('width')
+               for stream in media.get('streams', ()))
+
+class ProbeBackend:
+    name = None
+    # Try the built-in MP4/MOV/MKV header parser before this backend
+    use_native = True
+    # Seconds one probe may take (None waits forever) and retries after a timeout
+    timeout = None
+    retries = 0
+
+    # Raise BackendUnavailable with a helpful message when the backend can't run
+    def check(self):
+        pass
+
+    def probe_file(self, file_path):
+        raise NotImplementedError
+
+    # Return [(time, duration, size in bytes), ...] for the video packets in the given (start, length)
+    # intervals (seconds), at most max_packets of them, or None when the backend can't sample packets
+    def sample_packets(self, file_path, intervals, max_packets):
+        return None
+
+# Function to find and validate the ffprobe executable `command` (a name looked up on the PATH, or
+# a path). Returns {'command', 'search_path', 'path', 'version', 'mtime_ns', 'size'}, or None when
+# it can't be run. Running ffprobe -version costs a process start, so the result is kept in the
+# config cache and reused while the command, the PATH and the executable on disk are unchanged.
+def find_ffprobe(command, config_path=CONFIG_PATH):
+    config = load_config(config_path)
+    search_path = os.environ.get('PATH', '')
+    cached = config.get('ffprobe')
+    # The executable found may be passed back as the command (see probe.is_ffmpeg_installed)
+    if isinstance(cached, dict) and ((cached.get('command') == command and cached.get('search_path') == search_path)
+                                     or cached.get('path') == command):
+        try:
+            st = os.stat(cached['path'])
+            if (st.st_mtime_ns, st.st_size) == (cached['mtime_ns'], cached['size']):
+                return cached
+        except (OSError, KeyError):
+            pass
+
+    import shutil
+
+    path = shutil.which(command)
+    if path is None:
+        return None
+    try:
+        output = subprocess.run([path, '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                check=True, timeout=DEFAULT_PROBE_TIMEOUT).stdout
+        st = os.stat(path)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    # "ffprobe version 6.1.1 Copyright ..."
+    words = output.split()
+    version = words[2] if len(words) > 2 and words[1] == 'version' else 'unknown'
+    ffprobe = {'command': command, 'search_path': search_path, 'path': os.path.abspath(path), 'version': version,
+               'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+    config['ffprobe'] = ffprobe
+    save_config(config, config_path)
+    return ffprobe
+
+# Function to parse one line of ffprobe's compact packet list into (time, duration, size), or None
+def parse_packet_line(line):
+    fields = dict(item.split('=', 1) for item in line.strip().split('|') if '=' in item)
+    time_text = fields.get('pts_time', 'N/A')
+    if time_text == 'N/A':
+        time_text = fields.get('dts_time', 'N/A')
+    try:
+        packet_time = float(time_text)
+        size = int(fields['size'])
+    except (KeyError, ValueError):
+        return None
+    try:
+        duration = float(fields.get('duration_time', 'N/A'))
+    except ValueError:
+        duration = 0.0
+    return packet_time, duration, size
+
+# Runs one ffprobe process per file and parses its JSON output. A run that takes longer than
+# timeout seconds is killed and tried again up to retries times; probesize and analyzeduration
+# limit what the first run of each file reads (see DEFAULT_PROBESIZE; 0 keeps ffprobe's defaults).
+# The commands are also run by the asyncio engine (see asyncprobe.py). check() finds ffprobe
+# through the config cache at config_path (see find_ffprobe).
+class FFprobeBackend(ProbeBackend):
+    name = 'ffprobe'
+
+    def __init__(self, path='ffprobe', timeout=DEFAULT_PROBE_TIMEOUT, retries=DEFAULT_PROBE_RETRIES,
+                 probesize=DEFAULT_PROBESIZE, analyzeduration=DEFAULT_ANALYZE_DURATION, config_path=CONFIG_PATH):
+        self.path = path
+        self.timeout = timeout or None
+        self.retries = retries
+        self.probesize = probesize
+        self.analyzeduration = analyzeduration
+        self.config_path = config_path
+
+    def check(self):
+        if find_ffprobe(self.path, self.config_path) is None:
+            raise BackendUnavailable(f"ffprobe not found ({self.path}). Install FFmpeg or pass --ffprobe.")
+
+    # Function to list the ffprobe commands to try for a file, in order: with the probesize and
+    # analyzeduration limits, then with ffprobe's defaults for files the limits left undescribed
+    def probe_commands(self, file_path):
+        limits = []
+        if self.probesize:
+            limits += ['-probesize', str(int(self.probesize))]
+        if self.analyzeduration:
+            limits += ['-analyzeduration', str(int(self.analyzeduration * 1_000_000))]
+        command = ['-show_format', '-show_streams', '-of', 'json', file_path]
+        commands = [[self.path, '-v', 'error'] + limits + command]
+        if limits:
+            commands.append([self.path, '-v', 'error'] + command)
+        return commands
+
+    # Function to list the ffprobe command printing the video packets of the (start, length) intervals
+    # (-read_intervals seeks to each one)
+    def sample_command(self, file_path, intervals):
+        read_intervals = ",".join(f"{start:.3f}%+{length:.3f}" for start, length in intervals)
+        return [self.path, '-v', 'error', '-select_streams', 'v:0', '-read_intervals', read_intervals,
+                '-show_entries', 'packet=pts_time,dts_time,duration_time,size', '-of', 'compact=p=0', file_path]
+
+    def probe_file(self, file_path):
+        commands = self.probe_commands(file_path)
+        for number, command in enumerate(commands):
+            media = self.retry(self.run_probe, command)
+            if number == len(commands) - 1 or media_described(media):
+                return media
+
+    # Function to call function(*args), trying again after a timeout or a failed start (e.g. a
+    # stalled network share) up to retries times, with a growing pause
+    def retry(self, function, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return function(*args)
+            except (ProbeTimeout, OSError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+
+    # Function to run one ffprobe command and parse its JSON output; a run past the timeout is killed
+    def run_probe(self, command):
+        env = os.environ.copy()  # Copy the environment variables
+        with phase('spawn'):
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                env=env
+            )
+        with phase('wait'):
+            try:
+                stdout, stderr = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise ProbeTimeout(f"ffprobe did not finish within {self.timeout:g} s and was stopped")
+        if process.returncode != 0:
+            raise ProbeError(f"ffprobe error: {stderr.strip()}")
+        with phase('parse'):
+            return json.loads(stdout)
+
+    # Streams ffprobe's packet list and parses it line by line; ffprobe is stopped as soon as
+    # max_packets packets have been read, or when the timeout runs out (keeping the packets read)
+    def sample_packets(self, file_path, intervals, max_packets):
+        process = subprocess.Popen(
+            self.sample_command(file_path, intervals),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        watchdog = None
+        if self.timeout:
+            watchdog = threading.Timer(self.timeout, process.kill)
+            watchdog.start()
+        packets = []
+        try:
+            for line in process.stdout:
+                packet = parse_packet_line(line)
+                if packet is None:
+                    continue
+                packets.append(packet)
+                if len(packets) >= max_packets:
+                    break
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        return packets or None
+
+# Reads the file in-process with PyAV (libavformat bindings): no process spawn and no JSON.
+# PyAV is optional; it is only imported when this backend is used.
+class PyAVBackend(ProbeBackend):
+    name = 'pyav'
+
+    def check(self):
+        try:
+            import av  # noqa: F401
+        except ImportError:
+            raise BackendUnavailable("The pyav backend needs PyAV (pip install av).")
+
+    def probe_file(self, file_path):
+        import av
+
+        with av.open(file_path) as container:
+            streams = [self.describe_stream(stream) for stream in container.streams]
+            # Same fields as ffprobe's format section; libav durations are in AV_TIME_BASE units
+            media_format = {'format_name': container.format.name, 'nb_streams': len(streams)}
+            if container.duration:
+                media_format['duration'] = "%.6f" % (container.duration / av.time_base)
+            if container.bit_rate:
+                media_format['bit_rate'] = str(container.bit_rate)
+            return {'streams': streams, 'format': media_format}
+
+    # Function to describe one stream like an entry of ffprobe's streams section
+    @staticmethod
+    def describe_stream(stream):
+        entry = {'codec_type': stream.type}
+        codec_context = stream.codec_context
+        if codec_context is None:
+            return entry
+        entry['codec_name'] = codec_context.name
+        if stream.type == 'audio':
+            entry['channels'] = len(codec_context.layout.channels)
+            entry['sample_rate'] = str(codec_context.sample_rate)
+            return entry
+        if stream.type != 'video':
+            return entry
+        entry['width'] = codec_context.width
+        entry['height'] = codec_context.height
+        # Same fields as ffprobe's stream section; ffprobe omits what libav doesn't know
+        if stream.duration is not None and stream.time_base is not None:
+            entry['duration'] = "%.6f" % float(stream.duration * stream.time_base)
+        if codec_context.bit_rate:
+            entry['bit_rate'] = str(codec_context.bit_rate)
+        if stream.base_rate:
+            entry['r_frame_rate'] = f"{stream.base_rate.numerator}/{stream.base_rate.denominator}"
+        if stream.sample_aspect_ratio:
+            entry['sample_aspect_ratio'] = f"{stream.sample_aspect_ratio.numerator}:{stream.sample_aspect_ratio.denominator}"
+        if stream.display_aspect_ratio:
+            entry['display_aspect_ratio'] = f"{stream.display_aspect_ratio.numerator}:{stream.display_aspect_ratio.denominator}"
+        if codec_context.pix_fmt:
+            entry['pix_fmt'] = codec_context.pix_fmt
+        bits_per_raw_sample = getattr(codec_context, 'bits_per_raw_sample', 0)
+        if bits_per_raw_sample:
+            entry['bits_per_raw_sample'] = str(bits_per_raw_sample)
+        return entry
+
+    def sample_packets(self, file_path, intervals, max_packets):
+        import av
+
+        packets = []
+        with av.open(file_path) as container:
+            if not container.streams.video:
+                return None
+            stream = container.streams.video[0]
+            time_base = stream.time_base
+            for start, length in intervals:
+                # Seeks to the keyframe at or before start
+                container.seek(int(start / time_base), stream=stream)
+                for packet in container.demux(stream):
+                    timestamp = packet.pts if packet.pts is not None else packet.dts
+                    if timestamp is None or not packet.size:
+                        continue
+                    packet_time = float(timestamp * time_base)
+                    if packet_time >= start + length:
+                        break
+                    packets.append((packet_time, float(packet.duration * time_base) if packet.duration else 0.0, packet.size))
+                    if len(packets) >= max_packets:
+                        return packets
+        return packets or None
+
+# Deterministic stand-in for tests and benchmarks: metadata is derived from a hash of the path,
+# latency simulates the cost of a real probe and error_rate makes that share of files fail
+class FakeBackend(ProbeBackend):
+    name = 'fake'
+    use_native = False
+
+    CODECS = ('h264', 'hevc', 'prores', 'hap', 'hap_q', 'vp9', 'av1', 'mpeg4')
+    RESOLUTIONS = ((1280, 720), (1920, 1080), (2560, 1440), (3840, 2160), (4096, 2160), (720, 576))
+    FRAME_RATES = ('24000/1001', '24/1', '25/1', '30000/1001', '50/1', '60/1')
+    PIX_FMTS = ('yuv420p', 'yuv422p10le', 'yuv444p12le', 'gbrp', 'rgba')
+    # (codec, channels, sample rate) of the audio stream; None for files without audio
+    AUDIO = (('aac', 2, 48000), ('aac', 2, 44100), ('pcm_s24le', 2, 48000), ('ac3', 6, 48000), ('opus', 2, 48000), None)
+    # format_name by extension, as ffprobe reports it; other extensions report themselves
+    FORMAT_NAMES = {'.mp4': 'mov,mp4,m4a,3gp,3g2,mj2', '.m4v': 'mov,mp4,m4a,3gp,3g2,mj2',
+                    '.mov': 'mov,mp4,m4a,3gp,3g2,mj2', '.mkv': 'matroska,webm', '.webm': 'matroska,webm'}
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+
+    def probe_file(self, file_path):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = zlib.crc32(os.path.basename(file_path).encode('utf-8', 'surrogateescape'), self.seed)
+        if digest % 10_000 < self.error_rate * 10_000:
+            return None
+        width, height = self.RESOLUTIONS[(digest >> 4) % len(self.RESOLUTIONS)]
+        entry = {
+            'codec_type': 'video',
+            'codec_name': self.CODECS[digest % len(self.CODECS)],
+            'width': width,
+            'height': height,
+            'duration': "%.6f" % (1 + (digest >> 8) % 7200),
+            'r_frame_rate': self.FRAME_RATES[(digest >> 12) % len(self.FRAME_RATES)],
+            'pix_fmt': self.PIX_FMTS[(digest >> 16) % len(self.PIX_FMTS)],
+        }
+        # About half the files report a stream bitrate, the rest none
+        if (digest >> 20) % 2:
+            entry['bit_rate'] = str(1_000_000 * (1 + (digest >> 21) % 200))
+        streams = [entry]
+        audio = self.AUDIO[(digest >> 24) % len(self.AUDIO)]
+        if audio is not None:
+            streams.append({'codec_type': 'audio', 'codec_name': audio[0], 'channels': audio[1], 'sample_rate': str(audio[2])})
+        if (digest >> 28) % 3 == 0:
+            streams.append({'codec_type': 'subtitle', 'codec_name': 'subrip'})
+
+        # Like Matroska, the stream has no duration of its own there and the container has it
+        extension = os.path.splitext(file_path)[1].lower()
+        duration = entry['duration']
+        if extension in ('.mkv', '.webm'):
+            del entry['duration']
+        media_format = {
+            'format_name': self.FORMAT_NAMES.get(extension, extension.lstrip('.') or 'unknown'),
+            'nb_streams': len(streams),
+            'duration': duration,
+            'bit_rate': str(int(entry.get('bit_rate', 8_000_000)) + (256_000 if audio is not None else 0)),
+        }
+        return {'streams': streams, 'format': media_format}
+
+    # Packets at the file's frame rate: files reporting a bitrate are encoded at a constant rate,
+    # in the others every second of video gets between a third and twice the mean packet size
+    def sample_packets(self, file_path, intervals, max_packets):
+        media = self.probe_file(file_path)
+        if media is None:
+            return None
+        entry = media['streams'][0]
+        num, den = entry['r_frame_rate'].split('/')
+        frame_duration = int(den) / int(num)
+        constant = 'bit_rate' in entry
+        mean_size = int(entry.get('bit_rate', 8_000_000)) * frame_duration / 8
+        packets = []
+        for start, length in intervals:
+            frame = int(start / frame_duration)
+            while frame * frame_duration < start + length and len(packets) < max_packets:
+                if constant:
+                    size = mean_size
+                else:
+                    second = int(frame * frame_duration)
+                    size = mean_size * (0.33 + 1.67 * (zlib.crc32(second.to_bytes(8, 'little'), self.seed) % 1000) / 1000)
+                packets.append((frame * frame_duration, frame_duration, int(size)))
+                frame += 1
+        return packets
+
+# Backends selectable per scan
+PROBE_BACKENDS = {
+    'ffprobe': FFprobeBackend,
+    'pyav': PyAVBackend,
+    'fake': FakeBackend,
+}
+
+# Function to build a backend by name; raises ValueError for unknown names
+def get_backend(name, **options):
+    try:
+        backend_class = PROBE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown probe backend '{name}'. Choose from: {', '.join(PROBE_BACKENDS)}.")
+    return backend_class(**options)
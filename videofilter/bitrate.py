@@ -0,0 +1,76 @@
+import math
+
+# Bitrate sampling ("deep probe"): instead of trusting the bit_rate a header reports, read the packet
+# sizes of a few short windows spread over the file and measure the bitrate of each window. Only
+# runs when a criterion needs the bitrate (see ScanPlan.samples_bitrate), and reads at most
+# SAMPLE_WINDOWS * SAMPLE_WINDOW_SECONDS of the file and MAX_SAMPLED_PACKETS packets.
+
+# Windows sampled per file
+SAMPLE_WINDOWS = 8
+
+# Length of one window; the peak bitrate is the highest bitrate over this many seconds
+SAMPLE_WINDOW_SECONDS = 2.0
+
+# Most packets read per file, which caps the cost for high frame rates and intra-only codecs
+MAX_SAMPLED_PACKETS = 4000
+
+# A window only counts when its packets cover at least this share of it (the first window read
+# after a seek may start late, or hold a few packets from before the seek point)
+MIN_WINDOW_COVERAGE = 0.5
+
+# Streams whose window bitrates vary less than this (standard deviation over mean) are constant
+CBR_MAX_VARIATION = 0.15
+
+# Function to choose the (start, length) intervals to read, in seconds: windows spread evenly over
+# the duration, aligned to the window grid. Without a known duration the start of the file is read.
+def sample_intervals(duration, windows=SAMPLE_WINDOWS, window_seconds=SAMPLE_WINDOW_SECONDS):
+    if duration <= 0:
+        return [(0.0, windows * window_seconds)]
+    cells = int(duration // window_seconds)
+    if cells <= windows:
+        return [(0.0, max(duration, window_seconds))]
+    step = cells / windows
+    return [(int(step * n + step / 2) * window_seconds, window_seconds) for n in range(windows)]
+
+# Function to turn sampled packets, (time, duration, size in bytes) in seconds, into bitrate figures:
+#   bitrate: average over the sampled windows, in bits per second
+#   peak_bitrate: bitrate of the busiest window
+#   bitrate_stddev: standard deviation of the window bitrates
+#   bitrate_mode: 'Constant' or 'Variable'
+# Returns None when the packets don't cover a single window.
+def bitrate_stats(packets, window_seconds=SAMPLE_WINDOW_SECONDS):
+    # Group packets on the window grid: cell -> [first time, end time, bytes]
+    cells = {}
+    for time, duration, size in packets:
+        cell = cells.get(int(time // window_seconds))
+        if cell is None:
+            cells[int(time // window_seconds)] = [time, time + duration, size]
+        else:
+            cell[0] = min(cell[0], time)
+            cell[1] = max(cell[1], time + duration)
+            cell[2] += size
+
+    spans = []
+    rates = []
+    for first, end, size in cells.values():
+        span = end - first
+        if span >= window_seconds * MIN_WINDOW_COVERAGE:
+            spans.append(span)
+            rates.append(size * 8 / span)
+    if not rates:
+        return None
+
+    average = sum(rate * span for rate, span in zip(rates, spans)) / sum(spans)
+    mean = sum(rates) / len(rates)
+    stddev = math.sqrt(sum((rate - mean) ** 2 for rate in rates) / len(rates))
+    # A single window says nothing about variation
+    if len(rates) < 2:
+        mode = 'Unknown'
+    else:
+        mode = 'Constant' if stddev <= mean * CBR_MAX_VARIATION else 'Variable'
+    return {
+        'bitrate': int(round(average)),
+        'peak_bitrate': int(round(max(rates))),
+        'bitrate_stddev': int(round(stddev)),
+        'bitrate_mode': mode,
+    }
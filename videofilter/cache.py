@@ -0,0 +1,253 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+
+from .records import VideoInfo, as_dict
+
+# Metadata cache stored next to the app; bump the schema version whenever get_video_info's output changes
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vfapp_cache.sqlite3')
+CACHE_SCHEMA_VERSION = 3
+CACHE_MAX_ENTRIES = 1_000_000
+
+# A stored directory listing is only trusted when the directory's mtime is older than the listing
+# by this much; changes made within the same mtime tick as the listing would otherwise go unseen
+DIR_RACY_WINDOW_NS = 2_000_000_000
+
+# Function to build the stat signature used to validate cache entries
+def stat_signature(file_path):
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+# Persistent SQLite cache of get_video_info results, validated against (size, mtime_ns, inode)
+class MetadataCache:
+    def __init__(self, db_path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, batch_size=500):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending_rows = []
+        self.touched_paths = []
+        self.pending_dirs = []
+        self.pending_hashes = []
+        self.hits = 0
+        self.misses = 0
+        self.changed = 0
+        self.removed = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_SCHEMA_VERSION:
+            # Entries written by another version may not have the same fields
+            self.conn.execute("DROP TABLE IF EXISTS probe_cache")
+            self.conn.execute("DROP TABLE IF EXISTS dir_snapshot")
+            self.conn.execute("DROP TABLE IF EXISTS file_hash")
+            self.conn.execute(f"PRAGMA user_version={CACHE_SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe_cache ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+            "info TEXT, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS probe_cache_last_used ON probe_cache(last_used)")
+        # Directory listings from the last incremental scan, replayed while the directory is unchanged
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS dir_snapshot ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, inode INTEGER, listed_at INTEGER, entries TEXT)"
+        )
+        # Content hashes of the duplicate finder (see duplicates.py), validated like probe results
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_hash ("
+            "path TEXT, kind TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT, "
+            "PRIMARY KEY (path, kind))"
+        )
+        self.conn.commit()
+
+    # Return (signature, info); info is None when the file changed or was never cached.
+    # A signature already known to the caller (e.g. from a DirEntry) saves the stat call.
+    def lookup(self, file_path, signature=None):
+        if signature is None:
+            signature = stat_signature(file_path)
+        if signature is None:
+            return None, None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, inode, info FROM probe_cache WHERE path = ?", (file_path,)
+            ).fetchone()
+            if row is None or tuple(row[:3]) != signature:
+                self.misses += 1
+                if row is not None:
+                    self.changed += 1
+                return signature, None
+            self.hits += 1
+            self.touched_paths.append(file_path)
+            if len(self.touched_paths) >= self.batch_size:
+                self._flush()
+        return signature, VideoInfo.from_dict(json.loads(row[3]))
+
+    def store(self, file_path, signature, info):
+        if signature is None:
+            signature = stat_signature(file_path)
+            if signature is None:
+                return
+        with self.lock:
+            self.pending_rows.append((file_path, *signature, json.dumps(as_dict(info)), time.time()))
+            if len(self.pending_rows) >= self.batch_size:
+                self._flush()
+
+    # Return the stored [(position, name, flags)] listing of a directory, or None when it changed
+    def lookup_dir(self, dir_path, mtime_ns, inode):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, inode, listed_at, entries FROM dir_snapshot WHERE path = ?", (dir_path,)
+            ).fetchone()
+            if row is None or row[0] != mtime_ns or row[1] != inode or row[2] - mtime_ns < DIR_RACY_WINDOW_NS:
+                self.dir_misses += 1
+                return None
+            self.dir_hits += 1
+        return json.loads(row[3])
+
+    def store_dir(self, dir_path, mtime_ns, inode, listed_at, entries):
+        with self.lock:
+            self.pending_dirs.append((dir_path, mtime_ns, inode, listed_at, json.dumps(entries)))
+            if len(self.pending_dirs) >= self.batch_size:
+                self._flush()
+
+    # Return the stored hash of the given kind, or None when the file changed or was never hashed
+    def lookup_hash(self, file_path, signature, kind):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, inode, digest FROM file_hash WHERE path = ? AND kind = ?", (file_path, kind)
+            ).fetchone()
+        if row is None or tuple(row[:3]) != signature:
+            return None
+        return row[3]
+
+    def store_hash(self, file_path, signature, kind, digest):
+        with self.lock:
+            self.pending_hashes.append((file_path, kind, *signature, digest))
+            if len(self.pending_hashes) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        with self.conn:
+            if self.pending_dirs:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO dir_snapshot (path, mtime_ns, inode, listed_at, entries) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    self.pending_dirs
+                )
+                self.pending_dirs = []
+            if self.pending_rows:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO probe_cache (path, size, mtime_ns, inode, info, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self.pending_rows
+                )
+                self.pending_rows = []
+            if self.pending_hashes:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO file_hash (path, kind, size, mtime_ns, inode, digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self.pending_hashes
+                )
+                self.pending_hashes = []
+            if self.touched_paths:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE probe_cache SET last_used = ? WHERE path = ?",
+                    [(now, path) for path in self.touched_paths]
+                )
+                self.touched_paths = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    # Drop cached files under root that were not seen by the last full scan and no longer exist
+    # (deleted or renamed), and stored listings of directories under root that were not walked (when
+    # seen_dirs is given). A walk restricted by depth, excluded folders or its symlink policy passes
+    # the directories it listed as listed_dirs, and only files in those are dropped.
+    def prune(self, root, seen_paths, seen_dirs=None, listed_dirs=None):
+        prefix = os.path.join(root, '')
+        # Paths under root sort between prefix and prefix with its separator incremented
+        bounds = (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        with self.lock:
+            self._flush()
+            stale = [
+                (path,) for (path,) in self.conn.execute(
+                    "SELECT path FROM probe_cache WHERE path >= ? AND path < ?", bounds)
+                if path not in seen_paths
+                and (listed_dirs is None or os.path.dirname(path) in listed_dirs)
+                and not os.path.lexists(path)
+            ]
+            stale_dirs = []
+            if seen_dirs is not None:
+                stale_dirs = [
+                    (path,) for (path,) in self.conn.execute(
+                        "SELECT path FROM dir_snapshot WHERE path = ? OR (path >= ? AND path < ?)",
+                        (os.path.normpath(root),) + bounds)
+                    if path not in seen_dirs
+                ]
+            with self.conn:
+                self.conn.executemany("DELETE FROM probe_cache WHERE path = ?", stale)
+                self.conn.executemany("DELETE FROM file_hash WHERE path = ?", stale)
+                self.conn.executemany("DELETE FROM dir_snapshot WHERE path = ?", stale_dirs)
+        self.removed += len(stale)
+        return len(stale)
+
+    # Drop every entry whose file no longer exists or no longer matches its signature
+    def prune_missing(self):
+        with self.lock:
+            self._flush()
+            stale = [
+                (path,) for path, size, mtime_ns, inode in
+                self.conn.execute("SELECT path, size, mtime_ns, inode FROM probe_cache").fetchall()
+                if stat_signature(path) != (size, mtime_ns, inode)
+            ]
+            stale_hashes = [
+                (path, kind) for path, kind, size, mtime_ns, inode in
+                self.conn.execute("SELECT path, kind, size, mtime_ns, inode FROM file_hash").fetchall()
+                if stat_signature(path) != (size, mtime_ns, inode)
+            ]
+            with self.conn:
+                self.conn.executemany("DELETE FROM probe_cache WHERE path = ?", stale)
+                self.conn.executemany("DELETE FROM file_hash WHERE path = ? AND kind = ?", stale_hashes)
+        return len(stale)
+
+    # Evict least recently used entries beyond max_entries
+    def evict(self):
+        with self.lock:
+            self._flush()
+            count = self.conn.execute("SELECT COUNT(*) FROM probe_cache").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                with self.conn:
+                    self.conn.execute(
+                        "DELETE FROM probe_cache WHERE path IN "
+                        "(SELECT path FROM probe_cache ORDER BY last_used ASC LIMIT ?)",
+                        (excess,)
+                    )
+        return max(excess, 0)
+
+    def clear(self):
+        with self.lock:
+            self.pending_rows = []
+            self.touched_paths = []
+            self.pending_dirs = []
+            self.pending_hashes = []
+            with self.conn:
+                self.conn.execute("DELETE FROM probe_cache")
+                self.conn.execute("DELETE FROM dir_snapshot")
+                self.conn.execute("DELETE FROM file_hash")
+
+    def close(self):
+        self.flush()
+        self.evict()
+        self.conn.close()
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .cache import DIR_RACY_WINDOW_NS, stat_signature
+from .records import INFO_FIELDS, VideoInfo, as_dict
+
+# Checkpoints of running scans, so a scan that dies (reboot, crash, closed window) can resume where
+# it stopped instead of starting again. A scan writes an append-only journal (NDJSON):
+#
+#   {"format": "videofilter-checkpoint", "version": 1, "scan": {...identity...}, "started": ...}
+#   {"dir": path, "mtime_ns": ..., "inode": ..., "listed_at": ..., "entries": [[position, name, flags], ...]}
+#   {"path": path, "signature": [size, mtime_ns, inode], "info": {...}, "match": true}
+#
+# Directory records are the listings the walk has made, file records the files done (info null when
+# the probe failed, so they are tried again). A resumed scan walks again from the journal's listings
+# (directories are only listed anew when they changed), takes the info of unchanged files from the
+# journal and probes the rest, so its results are the same as those of an uninterrupted scan.
+# The journal is deleted once its scan completes.
+
+# Journals stored next to the app, like the metadata cache
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vfapp_checkpoints')
+
+CHECKPOINT_FORMAT = 'videofilter-checkpoint'
+CHECKPOINT_VERSION = 1
+
+# Seconds between fsyncs of a journal; a crash of the machine loses at most this much work
+CHECKPOINT_INTERVAL = 5.0
+
+# Seconds between handing buffered records to the OS; a killed process loses at most this much work
+CHECKPOINT_FLUSH_INTERVAL = 0.5
+
+# Function to describe what the results of a scan depend on; a checkpoint is only resumed by a scan
+# with the same description
+def scan_identity(folder, criteria, max_depth=None, symlinks='files', sample_bitrate=True, shard=None):
+    return {
+        'root': os.path.abspath(folder),
+        'criteria': criteria['expression_text'],
+        'max_depth': max_depth,
+        'symlinks': symlinks,
+        'sample_bitrate': sample_bitrate,
+        'shard': list(shard) if shard else None,
+        'info_fields': list(INFO_FIELDS),
+    }
+
+# Function to get the journal path of a scan
+def checkpoint_path(identity, directory=CHECKPOINT_DIR):
+    digest = hashlib.blake2b(json.dumps(identity, sort_keys=True).encode('utf-8'), digest_size=12).hexdigest()
+    return os.path.join(directory, f"scan-{digest}.ndjson")
+
+# Function to read a journal; returns (header, dirs, files, end) with dirs {path: (mtime_ns, inode,
+# listed_at, entries)}, files {path: (signature, info dict or None)} and end the byte offset just
+# past the last complete record, or None when the file is missing or not a journal of this version.
+# A record is complete when its line ends with a newline and parses; reading stops at the first
+# one that is not (a crash while writing), and a resumed journal is cut back to end.
+def read_journal(journal_path):
+    dirs = {}
+    files = {}
+    try:
+        with open(journal_path, 'rb') as f:
+            line = f.readline()
+            try:
+                header = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                return None
+            if not isinstance(header, dict) or header.get('format') != CHECKPOINT_FORMAT \
+                    or header.get('version') != CHECKPOINT_VERSION:
+                return None
+            end = len(line)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                    if 'dir' in record:
+                        dirs[record['dir']] = (record['mtime_ns'], record['inode'], record['listed_at'],
+                                               record['entries'])
+                    else:
+                        files[record['path']] = (tuple(record['signature']) if record['signature'] else None,
+                                                 record['info'])
+                except (ValueError, TypeError, KeyError):
+                    break
+                end += len(line)
+    except OSError:
+        return None
+    return header, dirs, files, end
+
+# Function to summarize the checkpoint of a scan, for offering to resume it: {'path', 'started',
+# 'files'} with files the number of files done, or None when there is none
+def find_checkpoint(identity, directory=CHECKPOINT_DIR):
+    journal_path = checkpoint_path(identity, directory)
+    journal = read_journal(journal_path)
+    if journal is None or journal[0].get('scan') != identity:
+        return None
+    header, _, files, _ = journal
+    return {'path': journal_path, 'started': header.get('started'), 'files': len(files)}
+
+# Function to delete the checkpoint of a scan, if any
+def discard_checkpoint(identity, directory=CHECKPOINT_DIR):
+    try:
+        os.remove(checkpoint_path(identity, directory))
+    except OSError:
+        pass
+
+# Journal of one scan (see above). With resume=True the existing journal of the same scan is
+# continued, otherwise a new one is started. run_scan uses it in front of the metadata cache and
+# the walk snapshot (attach), with the same lookup/store and lookup_dir/store_dir methods, and
+# records every file it finishes. Only what a resumed journal holds is kept in memory; new records
+# are just appended. Safe to use from the walker threads.
+class ScanJournal:
+    def __init__(self, identity, resume=False, directory=CHECKPOINT_DIR):
+        self.identity = identity
+        self.path = checkpoint_path(identity, directory)
+        self.lock = threading.Lock()
+        self.dirs = {}
+        self.files = {}
+        # Files answered from the journal, which need no new record
+        self.reused = set()
+        self.cache = None
+        self.snapshot = None
+        self.resumed = False
+        if resume:
+            journal = read_journal(self.path)
+            if journal is not None and journal[0].get('scan') == identity:
+                _, self.dirs, files, end = journal
+                self.files = {path: (signature, VideoInfo.from_dict(info) if info is not None else None)
+                              for path, (signature, info) in files.items()}
+                self.resumed = True
+        self.next_sync = time.monotonic() + CHECKPOINT_INTERVAL
+        self.next_flush = time.monotonic() + CHECKPOINT_FLUSH_INTERVAL
+        os.makedirs(directory, exist_ok=True)
+        if self.resumed:
+            # Cut off a partial last record, so new records don't get glued onto it
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(self.path, 'wb')
+            self._write({'format': CHECKPOINT_FORMAT, 'version': CHECKPOINT_VERSION,
+                         'scan': identity, 'started': time.time()})
+            self.sync()
+
+    # Put the journal in front of the metadata cache and of the walk snapshot (incremental scans)
+    def attach(self, cache=None, snapshot=None):
+        self.cache = cache
+        self.snapshot = snapshot
+
+    def _write(self, record):
+        self.file.write((json.dumps(record) + "\n").encode('utf-8'))
+        now = time.monotonic()
+        if now >= self.next_sync:
+            self.sync()
+        elif now >= self.next_flush:
+            self.file.flush()
+            self.next_flush = now + CHECKPOINT_FLUSH_INTERVAL
+
+    # Flush the journal to disk
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.next_sync = time.monotonic() + CHECKPOINT_INTERVAL
+        self.next_flush = time.monotonic() + CHECKPOINT_FLUSH_INTERVAL
+
+    # Return (signature, info) like MetadataCache.lookup: from the journal for unchanged files it
+    # recorded, otherwise from the cache
+    def lookup(self, file_path, signature=None):
+        if signature is None:
+            signature = stat_signature(file_path)
+        with self.lock:
+            recorded = self.files.get(file_path)
+            if signature is not None and recorded is not None and recorded[0] == signature and recorded[1] is not None:
+                self.reused.add(file_path)
+                return signature, recorded[1]
+        if self.cache is not None:
+            return self.cache.lookup(file_path, signature)
+        return signature, None
+
+    def store(self, file_path, signature, info):
+        if self.cache is not None:
+            self.cache.store(file_path, signature, info)
+
+    # Return a directory listing made by this scan while the directory is unchanged, otherwise
+    # the snapshot's (see MetadataCache.lookup_dir)
+    def lookup_dir(self, dir_path, mtime_ns, inode):
+        with self.lock:
+            recorded = self.dirs.get(dir_path)
+        if recorded is not None and recorded[0] == mtime_ns and recorded[1] == inode \
+                and recorded[2] - mtime_ns >= DIR_RACY_WINDOW_NS:
+            return recorded[3]
+        if self.snapshot is not None:
+            return self.snapshot.lookup_dir(dir_path, mtime_ns, inode)
+        return None
+
+    def store_dir(self, dir_path, mtime_ns, inode, listed_at, entries):
+        with self.lock:
+            self._write({'dir': dir_path, 'mtime_ns': mtime_ns, 'inode': inode, 'listed_at': listed_at,
+                         'entries': entries})
+        if self.snapshot is not None:
+            self.snapshot.store_dir(dir_path, mtime_ns, inode, listed_at, entries)
+
+    def prune(self, root, seen_paths, seen_dirs=None, listed_dirs=None):
+        if self.cache is not None:
+            return self.cache.prune(root, seen_paths, seen_dirs, listed_dirs)
+        return 0
+
+    # Record a finished file: its signature, info (None when the probe failed or was not needed)
+    # and whether it matched. Files answered from the journal are not written again.
+    def record(self, file_path, signature, info, matched):
+        with self.lock:
+            if file_path in self.reused:
+                self.reused.discard(file_path)
+                return
+            self._write({'path': file_path, 'signature': list(signature) if signature else None,
+                         'info': as_dict(info) if info is not None else None, 'match': matched})
+
+    # Close the journal; the journal of a completed scan is deleted, any other is kept to resume from
+    def close(self, complete=False):
+        with self.lock:
+            self.sync()
+            self.file.close()
+        if complete:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,504 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import probe
+from .backends import (DEFAULT_ANALYZE_DURATION, DEFAULT_PROBE_RETRIES, DEFAULT_PROBE_TIMEOUT, DEFAULT_PROBESIZE,
+                       PROBE_BACKENDS, BackendUnavailable, FFprobeBackend, get_backend)
+from .cache import CACHE_PATH, MetadataCache
+from .checkpoint import CHECKPOINT_DIR
+from .config import CONFIG_PATH
+from .duplicates import DEFAULT_HASH_WORKERS, find_duplicates, group_results
+from .export import DUPLICATE_SINKS, RESULT_SINKS, write_failures
+from .expr import format_expression, make_and
+from .planner import ScanPlan
+from .probe import DEFAULT_PROBE_WORKERS
+from .progress import progress_printer
+from .records import as_dict
+from .scan import FILTER_OPTIONS, parse_criteria, run_scan
+from .timing import ScanTimings, format_report
+from .walker import DEFAULT_WALK_WORKERS, SYMLINK_POLICIES, parse_shard
+
+# Exit codes, grep style: a scheduler can tell "nothing matched" apart from a failure
+EXIT_OK = 0
+EXIT_NO_MATCHES = 1
+EXIT_USAGE = 2
+EXIT_FFPROBE_MISSING = 3  # or the selected probe backend can't run
+EXIT_SCAN_ERROR = 4
+
+# Form fields that switch each filter on when given on the command line or in a query file
+FILTER_FIELDS = {
+    'codec': ('codec',),
+    'resolution': ('min_resolution', 'max_resolution'),
+    'duration': ('min_duration', 'max_duration'),
+    'size': ('min_size', 'max_size'),
+    'bitrate': ('min_bitrate', 'max_bitrate'),
+    'bitrate_mode': ('bitrate_mode',),
+    'framerate': ('min_framerate', 'max_framerate'),
+    'dar': ('dar',),
+    'color_space': ('color_space',),
+    'bit_depth': ('min_bit_depth', 'max_bit_depth'),
+    'extension': ('extensions',),
+    'mtime': ('modified_after', 'modified_before'),
+    'path': ('include', 'exclude')
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m videofilter',
+        description="Filter video files by codec, resolution, duration, size, bitrate, framerate, "
+                    "aspect ratio, color space and bit depth without starting the GUI."
+    )
+    parser.add_argument('folder', nargs='?', help="Folder to scan (may also be given as 'folder' in the query file).")
+    parser.add_argument('--query', metavar='FILE', help="JSON file with the same fields as the GUI form, e.g. {\"codec\": \"h264\", \"min_resolution\": \"1920x1080\"}.")
+
+    criteria = parser.add_argument_group('criteria (a filter is enabled when one of its values is given)')
+    criteria.add_argument('--codec')
+    criteria.add_argument('--min-resolution', metavar='WxH')
+    criteria.add_argument('--max-resolution', metavar='WxH')
+    criteria.add_argument('--min-duration', metavar='SECONDS')
+    criteria.add_argument('--max-duration', metavar='SECONDS')
+    criteria.add_argument('--min-size', metavar='MB')
+    criteria.add_argument('--max-size', metavar='MB')
+    criteria.add_argument('--min-bitrate', metavar='KBPS')
+    criteria.add_argument('--max-bitrate', metavar='KBPS')
+    criteria.add_argument('--bitrate-mode', choices=['Any', 'Variable', 'Constant'])
+    criteria.add_argument('--min-framerate', metavar='FPS')
+    criteria.add_argument('--max-framerate', metavar='FPS')
+    criteria.add_argument('--dar', metavar='W:H')
+    criteria.add_argument('--color-space')
+    criteria.add_argument('--min-bit-depth', metavar='BITS')
+    criteria.add_argument('--max-bit-depth', metavar='BITS')
+    criteria.add_argument('--extensions', metavar='EXT,...', help="Only these extensions, e.g. mp4,mov.")
+    criteria.add_argument('--modified-after', metavar='DATE', help="Modified on or after DATE (YYYY-MM-DD[ HH:MM]).")
+    criteria.add_argument('--modified-before', metavar='DATE', help="Modified before DATE (YYYY-MM-DD[ HH:MM]).")
+    criteria.add_argument('--include', metavar='GLOB', action='append', help="Only paths matching GLOB (repeatable).")
+    criteria.add_argument('--exclude', metavar='GLOB', action='append', help="Skip paths matching GLOB (repeatable).")
+    criteria.add_argument('--where', metavar='EXPR', dest='expression',
+                          help="Filter expression, ANDed with the other criteria, e.g. "
+                               "\"codec in (prores, hap_q) and height >= 2160 and not bitrate_mode == Variable\".")
+    criteria.add_argument('--explain', action='store_true',
+                          help="Print the filter expression and which parts run before probing, then exit.")
+
+    output = parser.add_argument_group('output')
+    output.add_argument('-o', '--output', metavar='FILE', help="Write matches to FILE instead of stdout.")
+    output.add_argument('--format', choices=['text', 'json', 'ndjson', 'csv'], default='text',
+                        help="'text' writes one path per line (like output.txt), 'json' a JSON list of path and metadata, "
+                             "'ndjson' one JSON object per line, 'csv' the columns of the GUI's CSV export.")
+    output.add_argument('--stream', action='store_true',
+                        help="Write each match as soon as it is found (in the order probes finish) instead of all "
+                             "matches in folder order at the end; matches are not kept in memory. Not with --format json.")
+    output.add_argument('--append', action='store_true', help="With -o, add to FILE instead of replacing it.")
+    output.add_argument('-q', '--quiet', action='store_true', help="Don't print the summary line to stderr.")
+    output.add_argument('--progress', choices=['log', 'json'],
+                        help="Report progress on stderr: 'log' as text lines, 'json' as one JSON object per line "
+                             "(done, total, matches, files_per_sec, mb_per_sec, eta, ...).")
+    output.add_argument('--timings', metavar='FILE',
+                        help="Time each phase of the scan (walk, probe spawn/wait/parse, cache, matching, output) "
+                             "and write a JSON report with percentiles, histograms, the slowest files and counters to FILE.")
+    output.add_argument('--progress-interval', type=float, default=1.0, metavar='SECONDS',
+                        help="Seconds between progress reports (default 1).")
+    output.add_argument('--failed', metavar='FILE',
+                        help="Write the files that could not be probed to FILE, one per line with the reason after a tab.")
+
+    scanning = parser.add_argument_group('scanning')
+    scanning.add_argument('--workers', type=int, default=DEFAULT_PROBE_WORKERS, help="Number of files probed at the same time.")
+    scanning.add_argument('--processes', action='store_true', help="Use a process pool instead of a thread pool.")
+    scanning.add_argument('--async', dest='use_async', action='store_true',
+                          help="Run ffprobe processes from an asyncio event loop instead of a thread pool; "
+                               "--workers still limits how many run at the same time.")
+    scanning.add_argument('--walk-workers', type=int, default=DEFAULT_WALK_WORKERS, help="Number of directories listed at the same time.")
+    scanning.add_argument('--max-depth', type=int, metavar='N', help="Don't descend more than N folders below the scanned folder.")
+    scanning.add_argument('--symlinks', choices=SYMLINK_POLICIES, default='files',
+                          help="skip: ignore links; files: follow links to files (default); follow: also descend into linked folders.")
+    scanning.add_argument('--no-cache', action='store_true', help="Don't read or update the metadata cache.")
+    scanning.add_argument('--incremental', action='store_true',
+                          help="Remember folder listings in the cache and only re-list folders and re-probe files that changed since the last incremental scan.")
+    scanning.add_argument('--cache-path', default=CACHE_PATH, help="Location of the metadata cache.")
+    scanning.add_argument('--prune-cache', action='store_true',
+                          help="Drop cached metadata of files that were deleted or changed since they were cached, then exit "
+                               "(no folder needed).")
+    scanning.add_argument('--config-path', default=CONFIG_PATH,
+                          help="Location of the config cache, which remembers where ffprobe is between runs.")
+    scanning.add_argument('--backend', choices=list(PROBE_BACKENDS), default='ffprobe',
+                          help="How files are probed: ffprobe processes (default), pyav in-process (needs PyAV), "
+                               "or fake deterministic metadata for tests and benchmarks (never cached).")
+    scanning.add_argument('--fake-latency', type=float, default=0.0, metavar='SECONDS',
+                          help="Simulated time per probe with --backend fake.")
+    scanning.add_argument('--duplicates', action='store_true',
+                          help="Only list matching files with identical content, grouped (copies of the same file). "
+                               "Files are compared by size, then by their first and last 64 KiB, and only then hashed in full.")
+    scanning.add_argument('--hash-workers', type=int, default=DEFAULT_HASH_WORKERS,
+                          help="Number of files hashed at the same time with --duplicates.")
+    scanning.add_argument('--ffprobe', metavar='PATH', help="ffprobe executable to use.")
+    scanning.add_argument('--no-native', action='store_true',
+                          help="Always run ffprobe instead of reading MP4/MOV/MKV headers directly.")
+    scanning.add_argument('--no-bitrate-sampling', action='store_true',
+                          help="Don't sample packets to measure the bitrate when a bitrate criterion is given; "
+                               "use the bitrate the file reports (the bitrate mode is then Unknown).")
+    scanning.add_argument('--probe-timeout', type=float, default=DEFAULT_PROBE_TIMEOUT, metavar='SECONDS',
+                          help=f"Kill an ffprobe run after this long (default {DEFAULT_PROBE_TIMEOUT:g}; 0 waits forever).")
+    scanning.add_argument('--probe-retries', type=int, default=DEFAULT_PROBE_RETRIES, metavar='N',
+                          help=f"Try a file again this many times after a timeout or a failed start (default {DEFAULT_PROBE_RETRIES}).")
+    scanning.add_argument('--probesize', type=int, default=DEFAULT_PROBESIZE, metavar='BYTES',
+                          help=f"Bytes ffprobe reads to find the streams on its first try (default {DEFAULT_PROBESIZE}); "
+                               "files not described within that are probed again with ffprobe's defaults. 0 always uses the defaults.")
+    scanning.add_argument('--analyzeduration', type=float, default=DEFAULT_ANALYZE_DURATION, metavar='SECONDS',
+                          help=f"Seconds of media ffprobe analyzes on its first try (default {DEFAULT_ANALYZE_DURATION:g}; "
+                               "0 uses ffprobe's default).")
+
+    checkpoints = parser.add_argument_group('checkpoints (resume a scan that was interrupted)')
+    checkpoints.add_argument('--checkpoint', action='store_true',
+                             help="Keep a journal of the scan while it runs, so an interrupted scan can be resumed; "
+                                  "the journal is deleted once the scan completes.")
+    checkpoints.add_argument('--resume', action='store_true',
+                             help="Resume the interrupted scan of the same folder and criteria from its journal "
+                                  "(implies --checkpoint); without one the scan starts from the beginning.")
+    checkpoints.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR, metavar='DIR',
+                             help="Folder of the scan journals.")
+
+    sharding = parser.add_argument_group('sharding (split a scan over processes or hosts, then merge)')
+    sharding.add_argument('--manifest', metavar='FILE',
+                          help="Scan the files listed in FILE (one path per line; relative paths are taken from the folder) "
+                               "instead of walking the folder.")
+    sharding.add_argument('--shard', metavar='I/N',
+                          help="Only scan the I-th of N shards; files are split by a hash of their path relative to the folder, "
+                               "so every host running a shard of the same folder agrees on the split.")
+    sharding.add_argument('--shard-output', metavar='FILE',
+                          help="Also write a shard file: every file that passed the path/stat criteria with its stat "
+                               "signature, metadata and whether it matched, for --merge.")
+    sharding.add_argument('--shards', type=int, metavar='N',
+                          help="Run the scan as N shards in N processes on this machine and merge them.")
+    sharding.add_argument('--shard-dir', metavar='DIR',
+                          help="With --shards, keep the shard files in DIR instead of a temporary folder.")
+    sharding.add_argument('--merge', metavar='SHARD', nargs='+',
+                          help="Merge shard files into one result set (written like a scan's) and into the metadata cache "
+                               "instead of scanning; files found by several shards are kept once. With a folder, files "
+                               "are mapped onto it through their paths relative to their shard's folder.")
+    return parser
+
+# Function to read a manifest: one path per line, relative paths taken from folder
+def read_manifest(manifest_path, folder=None):
+    with open(manifest_path, encoding='utf-8') as f:
+        paths = [line.rstrip('\r\n') for line in f]
+    return [os.path.join(folder, path) if folder else path for path in paths if path.strip()]
+
+# Function to merge the query file and command line flags into a GUI-style form
+def build_form(args):
+    form = {}
+    if args.query:
+        with open(args.query, encoding='utf-8') as f:
+            form = json.load(f)
+        if not isinstance(form, dict):
+            raise ValueError("The query file must contain a JSON object.")
+        form = {key: value if isinstance(value, (dict, list)) else str(value) for key, value in form.items()}
+
+    for fields in FILTER_FIELDS.values():
+        for field in fields:
+            value = getattr(args, field)
+            if value is not None:
+                form[field] = value
+    if args.expression is not None:
+        form['expression'] = args.expression
+    if args.folder:
+        form['folder'] = args.folder
+
+    # Without explicit options, enable every filter that was given a value
+    if 'options' not in form:
+        form['options'] = {
+            name: any(form.get(field) for field in FILTER_FIELDS[name]) for name in FILTER_OPTIONS
+        }
+    return form
+
+def write_results(results, output, output_format, duplicates=False):
+    if output_format == 'json':
+        json.dump([as_dict(result) for result in results], output, indent=2)
+        output.write("\n")
+    else:
+        with (DUPLICATE_SINKS if duplicates else RESULT_SINKS)[output_format](output) as sink:
+            sink.write_all(results)
+
+# Function to open the result sink for -o FILE (or stdout) in the chosen format
+def open_sink(args):
+    sink_class = (DUPLICATE_SINKS if args.duplicates else RESULT_SINKS)[args.format]
+    if args.output:
+        return sink_class(args.output, append=args.append)
+    return sink_class(sys.stdout)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        form = build_form(args)
+        criteria = parse_criteria(form)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.explain:
+        plan = ScanPlan(criteria)
+        print(criteria['expression_text'])
+        for label, checks in (('path', plan.path_checks), ('stat', plan.stat_checks), ('probe', plan.probe_checks)):
+            if checks:
+                print(f"  {label}: {format_expression(make_and(checks))}")
+        if plan.samples_bitrate and not args.no_bitrate_sampling:
+            print("  bitrate sampling: on")
+        return EXIT_OK
+
+    if args.prune_cache:
+        try:
+            cache = MetadataCache(args.cache_path)
+            try:
+                removed = cache.prune_missing()
+            finally:
+                cache.close()
+        except Exception as e:
+            print(f"Error: Failed to prune the cache: {e}", file=sys.stderr)
+            return EXIT_SCAN_ERROR
+        if not args.quiet:
+            print(f"Removed {removed} stale files from the metadata cache.", file=sys.stderr)
+        return EXIT_OK
+
+    folder = form.get('folder')
+    # A manifest or shard files stand in for the folder, which is then only a root for their paths
+    if not folder and not (args.manifest or args.merge):
+        print("Error: Please select a folder.", file=sys.stderr)
+        return EXIT_USAGE
+    if folder and not os.path.isdir(folder):
+        print(f"Error: {folder} is not a folder.", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.shards is not None and args.shards < 1:
+        print("Error: Invalid number of shards.", file=sys.stderr)
+        return EXIT_USAGE
+    if sum(bool(option) for option in (args.shard, args.shards, args.merge)) > 1:
+        print("Error: Use only one of --shard, --shards and --merge.", file=sys.stderr)
+        return EXIT_USAGE
+    if (args.shards or args.merge) and (args.stream or args.timings or args.shard_output or args.failed):
+        print("Error: --shards and --merge can't be used with --stream, --timings, --shard-output or --failed.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.merge and args.manifest:
+        print("Error: --merge reads shard files, not a manifest.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.incremental and (args.manifest or args.shard or args.shards or args.merge):
+        print("Error: --incremental remembers whole folder listings and can't be used with --manifest or shards.", file=sys.stderr)
+        return EXIT_USAGE
+    if (args.checkpoint or args.resume) and (args.manifest or args.shards or args.merge):
+        print("Error: --checkpoint and --resume can't be used with --manifest, --shards or --merge.", file=sys.stderr)
+        return EXIT_USAGE
+    files = None
+    if args.manifest:
+        try:
+            files = read_manifest(args.manifest, folder)
+        except OSError as e:
+            print(f"Error: Failed to read the manifest: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    if args.workers < 1:
+        print("Error: Invalid number of probe workers.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.walk_workers < 1:
+        print("Error: Invalid number of walk workers.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.hash_workers < 1:
+        print("Error: Invalid number of hash workers.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.max_depth is not None and args.max_depth < 0:
+        print("Error: Invalid maximum depth.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.progress_interval <= 0:
+        print("Error: Invalid progress interval.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.probe_timeout < 0 or args.probe_retries < 0 or args.probesize < 0 or args.analyzeduration < 0:
+        print("Error: Invalid probe timeout, retries, probesize or analyzeduration.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.use_async and args.processes:
+        print("Error: Use either --async or --processes.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.stream and args.format == 'json':
+        print("Error: --stream can't write --format json; use ndjson.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.stream and args.duplicates:
+        print("Error: --stream can't be used with --duplicates; groups are only known once every file is hashed.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.incremental and (args.no_cache or args.backend == 'fake'):
+        print("Error: --incremental needs the metadata cache.", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.ffprobe:
+        probe.ffprobe_path = args.ffprobe
+    if args.no_native:
+        probe.native_parser_enabled = False
+    if args.backend == 'ffprobe':
+        backend = FFprobeBackend(probe.ffprobe_path, args.probe_timeout, args.probe_retries, args.probesize,
+                                 args.analyzeduration, args.config_path)
+    elif args.backend == 'fake':
+        backend = get_backend('fake', latency=args.fake_latency)
+    else:
+        backend = get_backend(args.backend)
+    # Scans that only filter on path/stat criteria (and merges) never start the backend
+    if ScanPlan(criteria).needs_probe and not args.merge:
+        try:
+            backend.check()
+        except BackendUnavailable as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_FFPROBE_MISSING
+
+    timer = ScanTimings() if args.timings else None
+    # Streamed matches are written by the sink as they are found
+    sink = None
+    if args.stream:
+        try:
+            sink = open_sink(args)
+        except OSError as e:
+            print(f"Error: Failed to write results: {e}", file=sys.stderr)
+            return EXIT_SCAN_ERROR
+
+    # Fake metadata must never end up in the cache used by real scans
+    use_cache = not (args.no_cache or args.backend == 'fake')
+    on_progress = progress_printer(args.progress) if args.progress else None
+    groups = None
+    cache = None
+    shard_writer = None
+    journal = None
+    scan_complete = False
+    failures = []
+    if args.merge or args.shards or args.shard_output:
+        from .shards import ShardWriter, merge_shards, run_local_shards
+    try:
+        if args.merge:
+            cache = MetadataCache(args.cache_path) if use_cache else None
+            # Criteria given with --merge must be the ones the shards were scanned with
+            expected = criteria['expression_text'] if criteria['expression_text'] != 'true' else None
+            try:
+                results, total_files, warnings = merge_shards(args.merge, folder, cache, expected)
+            except ValueError as e:
+                # Shard files that don't belong together (or to these criteria) are an argument error
+                print(f"Error: {e}", file=sys.stderr)
+                return EXIT_USAGE
+            for warning in warnings:
+                print(f"Warning: {warning}", file=sys.stderr)
+        elif args.shards:
+            import shutil
+            import tempfile
+
+            # Each shard process opens the cache itself
+            options = {'workers': args.workers, 'use_processes': args.processes, 'use_async': args.use_async,
+                       'max_depth': args.max_depth, 'symlinks': args.symlinks, 'walk_workers': args.walk_workers,
+                       'backend': backend, 'sample_bitrate': not args.no_bitrate_sampling}
+            shard_dir = args.shard_dir or tempfile.mkdtemp(prefix='videofilter-shards-')
+            try:
+                os.makedirs(shard_dir, exist_ok=True)
+                results, total_files, warnings = run_local_shards(folder, criteria, args.shards, shard_dir,
+                                                                  args.cache_path if use_cache else None,
+                                                                  files, args.manifest, options)
+            finally:
+                if not args.shard_dir:
+                    shutil.rmtree(shard_dir, ignore_errors=True)
+            for warning in warnings:
+                print(f"Warning: {warning}", file=sys.stderr)
+        else:
+            cache = MetadataCache(args.cache_path) if use_cache else None
+            if args.shard_output:
+                shard_writer = ShardWriter(args.shard_output, shard, folder, criteria, args.manifest)
+            if args.checkpoint or args.resume:
+                from .checkpoint import ScanJournal, checkpoint_path, discard_checkpoint, scan_identity
+
+                identity = scan_identity(folder, criteria, args.max_depth, args.symlinks,
+                                         not args.no_bitrate_sampling, shard)
+                if not args.resume and os.path.exists(checkpoint_path(identity, args.checkpoint_dir)):
+                    discard_checkpoint(identity, args.checkpoint_dir)
+                    if not args.quiet:
+                        print("Note: Starting over; the journal of an interrupted scan of this folder was discarded "
+                              "(use --resume to continue it).", file=sys.stderr)
+                journal = ScanJournal(identity, resume=args.resume, directory=args.checkpoint_dir)
+                if journal.resumed and not args.quiet:
+                    print(f"Resuming an interrupted scan: {len(journal.files)} files done.", file=sys.stderr)
+            results, cancelled, total_files = run_scan(folder, criteria, args.workers, args.processes, cache,
+                                                       max_depth=args.max_depth, symlinks=args.symlinks,
+                                                       walk_workers=args.walk_workers, incremental=args.incremental,
+                                                       backend=backend,
+                                                       on_match=sink.write if sink is not None else None,
+                                                       on_progress=on_progress,
+                                                       progress_interval=args.progress_interval, timer=timer,
+                                                       keep_results=sink is None,
+                                                       sample_bitrate=not args.no_bitrate_sampling,
+                                                       shard=shard, files=files, use_async=args.use_async,
+                                                       on_failure=lambda *failure: failures.append(failure),
+                                                       on_probe=(lambda *record: shard_writer.write(record))
+                                                       if shard_writer is not None else None,
+                                                       journal=journal)
+            scan_complete = not cancelled
+            if shard_writer is not None:
+                shard_writer.files = total_files
+                shard_writer.cancelled = cancelled
+        if args.duplicates:
+            groups, _ = find_duplicates(results, args.hash_workers, cache, on_progress=on_progress,
+                                        progress_interval=args.progress_interval, timer=timer)
+            results = group_results(groups)
+    except Exception as e:
+        print(f"Error: Scan failed: {e}", file=sys.stderr)
+        return EXIT_SCAN_ERROR
+    finally:
+        if cache is not None:
+            cache.close()
+        if sink is not None:
+            sink.close()
+        if shard_writer is not None:
+            shard_writer.close()
+        if journal is not None:
+            journal.close(complete=scan_complete)
+
+    output_started = time.perf_counter()
+    try:
+        if args.failed:
+            write_failures(failures, args.failed)
+        if sink is not None:
+            match_count = sink.count
+        elif args.format == 'json':
+            match_count = len(results)
+            if args.output:
+                with open(args.output, 'a' if args.append else 'w', encoding='utf-8') as f:
+                    write_results(results, f, args.format, args.duplicates)
+            else:
+                write_results(results, sys.stdout, args.format, args.duplicates)
+        else:
+            with open_sink(args) as sink:
+                sink.write_all(results)
+            match_count = sink.count
+    except OSError as e:
+        print(f"Error: Failed to write results: {e}", file=sys.stderr)
+        return EXIT_SCAN_ERROR
+
+    if timer is not None:
+        timer.add('output', time.perf_counter() - output_started)
+        timer.finish()
+        try:
+            timer.write(args.timings)
+        except OSError as e:
+            print(f"Error: Failed to write timings: {e}", file=sys.stderr)
+            return EXIT_SCAN_ERROR
+        if not args.quiet:
+            print(format_report(timer.report()), file=sys.stderr)
+
+    if not args.quiet:
+        if groups is not None:
+            reclaimable = sum(group.reclaimable for group in groups)
+            print(f"Found {len(groups)} groups of duplicates ({match_count} files, "
+                  f"{reclaimable / 1_048_576:.2f} MB reclaimable) out of {total_files} files.", file=sys.stderr)
+        else:
+            print(f"Found {match_count} matching videos out of {total_files} files.", file=sys.stderr)
+        if failures:
+            print(f"{len(failures)} files could not be probed" + (f" (listed in {args.failed})." if args.failed else "."),
+                  file=sys.stderr)
+        if args.incremental:
+            print(f"Incremental: {cache.misses - cache.changed} new, {cache.changed} modified, "
+                  f"{cache.removed} deleted, {cache.hits} unchanged files; "
+                  f"{cache.dir_misses} of {cache.dir_hits + cache.dir_misses} folders listed.", file=sys.stderr)
+    return EXIT_OK if match_count else EXIT_NO_MATCHES
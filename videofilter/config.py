@@ -0,0 +1,29 @@
+import json
+import os
+
+# Small settings cache stored next to the app, like the metadata cache: what startup found out
+# about this machine (where ffprobe is and which version it is), so later launches don't have to
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vfapp_config.json')
+
+# Function to read the config cache; a missing or damaged file reads as empty
+def load_config(config_path=CONFIG_PATH):
+    try:
+        with open(config_path, encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+# Function to write the config cache through a temporary file, so a crash leaves the old one.
+# Failures are ignored: the cache only saves time.
+def save_config(config, config_path=CONFIG_PATH):
+    temp_path = f"{config_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+        os.replace(temp_path, config_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,179 @@
+import hashlib
+import mmap
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cache import stat_signature
+from .progress import DEFAULT_PROGRESS_INTERVAL, ProgressReporter
+from .records import VideoResult
+
+# Bytes hashed at the start and at the end of a file before it gets a full hash. Copies of the
+# same master almost always differ here already (container header, index at the end).
+PARTIAL_BLOCK_SIZE = 64 * 1024
+
+# Read size of a full hash
+FULL_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Files hashed at the same time; hashlib releases the GIL, so threads read and hash in parallel
+DEFAULT_HASH_WORKERS = 4
+
+# Kinds of hashes kept in the metadata cache
+HASH_PARTIAL = 'partial'
+HASH_FULL = 'full'
+
+# Function to hash the head and tail blocks of a file through mmap, so only those pages are read.
+# Files of up to two blocks are hashed whole, which makes their partial hash a full hash.
+def partial_hash(file_path, size):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if size <= 2 * PARTIAL_BLOCK_SIZE:
+            digest.update(data)
+        else:
+            digest.update(data[:PARTIAL_BLOCK_SIZE])
+            digest.update(data[-PARTIAL_BLOCK_SIZE:])
+    return digest.hexdigest()
+
+# Function to hash the whole file
+def full_hash(file_path, size):
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(FULL_HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+# Files with identical content: size in bytes, full hash and the results, in scan order
+class DuplicateGroup:
+    __slots__ = ('size', 'digest', 'results')
+
+    def __init__(self, size, digest, results):
+        self.size = size
+        self.digest = digest
+        self.results = results
+
+    # Bytes freed by keeping a single copy
+    @property
+    def reclaimable(self):
+        return self.size * (len(self.results) - 1)
+
+# Function to hash files (a list of (path, signature)) with hash_function in a thread pool.
+# Hashes are taken from the cache when the file's stat signature is unchanged, and stored in it
+# otherwise. Returns ({position: digest}, cancelled); files that can't be read are left out.
+def hash_files(files, hash_function, kind, workers, cache, reporter, cancel_event=None, resume_event=None, timer=None):
+    digests = {}
+    pending = []
+    for position, (file_path, signature) in enumerate(files):
+        digest = cache.lookup_hash(file_path, signature, kind) if cache is not None else None
+        if digest is None:
+            pending.append(position)
+        else:
+            digests[position] = digest
+            reporter.file_done()
+    if timer is not None:
+        timer.count('hash_cache_hits', len(files) - len(pending))
+    reporter.update()
+
+    def run(position):
+        file_path, signature = files[position]
+        started = time.perf_counter()
+        digest = hash_function(file_path, signature[0])
+        if timer is not None:
+            timer.add('hash_' + kind, time.perf_counter() - started)
+        return digest
+
+    cancelled = False
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(run, position): position for position in pending}
+        for future in as_completed(futures):
+            position = futures[future]
+            file_path, signature = files[position]
+            try:
+                digest = future.result()
+            except (OSError, ValueError):
+                # Unreadable, or emptied since it was listed (mmap refuses empty files)
+                digest = None
+            if digest is not None:
+                digests[position] = digest
+                if cache is not None:
+                    cache.store_hash(file_path, signature, kind, digest)
+            reporter.file_done(signature[0])
+            reporter.update()
+
+            if resume_event is not None:
+                resume_event.wait()
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return digests, cancelled
+
+# Function to find the results whose files have identical content, reading as little as possible:
+# files are grouped by size, files sharing a size by the hash of their head and tail blocks, and
+# only files still colliding after that are hashed in full. Empty files are ignored.
+# Takes the same progress callbacks as run_scan. Returns (groups, cancelled) with the groups
+# ordered by reclaimable space; a cancelled search returns no groups.
+def find_duplicates(results, workers=DEFAULT_HASH_WORKERS, cache=None, on_progress=None, cancel_event=None,
+                    resume_event=None, progress_interval=DEFAULT_PROGRESS_INTERVAL, timer=None):
+    # Group by size (from a fresh stat, which also validates cached hashes)
+    by_size = {}
+    for result in results:
+        signature = stat_signature(result['path'])
+        if signature is not None and signature[0] > 0:
+            by_size.setdefault(signature[0], []).append((result, signature))
+    candidates = [entry for entries in by_size.values() if len(entries) > 1 for entry in entries]
+
+    reporter = ProgressReporter(on_progress, progress_interval)
+    reporter.set_total(len(candidates), estimated=True)
+
+    # Head and tail blocks
+    partials, cancelled = hash_files([(result['path'], signature) for result, signature in candidates],
+                                     partial_hash, HASH_PARTIAL, workers, cache, reporter,
+                                     cancel_event, resume_event, timer)
+    if cancelled:
+        return [], True
+    by_partial = {}
+    for position, digest in partials.items():
+        by_partial.setdefault((candidates[position][1][0], digest), []).append(position)
+
+    # Full hashes for the remaining collisions of files too big to be covered by the partial hash
+    groups = {}
+    colliding = []
+    for (size, digest), positions in by_partial.items():
+        if len(positions) < 2:
+            continue
+        if size <= 2 * PARTIAL_BLOCK_SIZE:
+            groups[(size, digest)] = positions
+        else:
+            colliding.extend(positions)
+    reporter.set_total(reporter.done + len(colliding))
+    fulls, cancelled = hash_files([(candidates[position][0]['path'], candidates[position][1]) for position in colliding],
+                                  full_hash, HASH_FULL, workers, cache, reporter,
+                                  cancel_event, resume_event, timer)
+    if cancelled:
+        return [], True
+    for index, digest in fulls.items():
+        position = colliding[index]
+        groups.setdefault((candidates[position][1][0], digest), []).append(position)
+    reporter.finish()
+
+    # Keep scan order within a group
+    duplicate_groups = [
+        DuplicateGroup(size, digest, [candidates[position][0] for position in sorted(positions)])
+        for (size, digest), positions in groups.items() if len(positions) > 1
+    ]
+    duplicate_groups.sort(key=lambda group: group.reclaimable, reverse=True)
+    if timer is not None:
+        timer.count('duplicate_groups', len(duplicate_groups))
+    return duplicate_groups, False
+
+# Function to list the files of duplicate groups as results tagged with their group number (from 1),
+# for the results view and the sinks
+def group_results(groups):
+    return [VideoResult(result['path'], result['info'], number)
+            for number, group in enumerate(groups, 1) for result in group.results]
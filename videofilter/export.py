@@ -0,0 +1,163 @@
+import json
+import os
+import time
+
+from .records import as_dict
+
+# Seconds between flushes of a result sink: a crash loses at most this much output, while
+# bursts of matches (e.g. from the cache) are still written in large blocks
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Columns of the CSV export, as in the results window plus the full path
+CSV_FIELDS = [
+    'File Path', 'File Name', 'Size (MB)', 'Format', 'Codec',
+    'Bitrate (kbps)', 'Bitrate Mode', 'Peak Bitrate (kbps)', 'Framerate', 'DAR', 'Color Space', 'Bit Depth',
+    'Duration (s)', 'Container', 'Audio Codec', 'Audio Channels', 'Sample Rate (Hz)'
+]
+
+# Columns of the CSV export of a duplicate search: the group number first
+DUPLICATE_CSV_FIELDS = ['Duplicate Group'] + CSV_FIELDS
+
+# Function to turn one result into a CSV export row
+def csv_row(result):
+    info = result['info']
+    row = {
+        'File Path': result['path'],
+        'File Name': os.path.basename(result['path']),
+        'Size (MB)': f"{info['size'] / 1_048_576:.2f}",
+        'Format': os.path.splitext(result['path'])[1].lstrip('.').upper(),
+        'Codec': info['codec'],
+        'Bitrate (kbps)': f"{info['bitrate'] / 1000:.2f}",
+        'Bitrate Mode': info['bitrate_mode'],
+        'Peak Bitrate (kbps)': f"{info['peak_bitrate'] / 1000:.2f}",
+        'Framerate': f"{info['framerate']:.2f}",
+        'DAR': info['display_aspect_ratio'],
+        'Color Space': info['color_space'],
+        'Bit Depth': info['bit_depth'],
+        'Duration (s)': f"{info['duration']:.2f}",
+        'Container': info['container'],
+        'Audio Codec': info['audio_codec'],
+        'Audio Channels': info['audio_channels'],
+        'Sample Rate (Hz)': info['audio_sample_rate']
+    }
+    if 'duplicate_group' in result:
+        row['Duplicate Group'] = result['duplicate_group']
+    return row
+
+# Writes results one at a time to a file (a path, opened here, or an open text stream), so a scan
+# can save each match as soon as it is found without keeping the result list in memory.
+# Output is buffered and flushed every flush_interval seconds (0 flushes after every result)
+# and on close. With append=True an existing file is extended instead of replaced.
+class ResultSink:
+    newline = None
+
+    def __init__(self, target, append=False, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        if isinstance(target, (str, os.PathLike)):
+            self.file = open(target, 'a' if append else 'w', encoding='utf-8', newline=self.newline)
+            self.owns_file = True
+        else:
+            self.file = target
+            self.owns_file = False
+        self.flush_interval = flush_interval
+        self.next_flush = time.monotonic() + flush_interval
+        self.count = 0
+        self.start()
+
+    # Called once before the first result (e.g. for a header)
+    def start(self):
+        pass
+
+    def write_result(self, result):
+        raise NotImplementedError
+
+    def write(self, result):
+        self.write_result(result)
+        self.count += 1
+        if self.flush_interval <= 0 or time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def write_all(self, results):
+        for result in results:
+            self.write_result(result)
+            self.count += 1
+        self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.next_flush = time.monotonic() + self.flush_interval
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# One path per line, like output.txt; duplicate groups are separated by an empty line
+class PathSink(ResultSink):
+    def start(self):
+        self.group = None
+
+    def write_result(self, result):
+        group = result.get('duplicate_group')
+        if group != self.group:
+            if self.group is not None:
+                self.file.write("\n")
+            self.group = group
+        self.file.write(result['path'] + "\n")
+
+# One JSON object per line with the path and the full info dict
+class NDJSONSink(ResultSink):
+    def write_result(self, result):
+        self.file.write(json.dumps(as_dict(result)) + "\n")
+
+# CSV with the columns of the results window export; the header is only written to an empty file
+class CSVSink(ResultSink):
+    newline = ''
+    fields = CSV_FIELDS
+
+    def start(self):
+        import csv
+
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields)
+        try:
+            empty = self.file.tell() == 0
+        except (OSError, ValueError):
+            empty = True
+        if empty:
+            self.writer.writeheader()
+
+    def write_result(self, result):
+        self.writer.writerow(csv_row(result))
+
+# CSV of duplicate search results, with their group numbers
+class DuplicateCSVSink(CSVSink):
+    fields = DUPLICATE_CSV_FIELDS
+
+# Sink class for each output format
+RESULT_SINKS = {
+    'text': PathSink,
+    'ndjson': NDJSONSink,
+    'csv': CSVSink,
+}
+
+# Sink class for each output format of a duplicate search
+DUPLICATE_SINKS = dict(RESULT_SINKS, csv=DuplicateCSVSink)
+
+# Function to write the files that could not be probed, (path, reason) pairs, one per line with
+# the reason after a tab
+def write_failures(failures, failed_path):
+    with open(failed_path, 'w', encoding='utf-8') as f:
+        for file_path, reason in failures:
+            f.write(f"{file_path}\t{' '.join(reason.split())}\n")
+
+# Function to write results as CSV to an open file (opened with newline='');
+# results of a duplicate search get the group column
+def write_csv(results, csv_file, duplicates=False):
+    with (DuplicateCSVSink if duplicates else CSVSink)(csv_file) as sink:
+        sink.write_all(results)
@@ -0,0 +1,458 @@
+import fnmatch
+import functools
+import os
+import re
+from datetime import datetime
+from fractions import Fraction
+
+# Filter expressions, e.g.
+#
+#     codec in (prores, hap_q) and height >= 2160 and not bitrate_mode == Variable
+#
+# are parsed once into a tree of tuples:
+#
+#     ('and', (node, ...))   ('or', (node, ...))   ('not', node)   ('true',)
+#     ('cmp', field, op, value)
+#
+# where op is one of == != < <= > >= in like ~ and value is already converted to the field's
+# type (a tuple for in/like, (target, tolerance) for ~). Trees are hashable, so compiled
+# predicates and index masks can be cached per node.
+
+# Stages at which a field is known: from the path, from os.stat, or only after probing
+PATH_STAGE = 0
+STAT_STAGE = 1
+PROBE_STAGE = 2
+
+# Field name -> (type, stage, key in get_video_info's dict)
+FIELDS = {
+    'path': ('path', PATH_STAGE, None),
+    'extension': ('text_ci', PATH_STAGE, None),
+    'size': ('size', STAT_STAGE, 'size'),
+    'mtime': ('date', STAT_STAGE, None),
+    'codec': ('text', PROBE_STAGE, 'codec'),
+    'width': ('number', PROBE_STAGE, 'width'),
+    'height': ('number', PROBE_STAGE, 'height'),
+    'duration': ('duration', PROBE_STAGE, 'duration'),
+    'bitrate': ('bitrate', PROBE_STAGE, 'bitrate'),
+    'bitrate_mode': ('text_ci', PROBE_STAGE, 'bitrate_mode'),
+    'framerate': ('number', PROBE_STAGE, 'framerate'),
+    'dar': ('ratio', PROBE_STAGE, 'display_aspect_ratio'),
+    'color_space': ('text_ci', PROBE_STAGE, 'color_space'),
+    'bit_depth': ('number', PROBE_STAGE, 'bit_depth'),
+    'peak_bitrate': ('bitrate', PROBE_STAGE, 'peak_bitrate'),
+    'bitrate_stddev': ('bitrate', PROBE_STAGE, 'bitrate_stddev'),
+    'container': ('text_ci', PROBE_STAGE, 'container'),
+    'container_duration': ('duration', PROBE_STAGE, 'container_duration'),
+    'container_bitrate': ('bitrate', PROBE_STAGE, 'container_bitrate'),
+    'audio_codec': ('text', PROBE_STAGE, 'audio_codec'),
+    'audio_channels': ('number', PROBE_STAGE, 'audio_channels'),
+    'sample_rate': ('number', PROBE_STAGE, 'audio_sample_rate'),
+    'video_streams': ('number', PROBE_STAGE, 'video_streams'),
+    'audio_streams': ('number', PROBE_STAGE, 'audio_streams'),
+    'subtitle_streams': ('number', PROBE_STAGE, 'subtitle_streams'),
+}
+
+# Fields that are only accurate once the bitrate has been sampled (see bitrate.py)
+BITRATE_FIELDS = frozenset(('bitrate', 'bitrate_mode', 'peak_bitrate', 'bitrate_stddev'))
+
+# Other accepted spellings of field names
+FIELD_ALIASES = {
+    'ext': 'extension',
+    'fps': 'framerate',
+    'display_aspect_ratio': 'dar',
+    'aspect': 'dar',
+    'modified': 'mtime',
+    'peak': 'peak_bitrate',
+    'format': 'container',
+    'acodec': 'audio_codec',
+    'channels': 'audio_channels',
+    'audio_sample_rate': 'sample_rate',
+}
+
+# Operators each field type supports
+NUMERIC_OPS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not in', '~')
+TYPE_OPS = {
+    'path': ('==', '!=', 'in', 'not in', 'like'),
+    'text': ('==', '!=', 'in', 'not in', 'like'),
+    'text_ci': ('==', '!=', 'in', 'not in', 'like'),
+    'ratio': ('==', '!=', 'in', 'not in', '~'),
+    'number': NUMERIC_OPS,
+    'size': NUMERIC_OPS,
+    'duration': NUMERIC_OPS,
+    'bitrate': NUMERIC_OPS,
+    'date': ('==', '!=', '<', '<=', '>', '>='),
+}
+
+# Relative tolerance of ~ when no "within" is given (1% covers 1.78 vs 16:9, 2.39 vs 2.40, ...)
+DEFAULT_TOLERANCE = 0.01
+
+# Unit suffixes accepted after numbers; sizes are binary like the MB fields of the form
+UNITS = {
+    'size': {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+             'g': 1024 ** 3, 'gb': 1024 ** 3, 't': 1024 ** 4, 'tb': 1024 ** 4},
+    'bitrate': {'': 1, 'bps': 1, 'k': 1000, 'kbps': 1000, 'm': 1000 ** 2, 'mbps': 1000 ** 2,
+                'g': 1000 ** 3, 'gbps': 1000 ** 3},
+    'duration': {'': 1, 's': 1, 'm': 60, 'min': 60, 'h': 3600},
+}
+
+# Accepted formats for modification dates
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S')
+
+KEYWORDS = ('and', 'or', 'not', 'in', 'like', 'within', 'true')
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<op>==|!=|<=|>=|<|>|=|~|\(|\)|,)
+      | '(?P<squote>(?:[^'\\]|\\.)*)'
+      | "(?P<dquote>(?:[^"\\]|\\.)*)"
+      | (?P<word>[^\s()<>=!~,'"]+)
+    )""", re.VERBOSE)
+
+BAREWORD_RE = re.compile(r"[^\s()<>=!~,'\"]+\Z")
+
+# Function to parse a local date into a timestamp
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).timestamp()
+        except ValueError:
+            pass
+    raise ValueError("Invalid modification date. Use 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'.")
+
+# Function to parse "16:9", "16/9" or "1.78" into a float ratio; None when it isn't one
+def parse_ratio(value):
+    try:
+        for separator in (':', '/'):
+            if separator in value:
+                num, den = value.split(separator)
+                return float(num) / float(den)
+        return float(value)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid filter expression near '{text[position:].strip()}'.")
+        position = match.end()
+        if match.group('op') is not None:
+            tokens.append(('op', '==' if match.group('op') == '=' else match.group('op')))
+        elif match.group('word') is not None:
+            word = match.group('word')
+            if word.lower() in KEYWORDS:
+                tokens.append(('op', word.lower()))
+            else:
+                tokens.append(('word', word))
+        else:
+            quoted = match.group('squote') if match.group('squote') is not None else match.group('dquote')
+            tokens.append(('string', re.sub(r'\\(.)', r'\1', quoted)))
+    return tokens
+
+# Function to convert a literal to the type of a field
+def convert_value(field, text, op):
+    kind = FIELDS[field][0]
+    if kind in ('number', 'size', 'duration', 'bitrate'):
+        if kind == 'duration' and ':' in text:
+            seconds = 0.0
+            try:
+                for part in text.split(':'):
+                    seconds = seconds * 60 + float(part)
+            except ValueError:
+                raise ValueError(f"Invalid duration '{text}'.")
+            return seconds
+        match = re.fullmatch(r'([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)\s*([a-z]*)', text.strip().lower())
+        units = UNITS.get(kind, {'': 1})
+        if match is None or match.group(2) not in units:
+            raise ValueError(f"Invalid value '{text}' for {field}.")
+        value = float(match.group(1)) * units[match.group(2)]
+        return int(value) if value.is_integer() else value
+    if kind == 'date':
+        try:
+            return float(text)
+        except ValueError:
+            return parse_date(text)
+    if kind == 'ratio' and op == '~':
+        value = parse_ratio(text)
+        if value is None:
+            raise ValueError(f"Invalid aspect ratio '{text}'.")
+        return value
+    if kind == 'path':
+        return os.path.normcase(text)
+    if field == 'extension':
+        return '.' + text.lower().lstrip('.')
+    if kind == 'text_ci':
+        return text.lower()
+    return text
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of filter expression.")
+        self.position += 1
+        return token
+
+    def accept(self, op):
+        if self.peek() == ('op', op):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, op):
+        if not self.accept(op):
+            raise ValueError(f"Expected '{op}' in filter expression.")
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in filter expression.")
+        return node
+
+    def parse_or(self):
+        items = [self.parse_and()]
+        while self.accept('or'):
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else ('or', tuple(items))
+
+    def parse_and(self):
+        items = [self.parse_not()]
+        while self.accept('and'):
+            items.append(self.parse_not())
+        return make_and(items)
+
+    def parse_not(self):
+        if self.accept('not'):
+            return ('not', self.parse_not())
+        if self.accept('('):
+            node = self.parse_or()
+            self.expect(')')
+            return node
+        if self.accept('true'):
+            return TRUE
+        return self.parse_comparison()
+
+    def parse_value(self):
+        kind, text = self.next()
+        if kind == 'op':
+            raise ValueError(f"Expected a value, found '{text}' in filter expression.")
+        return text
+
+    def parse_list(self):
+        if not self.accept('('):
+            return (self.parse_value(),)
+        values = [self.parse_value()]
+        while self.accept(','):
+            values.append(self.parse_value())
+        self.expect(')')
+        return tuple(values)
+
+    def parse_comparison(self):
+        kind, name = self.next()
+        if kind != 'word':
+            raise ValueError(f"Expected a field name, found '{name}' in filter expression.")
+        field = FIELD_ALIASES.get(name.lower(), name.lower())
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{name}' in filter expression. Known fields: {', '.join(FIELDS)}.")
+
+        if self.accept('not'):
+            self.expect('in')
+            op = 'not in'
+        else:
+            kind, op = self.next()
+            if kind != 'op' or op not in ('==', '!=', '<', '<=', '>', '>=', 'in', 'like', '~'):
+                raise ValueError(f"Expected an operator after '{name}' in filter expression.")
+        if op not in TYPE_OPS[FIELDS[field][0]]:
+            raise ValueError(f"Operator '{op}' is not supported for {field}.")
+
+        if op in ('in', 'not in', 'like'):
+            values = tuple(convert_value(field, text, op) for text in self.parse_list())
+            if op == 'not in':
+                return ('not', ('cmp', field, 'in', values))
+            return ('cmp', field, op, values)
+        value = convert_value(field, self.parse_value(), op)
+        if op == '~':
+            tolerance = DEFAULT_TOLERANCE
+            if self.accept('within'):
+                text = self.parse_value()
+                try:
+                    tolerance = float(text[:-1]) / 100 if text.endswith('%') else float(text)
+                except ValueError:
+                    raise ValueError(f"Invalid tolerance '{text}'.")
+            return ('cmp', field, op, (value, tolerance))
+        return ('cmp', field, op, value)
+
+# Expression matching everything
+TRUE = ('true',)
+
+# Function to AND nodes together, flattening nested ands and dropping 'true'
+def make_and(nodes):
+    items = []
+    for node in nodes:
+        if node[0] == 'and':
+            items.extend(node[1])
+        elif node != TRUE:
+            items.append(node)
+    if not items:
+        return TRUE
+    return items[0] if len(items) == 1 else ('and', tuple(items))
+
+@functools.lru_cache(maxsize=256)
+def parse_expression(text):
+    if not text or not text.strip():
+        return TRUE
+    return Parser(text).parse()
+
+# Function to list the top-level conjuncts of an expression
+def conjuncts(node):
+    if node[0] == 'and':
+        return list(node[1])
+    return [] if node == TRUE else [node]
+
+# Function to find the latest stage at which every field of an expression is known
+def stage(node):
+    if node[0] == 'cmp':
+        return FIELDS[node[1]][1]
+    if node[0] == 'not':
+        return stage(node[1])
+    if node[0] in ('and', 'or'):
+        return max(stage(item) for item in node[1])
+    return PATH_STAGE
+
+# Function to collect the fields an expression reads
+def expression_fields(node):
+    if node[0] == 'cmp':
+        return {node[1]}
+    if node[0] == 'not':
+        return expression_fields(node[1])
+    if node[0] in ('and', 'or'):
+        return set().union(*map(expression_fields, node[1]))
+    return set()
+
+def format_value(field, value):
+    kind = FIELDS[field][0]
+    if kind == 'ratio' and isinstance(value, float):
+        ratio = Fraction(value).limit_denominator(1000)
+        if float(ratio) == value:
+            return f"{ratio.numerator}:{ratio.denominator}"
+    if isinstance(value, float):
+        if kind == 'date' and value.is_integer():
+            text = datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+            return f"'{text}'"
+        return str(int(value)) if value.is_integer() else repr(value)
+    if isinstance(value, int):
+        return str(value)
+    if BAREWORD_RE.match(value) and value.lower() not in KEYWORDS:
+        return value
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+# Function to turn an expression back into text that parses to the same tree
+def format_expression(node, parent=None):
+    if node == TRUE:
+        return 'true'
+    if node[0] == 'cmp':
+        _, field, op, value = node
+        if op in ('in', 'like'):
+            values = ', '.join(format_value(field, item) for item in value)
+            return f"{field} {op} ({values})" if op == 'in' or len(value) > 1 else f"{field} like {values}"
+        if op == '~':
+            target, tolerance = value
+            text = f"{field} ~ {format_value(field, target)}"
+            if tolerance != DEFAULT_TOLERANCE:
+                text += f" within {format_value('framerate', tolerance)}"
+            return text
+        return f"{field} {op} {format_value(field, value)}"
+    if node[0] == 'not':
+        inner = node[1]
+        if inner[0] == 'cmp' and inner[2] == 'in':
+            return format_expression(inner).replace(' in (', ' not in (', 1)
+        return 'not ' + format_expression(inner, 'not')
+    text = f" {node[0]} ".join(format_expression(item, node[0]) for item in node[1])
+    return f"({text})" if parent is not None and parent != node[0] else text
+
+# Code generation: each field is read through an expression over (path, st, info)
+def _field_source(field):
+    kind, _, key = FIELDS[field]
+    if field == 'path':
+        return "_normcase(path)"
+    if field == 'extension':
+        return "_splitext(path)[1].lower()"
+    if field == 'size':
+        return "(st.st_size if st is not None else info['size'])"
+    if field == 'mtime':
+        return "(st if st is not None else _stat(path)).st_mtime"
+    if kind == 'text_ci':
+        return f"info[{key!r}].lower()"
+    return f"info[{key!r}]"
+
+def _near(value, target, tolerance):
+    return value is not None and abs(value - target) <= abs(target) * tolerance
+
+class _Compiler:
+    def __init__(self, value_mode=False):
+        # In value mode a single comparison is compiled against a bare column value
+        self.value_mode = value_mode
+        self.constants = {}
+
+    def constant(self, value):
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def source(self, node):
+        if node == TRUE:
+            return "True"
+        if node[0] == 'not':
+            return f"(not {self.source(node[1])})"
+        if node[0] in ('and', 'or'):
+            return "(" + f" {node[0]} ".join(self.source(item) for item in node[1]) + ")"
+        _, field, op, value = node
+        getter = _field_source(field)
+        if self.value_mode:
+            getter = "value.lower()" if FIELDS[field][0] == 'text_ci' else "value"
+        if op == 'in':
+            return f"({getter} in {self.constant(frozenset(value))})"
+        if op == 'like':
+            pattern = re.compile('|'.join(f'(?:{fnmatch.translate(item)})' for item in value))
+            return f"({self.constant(pattern)}.match({getter}) is not None)"
+        if op == '~':
+            target, tolerance = value
+            if FIELDS[field][0] == 'ratio':
+                getter = f"_parse_ratio({getter})"
+            return f"_near({getter}, {self.constant(target)}, {self.constant(tolerance)})"
+        return f"({getter} {op} {self.constant(value)})"
+
+# Function to compile an expression into a predicate(path, st, info). st may be None (size then
+# comes from info, mtime from a fresh os.stat); info may be None when only path/stat fields are used.
+@functools.lru_cache(maxsize=256)
+def compile_predicate(node):
+    compiler = _Compiler()
+    source = f"lambda path, st, info: {compiler.source(node)}"
+    namespace = {
+        '_normcase': os.path.normcase,
+        '_splitext': os.path.splitext,
+        '_stat': os.stat,
+        '_parse_ratio': parse_ratio,
+        '_near': _near,
+        **compiler.constants
+    }
+    return eval(compile(source, '<filter expression>', 'eval'), namespace)
+
+# Function to compile a single comparison into a predicate(value) over raw values of its field,
+# used to evaluate it once per distinct value of a dictionary-encoded column
+@functools.lru_cache(maxsize=256)
+def compile_value_predicate(node):
+    compiler = _Compiler(value_mode=True)
+    source = f"lambda value: {compiler.source(node)}"
+    namespace = {'_parse_ratio': parse_ratio, '_near': _near, **compiler.constants}
+    return eval(compile(source, '<filter expression>', 'eval'), namespace)
@@ -0,0 +1,253 @@
+import os
+from array import array
+from itertools import compress
+
+from .expr import FIELDS, TRUE, compile_value_predicate, make_and
+from .planner import ScanPlan, stat_only_info
+from .records import VideoInfo, VideoResult
+
+# Probe state of a row; removed rows (files deleted from the results window) never match
+UNPROBED = 0
+PROBED = 1
+FAILED = 2
+REMOVED = 3
+
+# Numeric columns of get_video_info's dict and their array type codes
+NUMERIC_COLUMNS = {
+    'width': 'q',
+    'height': 'q',
+    'duration': 'd',
+    'bitrate': 'q',
+    'size': 'q',
+    'framerate': 'd',
+    'bit_depth': 'q',
+    'peak_bitrate': 'q',
+    'bitrate_stddev': 'q',
+    'container_duration': 'd',
+    'container_bitrate': 'q',
+    'audio_channels': 'q',
+    'audio_sample_rate': 'q',
+    'video_streams': 'q',
+    'audio_streams': 'q',
+    'subtitle_streams': 'q',
+}
+
+# Text columns, stored dictionary-encoded
+CODED_COLUMNS = ('codec', 'bitrate_mode', 'display_aspect_ratio', 'color_space', 'container', 'audio_codec')
+
+# Comparison operators as methods of the constant: "value < x" is x.__gt__(value)
+REVERSED_OPS = {'==': '__eq__', '!=': '__ne__', '<': '__gt__', '<=': '__ge__', '>': '__lt__', '>=': '__le__'}
+
+# Masks are Python ints holding one byte (0 or 1) per row, so &, | and ^ combine whole
+# columns at C speed; _mask builds one from an iterable of booleans such as map(predicate, column)
+def _mask(values):
+    return int.from_bytes(bytearray(values), 'little')
+
+# Function to build a mask of rows whose value lies in [low, high].
+# all_rows is the mask of every row. Comparisons go through float methods, which accept both
+# int and float operands, so one code path serves every column.
+def _range_mask(column, low, high, all_rows):
+    mask = all_rows & _mask(map(float(low).__le__, column))
+    return mask & _mask(map(float(high).__ge__, column))
+
+# Dictionary-encoded text column: each distinct value is stored once and rows hold its code
+class CodedColumn:
+    def __init__(self):
+        self.codes = array('l')
+        self.values = []
+        self.value_codes = {}
+        self.value_masks = {}
+
+    def encode(self, value):
+        code = self.value_codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.value_codes[value] = code
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __setitem__(self, row, value):
+        self.codes[row] = self.encode(value)
+        self.value_masks.clear()
+
+    # Mask of rows whose value satisfies predicate; the predicate runs once per distinct value and
+    # the per-value masks are kept, so repeated queries only OR a few precomputed masks together
+    def mask_where(self, predicate):
+        mask = 0
+        for code, value in enumerate(self.values):
+            if predicate(value):
+                if code not in self.value_masks:
+                    self.value_masks[code] = _mask(map(code.__eq__, self.codes))
+                mask |= self.value_masks[code]
+        return mask
+
+    def reorder(self, order):
+        self.codes = array('l', map(self.codes.__getitem__, order))
+        self.value_masks.clear()
+
+# Columnar index of every file seen by a scan: path and stat columns for all files, metadata
+# columns for the probed ones. Any criteria dict from parse_criteria can then be answered from
+# memory with whole-column mask operations, without walking or probing again.
+class MetadataIndex:
+    def __init__(self, folder=None):
+        self.folder = folder
+        self.paths = []
+        self.keys = []
+        self.mtimes = array('d')
+        self.status = array('b')
+        # 1 for probed rows whose bitrate was sampled (or could not be), see ScanPlan.sample_filter
+        self.sampled = array('b')
+        self.extensions = CodedColumn()
+        self.numeric = {name: array(typecode) for name, typecode in NUMERIC_COLUMNS.items()}
+        self.coded = {name: CodedColumn() for name in CODED_COLUMNS}
+        self.complete = False
+        # Masks of individual predicates, reused while the index is unchanged
+        self.masks = {}
+
+    def _cached_mask(self, key, compute):
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = compute()
+        return mask
+
+    def __len__(self):
+        return len(self.paths)
+
+    # Add a walked file; key orders rows like the walk (see DirectoryWalker). Returns the row number.
+    def add(self, file_path, size, mtime, key=None):
+        row = len(self.paths)
+        self.masks.clear()
+        self.paths.append(file_path)
+        self.keys.append(key)
+        self.mtimes.append(mtime)
+        self.status.append(UNPROBED)
+        self.sampled.append(0)
+        self.extensions.append(os.path.splitext(file_path)[1].lower())
+        for name, column in self.numeric.items():
+            column.append(size if name == 'size' else 0)
+        for column in self.coded.values():
+            column.append('Unknown')
+        return row
+
+    # Record a probe result for a row; info None marks the probe as failed.
+    # sampled tells whether bitrate sampling was attempted for it.
+    def set_info(self, row, info, sampled=False):
+        self.masks.clear()
+        self.sampled[row] = sampled or (info is not None and info.bitrate_sampled)
+        if info is None:
+            self.status[row] = FAILED
+            return
+        self.status[row] = PROBED
+        for name, column in self.numeric.items():
+            column[row] = info[name]
+        for name, column in self.coded.items():
+            column[row] = info[name]
+
+    def discard(self, file_path):
+        try:
+            row = self.paths.index(file_path)
+        except ValueError:
+            return
+        self.masks.clear()
+        self.status[row] = REMOVED
+
+    # Sort rows by their walk keys once the scan is over, so query results come out in walk order
+    def finish(self, complete=True):
+        if any(key is not None for key in self.keys):
+            order = sorted(range(len(self.paths)), key=self.keys.__getitem__)
+            self.paths = list(map(self.paths.__getitem__, order))
+            self.mtimes = array('d', map(self.mtimes.__getitem__, order))
+            self.status = array('b', map(self.status.__getitem__, order))
+            self.sampled = array('b', map(self.sampled.__getitem__, order))
+            self.extensions.reorder(order)
+            for name, column in self.numeric.items():
+                self.numeric[name] = array(column.typecode, map(column.__getitem__, order))
+            for column in self.coded.values():
+                column.reorder(order)
+        self.keys = [None] * len(self.paths)
+        self.masks.clear()
+        self.complete = complete
+
+    # Rebuild the info dict of a row; rows that were not probed only know their size
+    def info(self, row):
+        if self.status[row] != PROBED:
+            return stat_only_info(self.numeric['size'][row])
+        info = {name: column[row] for name, column in self.numeric.items()}
+        info.update((name, column[row]) for name, column in self.coded.items())
+        return VideoInfo.from_dict(info)
+
+    def result(self, row):
+        return VideoResult(self.paths[row], self.info(row))
+
+    def rows(self, mask):
+        if not mask:
+            return []
+        return list(compress(range(len(self.paths)), mask.to_bytes(len(self.paths), 'little')))
+
+    def _all_rows(self):
+        return self._cached_mask('all', lambda: _mask(map(REMOVED.__ne__, self.status)))
+
+    def _status(self, status):
+        return self._cached_mask(('status', status), lambda: _mask(map(status.__eq__, self.status)))
+
+    # Mask of the rows matching a filter expression tree (see expr.py)
+    def evaluate(self, node):
+        return self._cached_mask(node, lambda: self._evaluate(node))
+
+    def _evaluate(self, node):
+        all_rows = self._all_rows()
+        if node == TRUE:
+            return all_rows
+        if node[0] == 'and':
+            mask = all_rows
+            for item in node[1]:
+                mask &= self.evaluate(item)
+            return mask
+        if node[0] == 'or':
+            mask = 0
+            for item in node[1]:
+                mask |= self.evaluate(item)
+            return mask
+        if node[0] == 'not':
+            return all_rows ^ (self.evaluate(node[1]) & all_rows)
+
+        _, field, op, value = node
+        if field == 'path':
+            return all_rows & _mask(map(compile_value_predicate(node), map(os.path.normcase, self.paths)))
+        if field == 'extension':
+            return all_rows & self.extensions.mask_where(compile_value_predicate(node))
+        key = FIELDS[field][2]
+        if key in self.coded:
+            return all_rows & self.coded[key].mask_where(compile_value_predicate(node))
+
+        # Numeric columns: one C-level pass of a bound float comparison per bound
+        column = self.mtimes if field == 'mtime' else self.numeric[key]
+        if op == 'in':
+            return all_rows & _mask(map(frozenset(value).__contains__, column))
+        if op == '~':
+            target, tolerance = value
+            delta = abs(target) * tolerance
+            return _range_mask(column, target - delta, target + delta, all_rows)
+        return all_rows & _mask(map(getattr(float(value), REVERSED_OPS[op]), column))
+
+    # Answer a criteria dict from memory. Returns (matching rows, pending rows): pending rows pass
+    # every path/stat criterion but were never probed (or, for bitrate criteria, never bitrate-sampled),
+    # so they must be probed before they can match. sample_bitrate=False ignores whether rows were sampled.
+    def query(self, criteria, sample_bitrate=True):
+        plan = ScanPlan(criteria)
+        mask = self.evaluate(make_and(plan.path_checks + plan.stat_checks))
+        if not plan.needs_probe:
+            return self.rows(mask), []
+        unprobed = self._status(UNPROBED)
+        if sample_bitrate and plan.samples_bitrate:
+            unsampled = self._cached_mask('unsampled', lambda: _mask(map((0).__eq__, self.sampled)))
+            unprobed |= self._status(PROBED) & unsampled & self.evaluate(plan.sample_filter)
+        pending = mask & unprobed
+        mask &= self._status(PROBED) & self.evaluate(make_and(plan.probe_checks))
+        return self.rows(mask & ~pending), self.rows(pending)
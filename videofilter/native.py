@@ -0,0 +1,997 @@
+# Pure-Python header readers for MP4/MOV and Matroska/WebM.
+#
+# read_media_info() returns the streams and container of a file in the same shape
+# as the output of `ffprobe -show_format -show_streams`, so get_video_info can
+# normalize it exactly like ffprobe output: the first video stream in full, the
+# codec, channels and sample rate of audio streams, the type of the others, and
+# the container's duration and bitrate. Only box/element headers and the few
+# tables needed are read (with seeks); anything unusual returns None so the
+# caller falls back to ffprobe.
+import os
+import struct
+import sys
+from array import array
+
+# Containers handled without spawning ffprobe
+NATIVE_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm')
+
+# Largest single box/element body we agree to read into memory
+MAX_READ_SIZE = 16 * 1_048_576
+
+INT_MAX = 2 ** 31 - 1
+
+# Raised internally when a file needs ffprobe after all
+class UnsupportedMedia(Exception):
+    pass
+
+# Function to reduce a fraction the way libavutil's av_reduce does (best approximation with num/den <= max)
+def av_reduce(num, den, max_value):
+    a0_num, a0_den = 0, 1
+    a1_num, a1_den = 1, 0
+    sign = (num < 0) != (den < 0)
+    num, den = abs(num), abs(den)
+    gcd = _gcd(num, den)
+    if gcd:
+        num //= gcd
+        den //= gcd
+    if num <= max_value and den <= max_value:
+        a1_num, a1_den = num, den
+        den = 0
+    while den:
+        x = num // den
+        next_den = num - den * x
+        a2_num = x * a1_num + a0_num
+        a2_den = x * a1_den + a0_den
+        if a2_num > max_value or a2_den > max_value:
+            if a1_num:
+                x = (max_value - a0_num) // a1_num
+            if a1_den:
+                x = min(x, (max_value - a0_den) // a1_den)
+            if den * (2 * x * a1_den + a0_den) > num * a1_den:
+                a1_num, a1_den = x * a1_num + a0_num, x * a1_den + a0_den
+            break
+        a0_num, a0_den = a1_num, a1_den
+        a1_num, a1_den = a2_num, a2_den
+        num, den = den, next_den
+    return (-a1_num if sign else a1_num), a1_den
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+# Bit reader for H.264 parameter sets (emulation prevention bytes already removed)
+class BitReader:
+    def __init__(self, data):
+        self.value = int.from_bytes(data, 'big')
+        self.length = len(data) * 8
+        self.pos = 0
+
+    def u(self, bits):
+        if self.pos + bits > self.length:
+            raise UnsupportedMedia("truncated parameter set")
+        self.pos += bits
+        return (self.value >> (self.length - self.pos)) & ((1 << bits) - 1)
+
+    def ue(self):
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise UnsupportedMedia("invalid exp-Golomb code")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+def _unescape_rbsp(nal):
+    return nal.replace(b'\x00\x00\x03', b'\x00\x00')
+
+# H.264 Table E-1 sample aspect ratios
+H264_SAR_TABLE = [
+    (0, 1), (1, 1), (12, 11), (10, 11), (16, 11), (40, 33), (24, 11), (20, 11), (32, 11),
+    (80, 33), (18, 11), (15, 11), (64, 33), (160, 99), (4, 3), (3, 2), (2, 1)
+]
+
+H264_HIGH_PROFILES = (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135)
+
+# Function to parse the parts of an H.264 SPS that ffprobe reports (size, chroma, depth, SAR, range)
+def parse_h264_sps(nal):
+    r = BitReader(_unescape_rbsp(nal[1:]))
+    profile_idc = r.u(8)
+    r.u(16)  # constraint flags and level
+    r.ue()  # seq_parameter_set_id
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    bit_depth = 8
+    if profile_idc in H264_HIGH_PROFILES:
+        chroma_format_idc = r.ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = r.u(1)
+        bit_depth = r.ue() + 8
+        r.ue()  # bit_depth_chroma_minus8
+        r.u(1)  # qpprime_y_zero_transform_bypass_flag
+        if r.u(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if r.u(1):
+                    last_scale = next_scale = 8
+                    for _ in range(16 if i < 6 else 64):
+                        if next_scale:
+                            next_scale = (last_scale + r.se() + 256) % 256
+                        last_scale = next_scale or last_scale
+    r.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = r.ue()
+    if pic_order_cnt_type == 0:
+        r.ue()
+    elif pic_order_cnt_type == 1:
+        r.u(1)
+        r.se()
+        r.se()
+        for _ in range(r.ue()):
+            r.se()
+    r.ue()  # max_num_ref_frames
+    r.u(1)  # gaps_in_frame_num_value_allowed_flag
+    width = (r.ue() + 1) * 16
+    map_units = r.ue() + 1
+    frame_mbs_only = r.u(1)
+    if not frame_mbs_only:
+        r.u(1)  # mb_adaptive_frame_field_flag
+    height = (2 - frame_mbs_only) * map_units * 16
+    r.u(1)  # direct_8x8_inference_flag
+    if r.u(1):  # frame_cropping_flag
+        crop_left, crop_right, crop_top, crop_bottom = r.ue(), r.ue(), r.ue(), r.ue()
+        chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+        crop_unit_x = 1 if chroma_array_type in (0, 3) else 2
+        crop_unit_y = (2 - frame_mbs_only) * (2 if chroma_array_type == 1 else 1)
+        width -= (crop_left + crop_right) * crop_unit_x
+        height -= (crop_top + crop_bottom) * crop_unit_y
+
+    sar = (0, 1)
+    full_range = 0
+    matrix_coefficients = 2  # unspecified
+    if r.u(1):  # vui_parameters_present_flag
+        if r.u(1):  # aspect_ratio_info_present_flag
+            aspect_ratio_idc = r.u(8)
+            if aspect_ratio_idc == 255:
+                sar = (r.u(16), r.u(16))
+            elif aspect_ratio_idc < len(H264_SAR_TABLE):
+                sar = H264_SAR_TABLE[aspect_ratio_idc]
+        if r.u(1):  # overscan_info_present_flag
+            r.u(1)
+        if r.u(1):  # video_signal_type_present_flag
+            r.u(3)
+            full_range = r.u(1)
+            if r.u(1):  # colour_description_present_flag
+                r.u(16)
+                matrix_coefficients = r.u(8)
+
+    if chroma_format_idc == 0:
+        raise UnsupportedMedia("monochrome H.264")
+    subsampling = {1: '420', 2: '422', 3: '444'}[chroma_format_idc]
+    if chroma_format_idc == 3 and matrix_coefficients == 0:
+        pix_fmt = 'gbrp' if bit_depth == 8 else f'gbrp{bit_depth}le'
+    elif bit_depth == 8:
+        pix_fmt = f'yuvj{subsampling}p' if full_range else f'yuv{subsampling}p'
+    else:
+        pix_fmt = f'yuv{subsampling}p{bit_depth}le'
+    return {
+        'width': width,
+        'height': height,
+        'sar': sar,
+        'pix_fmt': pix_fmt,
+        'bits_per_raw_sample': bit_depth
+    }
+
+# Function to read the first SPS out of an avcC (AVCDecoderConfigurationRecord)
+def parse_avcc(data):
+    if len(data) < 8 or data[0] != 1:
+        raise UnsupportedMedia("invalid avcC")
+    if data[5] & 0x1f == 0:
+        raise UnsupportedMedia("avcC without SPS")
+    sps_length = struct.unpack('>H', data[6:8])[0]
+    return parse_h264_sps(data[8:8 + sps_length])
+
+# Function to read chroma format and bit depth out of an hvcC (HEVCDecoderConfigurationRecord)
+def parse_hvcc(data):
+    if len(data) < 23:
+        raise UnsupportedMedia("invalid hvcC")
+    chroma_format = data[16] & 0x03
+    bit_depth = (data[17] & 0x07) + 8
+    # Monochrome and 4:4:4 (possibly RGB) need the full SPS/VUI to name the pixel format
+    if chroma_format not in (1, 2):
+        raise UnsupportedMedia("unsupported HEVC chroma format")
+    subsampling = '420' if chroma_format == 1 else '422'
+    return {'pix_fmt': f'yuv{subsampling}p' if bit_depth == 8 else f'yuv{subsampling}p{bit_depth}le'}
+
+# Function to read the pixel format out of a vpcC (VP codec configuration, version 1)
+def parse_vpcc(data):
+    if len(data) < 10 or data[0] != 1:
+        raise UnsupportedMedia("unsupported vpcC")
+    bit_depth = data[6] >> 4
+    chroma_subsampling = (data[6] >> 1) & 0x07
+    matrix_coefficients = data[9]
+    if matrix_coefficients == 0 or bit_depth not in (8, 10, 12):
+        raise UnsupportedMedia("unsupported VP9 format")
+    subsampling = {0: '420', 1: '420', 2: '422', 3: '444'}.get(chroma_subsampling)
+    if subsampling is None:
+        raise UnsupportedMedia("unsupported VP9 chroma subsampling")
+    return {'pix_fmt': f'yuv{subsampling}p' if bit_depth == 8 else f'yuv{subsampling}p{bit_depth}le'}
+
+# Function to read the pixel format out of an av1C (AV1CodecConfigurationRecord)
+def parse_av1c(data):
+    if len(data) < 4 or data[0] != 0x81:
+        raise UnsupportedMedia("invalid av1C")
+    flags = data[2]
+    high_bitdepth = (flags >> 6) & 1
+    twelve_bit = (flags >> 5) & 1
+    monochrome = (flags >> 4) & 1
+    subsampling_x = (flags >> 3) & 1
+    subsampling_y = (flags >> 2) & 1
+    if monochrome:
+        raise UnsupportedMedia("monochrome AV1")
+    bit_depth = (12 if twelve_bit else 10) if high_bitdepth else 8
+    if subsampling_x and subsampling_y:
+        subsampling = '420'
+    elif subsampling_x:
+        subsampling = '422'
+    else:
+        subsampling = '444'
+    return {'pix_fmt': f'yuv{subsampling}p' if bit_depth == 8 else f'yuv{subsampling}p{bit_depth}le'}
+
+# ProRes 422 flavours; 4444 variants depend on alpha/bit depth and go through ffprobe
+PRORES_422_FOURCCS = (b'apcn', b'apch', b'apcs', b'apco')
+
+PRORES_422 = {'pix_fmt': 'yuv422p10le', 'bits_per_raw_sample': 10}
+
+# Function to turn what a container told us into ffprobe-style stream entries
+def build_stream(codec_name, width, height, duration, bit_rate, frame_rate, container_sar, codec_info):
+    # ffprobe prefers the container's sample aspect ratio and falls back to the codec's
+    sar = container_sar if container_sar and container_sar[0] > 0 and container_sar[1] > 0 else None
+    if sar is None:
+        codec_sar = codec_info.get('sar')
+        if codec_sar and codec_sar[0] > 0 and codec_sar[1] > 0:
+            sar = av_reduce(codec_sar[0], codec_sar[1], INT_MAX)
+    width = codec_info.get('width', width)
+    height = codec_info.get('height', height)
+    # ffprobe may still find a picture size in the bitstream
+    if width <= 0 or height <= 0:
+        raise UnsupportedMedia("no picture size")
+    stream = {
+        'codec_name': codec_name,
+        'width': width,
+        'height': height,
+        'r_frame_rate': f"{frame_rate[0]}/{frame_rate[1]}",
+        'pix_fmt': codec_info['pix_fmt']
+    }
+    if duration is not None:
+        stream['duration'] = f"{duration:.6f}"
+    if bit_rate:
+        stream['bit_rate'] = str(bit_rate)
+    if sar is not None:
+        dar = av_reduce(width * sar[0], height * sar[1], 1024 * 1024)
+        stream['sample_aspect_ratio'] = f"{sar[0]}:{sar[1]}"
+        stream['display_aspect_ratio'] = f"{dar[0]}:{dar[1]}"
+    if 'bits_per_raw_sample' in codec_info:
+        stream['bits_per_raw_sample'] = str(codec_info['bits_per_raw_sample'])
+    return stream
+
+# Function to put streams and container fields together like ffprobe's JSON output. ffmpeg derives
+# the container bitrate from the file size and duration when the container doesn't store one.
+def media_info(streams, format_name, duration, file_size):
+    container = {'format_name': format_name, 'nb_streams': len(streams)}
+    if duration:
+        container['duration'] = f"{duration:.6f}"
+        container['bit_rate'] = str(int(file_size * 8 / duration))
+    return {'streams': streams, 'format': container}
+
+# Function to describe an audio stream the way ffprobe does
+def build_audio_stream(codec_name, channels, sample_rate):
+    return {'codec_name': codec_name, 'channels': channels, 'sample_rate': str(sample_rate)}
+
+# MPEG-4 audio sampling frequency indices and channel configurations (ISO/IEC 14496-3)
+MPEG4_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+MPEG4_CHANNELS = (0, 1, 2, 3, 4, 5, 6, 8)
+
+# Function to read the sample rate and channel count out of an AAC AudioSpecificConfig, as ffmpeg
+# does; 0 channels means they are given elsewhere (program config element)
+def parse_audio_specific_config(data):
+    r = BitReader(data)
+
+    def object_type():
+        value = r.u(5)
+        return 32 + r.u(6) if value == 31 else value
+
+    def sample_rate():
+        index = r.u(4)
+        return r.u(24) if index == 15 else MPEG4_SAMPLE_RATES[index]
+
+    audio_object_type = object_type()
+    rate = sample_rate()
+    channel_config = r.u(4)
+    # Explicitly signalled SBR/PS: the output rate follows
+    if audio_object_type in (5, 29):
+        rate = sample_rate()
+    return rate, MPEG4_CHANNELS[channel_config] if channel_config < len(MPEG4_CHANNELS) else 0
+
+# Function to read an MPEG-4 descriptor header at pos; returns (tag, body start, body size)
+def read_descriptor(data, pos):
+    tag = data[pos]
+    pos += 1
+    size = 0
+    for _ in range(4):
+        byte = data[pos]
+        pos += 1
+        size = (size << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            break
+    return tag, pos, size
+
+# Function to read the object type and decoder specific info (e.g. AudioSpecificConfig) out of an esds box
+def parse_esds(data):
+    tag, pos, _ = read_descriptor(data, 4)
+    if tag != 0x03:
+        raise UnsupportedMedia("esds without ES_Descriptor")
+    flags = data[pos + 2]
+    pos += 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + data[pos]
+    if flags & 0x20:
+        pos += 2
+    tag, pos, size = read_descriptor(data, pos)
+    if tag != 0x04:
+        raise UnsupportedMedia("esds without DecoderConfigDescriptor")
+    object_type = data[pos]
+    end = pos + size
+    pos += 13
+    if pos < end and data[pos] == 0x05:
+        tag, pos, size = read_descriptor(data, pos)
+        return object_type, data[pos:pos + size]
+    return object_type, b''
+
+# MPEG-4 object types of the audio codecs described natively
+MP4_AUDIO_OBJECT_TYPES = {0x40: 'aac', 0x66: 'aac', 0x67: 'aac', 0x68: 'aac', 0x6B: 'mp3'}
+
+# AC-3 channels per audio coding mode (without the LFE channel)
+AC3_CHANNELS = (2, 1, 2, 3, 3, 4, 4, 5)
+
+# Function to name raw PCM samples like ffmpeg does (pcm_s16le, pcm_f32be, ...)
+def pcm_codec_name(bits, big_endian, floating=False, signed=True):
+    if floating:
+        if bits not in (32, 64):
+            raise UnsupportedMedia("unsupported float PCM")
+        return f"pcm_f{bits}{'be' if big_endian else 'le'}"
+    if bits == 8:
+        return 'pcm_s8' if signed else 'pcm_u8'
+    if bits not in (16, 24, 32) or not signed:
+        raise UnsupportedMedia("unsupported PCM")
+    return f"pcm_s{bits}{'be' if big_endian else 'le'}"
+
+# MP4 / QuickTime sample entries we can describe
+
+MP4_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'vp09': 'vp9',
+    b'av01': 'av1',
+    b'apcn': 'prores', b'apch': 'prores', b'apcs': 'prores', b'apco': 'prores'
+}
+
+# Function to iterate over the boxes between start and end, yielding (type, body_start, body_end)
+def iter_boxes(f, start, end):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            raise UnsupportedMedia("invalid box size")
+        # A box running past its parent (or the file) is truncated or corrupt
+        if pos + size > end:
+            raise UnsupportedMedia("truncated box")
+        yield box_type, pos + header_size, pos + size
+        pos += size
+
+def find_box(f, start, end, box_type):
+    for found_type, body_start, body_end in iter_boxes(f, start, end):
+        if found_type == box_type:
+            return body_start, body_end
+    return None
+
+def read_body(f, body_start, body_end):
+    if body_end - body_start > MAX_READ_SIZE:
+        raise UnsupportedMedia("box too large")
+    f.seek(body_start)
+    return f.read(body_end - body_start)
+
+# Function to sum the sample sizes of an stsz box without loading the whole table at once
+def stsz_data_size(f, body_start, body_end):
+    f.seek(body_start)
+    _, sample_size, sample_count = struct.unpack('>III', f.read(12))
+    if sample_size:
+        return sample_size * sample_count, sample_count
+    total = 0
+    remaining = sample_count
+    f.seek(body_start + 12)
+    while remaining:
+        count = min(remaining, 65536)
+        chunk = array('I')
+        chunk.frombytes(f.read(count * 4))
+        if len(chunk) != count:
+            raise UnsupportedMedia("truncated stsz")
+        if sys.byteorder == 'little':
+            chunk.byteswap()
+        total += sum(chunk)
+        remaining -= count
+    return total, sample_count
+
+# Function to find the first video track, i.e. what ffprobe -select_streams v:0 reports.
+# Returns (trak start, trak end, mdia bounds).
+def find_mp4_video_track(f, file_size):
+    moov = find_box(f, 0, file_size, b'moov')
+    if moov is None:
+        raise UnsupportedMedia("no moov box")
+    if find_box(f, *moov, b'mvex') is not None:
+        raise UnsupportedMedia("fragmented MP4")
+
+    for box_type, trak_start, trak_end in iter_boxes(f, *moov):
+        if box_type != b'trak':
+            continue
+        mdia = find_box(f, trak_start, trak_end, b'mdia')
+        if mdia is None:
+            continue
+        hdlr = find_box(f, *mdia, b'hdlr')
+        if hdlr is None or read_body(f, *hdlr)[8:12] != b'vide':
+            continue
+        return trak_start, trak_end, mdia
+    raise UnsupportedMedia("no video track")
+
+# ffprobe's format_name for the containers read here
+MP4_FORMAT_NAME = 'mov,mp4,m4a,3gp,3g2,mj2'
+MKV_FORMAT_NAME = 'matroska,webm'
+
+# Track handler types and the codec_type ffprobe reports for them; other tracks are 'data'
+MP4_HANDLER_TYPES = {
+    b'vide': 'video', b'soun': 'audio',
+    b'sbtl': 'subtitle', b'subt': 'subtitle', b'text': 'subtitle', b'clcp': 'subtitle'
+}
+
+# Function to read every track of an MP4/MOV file and the movie header, like ffprobe -show_streams -show_format
+def read_mp4_media(f, file_size):
+    moov = find_box(f, 0, file_size, b'moov')
+    if moov is None:
+        raise UnsupportedMedia("no moov box")
+    if find_box(f, *moov, b'mvex') is not None:
+        raise UnsupportedMedia("fragmented MP4")
+    mvhd = read_body(f, *find_box(f, *moov, b'mvhd'))
+    if mvhd[0] == 1:
+        timescale, duration = struct.unpack('>IQ', mvhd[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', mvhd[12:20])
+
+    streams = []
+    has_video = False
+    for box_type, trak_start, trak_end in iter_boxes(f, *moov):
+        if box_type != b'trak':
+            continue
+        mdia = find_box(f, trak_start, trak_end, b'mdia')
+        if mdia is None:
+            continue
+        hdlr = find_box(f, *mdia, b'hdlr')
+        codec_type = MP4_HANDLER_TYPES.get(read_body(f, *hdlr)[8:12] if hdlr else None, 'data')
+        # Only the first video stream is described in full, as ffprobe -select_streams v:0 did
+        if codec_type == 'video' and not has_video:
+            stream = read_mp4_video_track(f, read_body(f, *find_box(f, trak_start, trak_end, b'tkhd')), mdia)
+            has_video = True
+        elif codec_type == 'audio':
+            stream = read_mp4_audio_track(f, mdia)
+        else:
+            stream = {}
+        stream['codec_type'] = codec_type
+        streams.append(stream)
+    if not has_video:
+        raise UnsupportedMedia("no video track")
+    return media_info(streams, MP4_FORMAT_NAME, duration / timescale if timescale and duration else None, file_size)
+
+# Function to read the time scale and duration of a track from its mdhd box
+def read_mdhd(f, mdia):
+    mdhd = read_body(f, *find_box(f, *mdia, b'mdhd'))
+    if mdhd[0] == 1:
+        timescale, duration = struct.unpack('>IQ', mdhd[20:32])
+        unknown_duration = 2 ** 64 - 1
+    else:
+        timescale, duration = struct.unpack('>II', mdhd[12:20])
+        unknown_duration = 2 ** 32 - 1
+    if not timescale or duration == unknown_duration:
+        raise UnsupportedMedia("unknown track duration")
+    return timescale, duration
+
+def find_sample_table(f, mdia):
+    minf = find_box(f, *mdia, b'minf')
+    stbl = find_box(f, *minf, b'stbl') if minf else None
+    if stbl is None:
+        raise UnsupportedMedia("no sample table")
+    return stbl
+
+# Function to split the child boxes of a sample entry (from pos) into {type: body}; the first box of a type wins
+def sample_entry_children(entry, pos):
+    children = {}
+    while pos + 8 <= len(entry):
+        size, child_type = struct.unpack('>I4s', entry[pos:pos + 8])
+        if size < 8:
+            break
+        children.setdefault(child_type, entry[pos + 8:pos + size])
+        pos += size
+    return children
+
+IDENTITY_MATRIX = (0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+def read_mp4_video_track(f, tkhd, mdia):
+    # Rotated or scaled tracks change what ffprobe reports; leave those to ffprobe
+    base = 36 if tkhd[0] == 1 else 24
+    matrix = struct.unpack('>9I', tkhd[base + 16:base + 52])
+    if matrix != IDENTITY_MATRIX:
+        raise UnsupportedMedia("track has a display matrix")
+    track_width, track_height = struct.unpack('>II', tkhd[base + 52:base + 60])
+
+    timescale, duration = read_mdhd(f, mdia)
+    stbl = find_sample_table(f, mdia)
+
+    stsd = read_body(f, *find_box(f, *stbl, b'stsd'))
+    entry_size, fourcc = struct.unpack('>I4s', stsd[8:16])
+    codec_name = MP4_CODECS.get(fourcc)
+    if codec_name is None:
+        raise UnsupportedMedia(f"unsupported sample entry {fourcc!r}")
+    entry = stsd[8:8 + entry_size]
+    width, height = struct.unpack('>HH', entry[32:36])
+
+    # Child boxes of the visual sample entry (codec configuration, pixel aspect ratio)
+    children = sample_entry_children(entry, 86)
+
+    if codec_name == 'h264':
+        codec_info = parse_avcc(children[b'avcC'])
+    elif codec_name == 'hevc':
+        codec_info = parse_hvcc(children[b'hvcC'])
+    elif codec_name == 'vp9':
+        codec_info = parse_vpcc(children[b'vpcC'])
+    elif codec_name == 'av1':
+        codec_info = parse_av1c(children[b'av1C'])
+    else:
+        codec_info = PRORES_422
+
+    container_sar = None
+    if b'pasp' in children and len(children[b'pasp']) >= 8:
+        h_spacing, v_spacing = struct.unpack('>II', children[b'pasp'][:8])
+        if h_spacing and v_spacing:
+            container_sar = av_reduce(h_spacing, v_spacing, INT_MAX)
+    if container_sar is None and track_width and track_height and (track_width >> 16, track_height >> 16) != (width, height):
+        # ffmpeg derives an aspect ratio from the track header here; rare enough to leave to ffprobe
+        raise UnsupportedMedia("track size differs from sample size")
+
+    # r_frame_rate: ffmpeg uses the stts delta directly when every sample has the same duration
+    stts = read_body(f, *find_box(f, *stbl, b'stts'))
+    entry_count = struct.unpack('>I', stts[4:8])[0]
+    entries = [struct.unpack('>II', stts[8 + i * 8:16 + i * 8]) for i in range(entry_count)]
+    if not entries:
+        raise UnsupportedMedia("empty stts")
+    if len(entries) == 1 or (len(entries) == 2 and entries[1][0] == 1):
+        delta = entries[0][1]
+    else:
+        delta = max(entries, key=lambda e: e[0])[1]
+    frame_rate = av_reduce(timescale, delta, INT_MAX) if delta else (0, 1)
+
+    # Stream bitrate is total sample bytes over the track duration, rounded like av_rescale
+    data_size, sample_count = stsz_data_size(f, *find_box(f, *stbl, b'stsz'))
+    if not sample_count:
+        raise UnsupportedMedia("no samples")
+    bit_rate = (data_size * 8 * timescale + duration // 2) // duration if duration else 0
+
+    return build_stream(
+        codec_name, width, height, duration / timescale, bit_rate, frame_rate, container_sar, codec_info
+    )
+
+# Function to describe an audio track from its sample entry (codec, channels, sample rate)
+def read_mp4_audio_track(f, mdia):
+    stbl = find_sample_table(f, mdia)
+    stsd = read_body(f, *find_box(f, *stbl, b'stsd'))
+    entry_size, fourcc = struct.unpack('>I4s', stsd[8:16])
+    entry = stsd[8:8 + entry_size]
+
+    # Sound sample entries: version 0 (ISO and QuickTime), 1 (QuickTime, 16 more bytes) and
+    # 2 (QuickTime, rate as a double and the PCM layout spelled out)
+    version = struct.unpack('>H', entry[16:18])[0]
+    lpcm_flags = 0
+    if version == 2:
+        sample_rate = round(struct.unpack('>d', entry[40:48])[0])
+        channels, _, bits, lpcm_flags = struct.unpack('>IIII', entry[48:64])
+        children = sample_entry_children(entry, 72)
+    elif version in (0, 1):
+        channels, bits = struct.unpack('>HH', entry[24:28])
+        sample_rate = struct.unpack('>I', entry[32:36])[0] >> 16
+        children = sample_entry_children(entry, 52 if version == 1 else 36)
+    else:
+        raise UnsupportedMedia("unknown sound sample entry version")
+    # QuickTime keeps the codec configuration of compressed audio in a wave box
+    if b'wave' in children:
+        children = dict(sample_entry_children(children[b'wave'], 0), **children)
+
+    if fourcc == b'mp4a':
+        object_type, config = parse_esds(children[b'esds'])
+        codec_name = MP4_AUDIO_OBJECT_TYPES.get(object_type)
+        if codec_name is None:
+            raise UnsupportedMedia(f"unsupported MPEG-4 audio object type {object_type:#x}")
+        if codec_name == 'aac' and config:
+            sample_rate, config_channels = parse_audio_specific_config(config)
+            channels = config_channels or channels
+    elif fourcc == b'.mp3':
+        codec_name = 'mp3'
+    elif fourcc == b'ac-3':
+        dac3 = children[b'dac3']
+        acmod = (dac3[1] >> 3) & 0x07
+        channels = AC3_CHANNELS[acmod] + ((dac3[1] >> 2) & 0x01)
+        codec_name = 'ac3'
+    elif fourcc == b'Opus':
+        # Opus always decodes at 48 kHz
+        codec_name = 'opus'
+        sample_rate = 48000
+    elif fourcc in (b'sowt', b'twos'):
+        codec_name = pcm_codec_name(bits, fourcc == b'twos')
+    elif fourcc == b'lpcm' and version == 2:
+        codec_name = pcm_codec_name(bits, lpcm_flags & 0x2, floating=lpcm_flags & 0x1, signed=lpcm_flags & 0x4)
+    else:
+        raise UnsupportedMedia(f"unsupported audio sample entry {fourcc!r}")
+    return build_audio_stream(codec_name, channels, sample_rate)
+
+# Function to read the (time, duration, size) of the video samples whose decode time falls in the
+# given (start, length) intervals (seconds), straight from the sample tables: stts for the times and
+# only the needed stretches of stsz for the sizes. Stops after max_packets samples.
+def read_mp4_packets(f, file_size, intervals, max_packets):
+    _, _, mdia = find_mp4_video_track(f, file_size)
+    timescale, _ = read_mdhd(f, mdia)
+    stbl = find_sample_table(f, mdia)
+    stts = read_body(f, *find_box(f, *stbl, b'stts'))
+    stsz_start, _ = find_box(f, *stbl, b'stsz')
+    f.seek(stsz_start)
+    _, sample_size, sample_count = struct.unpack('>III', f.read(12))
+
+    packets = []
+    for start, length in intervals:
+        begin = int(start * timescale)
+        end = int((start + length) * timescale)
+        # Walk the stts runs to the first sample at or after begin
+        sample = 0
+        dts = 0
+        pos = 8
+        count, delta = 0, 0
+        while pos + 8 <= len(stts):
+            count, delta = struct.unpack('>II', stts[pos:pos + 8])
+            pos += 8
+            if delta and dts + count * delta > begin:
+                skip = max(0, -(-(begin - dts) // delta))
+                sample += skip
+                dts += skip * delta
+                count -= skip
+                break
+            sample += count
+            dts += count * delta
+            count = 0
+        # Collect samples until end, reading their sizes in one stretch per run
+        while count and dts < end and sample < sample_count and len(packets) < max_packets:
+            needed = -(-(end - dts) // delta) if delta else count
+            take = min(count, sample_count - sample, max_packets - len(packets), needed)
+            if sample_size:
+                sizes = [sample_size] * take
+            else:
+                f.seek(stsz_start + 12 + sample * 4)
+                sizes = array('I')
+                sizes.frombytes(f.read(take * 4))
+                if len(sizes) != take:
+                    raise UnsupportedMedia("truncated stsz")
+                if sys.byteorder == 'little':
+                    sizes.byteswap()
+            for n, size in enumerate(sizes):
+                packets.append(((dts + n * delta) / timescale, delta / timescale, size))
+            sample += take
+            dts += take * delta
+            count -= take
+            if not count and pos + 8 <= len(stts):
+                count, delta = struct.unpack('>II', stts[pos:pos + 8])
+                pos += 8
+        if len(packets) >= max_packets:
+            break
+    return packets
+
+# Matroska / WebM element IDs
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMESTAMP_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_CLUSTER = 0x1F43B675
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_CODEC_PRIVATE = 0x63A2
+MKV_DEFAULT_DURATION = 0x23E383
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_DISPLAY_WIDTH = 0x54B0
+MKV_DISPLAY_HEIGHT = 0x54BA
+MKV_DISPLAY_UNIT = 0x54B2
+MKV_PIXEL_CROP = (0x54AA, 0x54BB, 0x54CC, 0x54DD)
+MKV_AUDIO = 0xE1
+MKV_SAMPLING_FREQUENCY = 0xB5
+MKV_CHANNELS = 0x9F
+MKV_BIT_DEPTH = 0x6264
+
+# Track types and the codec_type ffprobe reports for them; other tracks are 'data'
+MKV_TRACK_TYPES = {1: 'video', 2: 'audio', 0x11: 'subtitle'}
+
+MKV_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc',
+    'V_AV1': 'av1',
+    'V_PRORES': 'prores'
+}
+
+MKV_AUDIO_CODECS = {
+    'A_AAC': 'aac',
+    'A_OPUS': 'opus',
+    'A_VORBIS': 'vorbis',
+    'A_AC3': 'ac3',
+    'A_EAC3': 'eac3',
+    'A_FLAC': 'flac',
+    'A_MPEG/L3': 'mp3',
+    'A_DTS': 'dts'
+}
+
+UNKNOWN_SIZE = object()
+
+def read_vint(data, pos, keep_marker=False):
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise UnsupportedMedia("invalid EBML vint")
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == mask - 1
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if len(data) < pos + length:
+        raise UnsupportedMedia("truncated EBML vint")
+    if not keep_marker and all_ones:
+        value = UNKNOWN_SIZE
+    return value, pos + length
+
+# Function to iterate over EBML elements in a bytes buffer, yielding (id, body)
+def iter_elements(data):
+    pos = 0
+    while pos < len(data):
+        element_id, pos = read_vint(data, pos, keep_marker=True)
+        size, pos = read_vint(data, pos)
+        if size is UNKNOWN_SIZE:
+            raise UnsupportedMedia("unknown-size child element")
+        if pos + size > len(data):
+            raise UnsupportedMedia("truncated element")
+        yield element_id, data[pos:pos + size]
+        pos += size
+
+def read_uint(data):
+    return int.from_bytes(data, 'big') if data else 0
+
+def read_float(data, default=0.0):
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return default
+
+def read_element_header(f, pos):
+    f.seek(pos)
+    head = f.read(12)
+    if len(head) < 2:
+        return None
+    element_id, offset = read_vint(head, 0, keep_marker=True)
+    size, offset = read_vint(head, offset)
+    return element_id, pos + offset, size
+
+# Function to read the tracks and segment info of a Matroska/WebM file, like ffprobe -show_streams -show_format
+def read_mkv_media(f, file_size):
+    header = read_element_header(f, 0)
+    if header is None or header[0] != EBML_HEADER or header[2] is UNKNOWN_SIZE:
+        raise UnsupportedMedia("not an EBML file")
+    segment = read_element_header(f, header[1] + header[2])
+    if segment is None or segment[0] != MKV_SEGMENT:
+        raise UnsupportedMedia("no Segment")
+    segment_start = segment[1]
+    segment_end = file_size if segment[2] is UNKNOWN_SIZE else min(segment_start + segment[2], file_size)
+
+    # Walk the top-level elements until Info and Tracks; use the SeekHead if a Cluster comes first
+    found = {}
+    seek_positions = {}
+    pos = segment_start
+    while pos < segment_end:
+        element = read_element_header(f, pos)
+        if element is None or element[2] is UNKNOWN_SIZE:
+            break
+        element_id, body_start, size = element
+        if element_id in (MKV_INFO, MKV_TRACKS):
+            found[element_id] = (body_start, size)
+            if len(found) == 2:
+                break
+        if element_id == MKV_SEEK_HEAD:
+            seek_positions = read_seek_head(read_mkv_body(f, body_start, size), segment_start)
+        if element_id == MKV_CLUSTER:
+            break
+        pos = body_start + size
+
+    for element_id in (MKV_INFO, MKV_TRACKS):
+        if element_id not in found and element_id in seek_positions:
+            element = read_element_header(f, seek_positions[element_id])
+            if element is not None and element[0] == element_id and element[2] is not UNKNOWN_SIZE:
+                found[element_id] = (element[1], element[2])
+    if MKV_TRACKS not in found:
+        raise UnsupportedMedia("no Tracks element")
+
+    streams = []
+    has_video = False
+    for element_id, entry in iter_elements(read_mkv_body(f, *found[MKV_TRACKS])):
+        if element_id != MKV_TRACK_ENTRY:
+            continue
+        fields = dict(iter_elements(entry))
+        codec_type = MKV_TRACK_TYPES.get(read_uint(fields.get(MKV_TRACK_TYPE, b'')), 'data')
+        # Only the first video stream is described in full, as ffprobe -select_streams v:0 did
+        if codec_type == 'video' and not has_video:
+            stream = read_mkv_video_track(fields)
+            has_video = True
+        elif codec_type == 'audio':
+            stream = read_mkv_audio_track(fields)
+        else:
+            stream = {}
+        stream['codec_type'] = codec_type
+        streams.append(stream)
+    if not has_video:
+        raise UnsupportedMedia("no video track")
+
+    # The segment duration is a float in units of the timestamp scale (nanoseconds, 1 ms by default)
+    duration = None
+    if MKV_INFO in found:
+        info = dict(iter_elements(read_mkv_body(f, *found[MKV_INFO])))
+        timestamp_scale = read_uint(info.get(MKV_TIMESTAMP_SCALE, b'')) or 1_000_000
+        duration = read_float(info.get(MKV_DURATION, b'')) * timestamp_scale / 1_000_000_000
+    return media_info(streams, MKV_FORMAT_NAME, duration, file_size)
+
+def read_mkv_body(f, body_start, size):
+    if size > MAX_READ_SIZE:
+        raise UnsupportedMedia("element too large")
+    f.seek(body_start)
+    data = f.read(size)
+    if len(data) < size:
+        raise UnsupportedMedia("truncated element")
+    return data
+
+# Function to read a SeekHead into {element id: file position}
+def read_seek_head(data, segment_start):
+    positions = {}
+    for element_id, seek in iter_elements(data):
+        if element_id != MKV_SEEK:
+            continue
+        fields = dict(iter_elements(seek))
+        positions.setdefault(read_uint(fields.get(MKV_SEEK_ID, b'')), segment_start + read_uint(fields.get(MKV_SEEK_POSITION, b'')))
+    return positions
+
+# Function to describe an audio track from its codec ID and Audio element
+def read_mkv_audio_track(fields):
+    codec_id = fields.get(MKV_CODEC_ID, b'').decode('ascii', 'replace').rstrip('\x00')
+    audio = dict(iter_elements(fields.get(MKV_AUDIO, b'')))
+    # Matroska defaults: mono at 8 kHz
+    channels = read_uint(audio.get(MKV_CHANNELS, b'')) or 1
+    sample_rate = round(read_float(audio.get(MKV_SAMPLING_FREQUENCY, b''), 8000.0))
+    bits = read_uint(audio.get(MKV_BIT_DEPTH, b''))
+
+    if codec_id.startswith('A_AAC'):
+        codec_name = 'aac'
+        if fields.get(MKV_CODEC_PRIVATE):
+            sample_rate, config_channels = parse_audio_specific_config(fields[MKV_CODEC_PRIVATE])
+            channels = config_channels or channels
+    elif codec_id == 'A_PCM/INT/LIT':
+        codec_name = pcm_codec_name(bits, False, signed=bits != 8)
+    elif codec_id == 'A_PCM/INT/BIG':
+        codec_name = pcm_codec_name(bits, True, signed=bits != 8)
+    elif codec_id == 'A_PCM/FLOAT/IEEE':
+        codec_name = pcm_codec_name(bits, False, floating=True)
+    else:
+        codec_name = MKV_AUDIO_CODECS.get(codec_id)
+        if codec_name is None:
+            raise UnsupportedMedia(f"unsupported codec {codec_id}")
+        if codec_name == 'opus':
+            sample_rate = 48000
+    return build_audio_stream(codec_name, channels, sample_rate)
+
+def read_mkv_video_track(fields):
+    codec_id = fields.get(MKV_CODEC_ID, b'').decode('ascii', 'replace').rstrip('\x00')
+    codec_name = MKV_CODECS.get(codec_id)
+    if codec_name is None:
+        raise UnsupportedMedia(f"unsupported codec {codec_id}")
+    codec_private = fields.get(MKV_CODEC_PRIVATE, b'')
+
+    # Without DefaultDuration ffprobe estimates the frame rate from packets, which we can't do
+    default_duration = read_uint(fields.get(MKV_DEFAULT_DURATION, b''))
+    if not default_duration:
+        raise UnsupportedMedia("no DefaultDuration")
+    frame_rate = av_reduce(1_000_000_000, default_duration, 30000)
+    if not frame_rate[1] * 5 < frame_rate[0] < frame_rate[1] * 1000:
+        raise UnsupportedMedia("frame rate out of the range ffmpeg trusts")
+
+    video = dict(iter_elements(fields.get(MKV_VIDEO, b'')))
+    width = read_uint(video.get(MKV_PIXEL_WIDTH, b''))
+    height = read_uint(video.get(MKV_PIXEL_HEIGHT, b''))
+    if any(read_uint(video.get(crop, b'')) for crop in MKV_PIXEL_CROP):
+        raise UnsupportedMedia("cropped track")
+
+    if codec_name == 'h264':
+        codec_info = parse_avcc(codec_private)
+    elif codec_name == 'hevc':
+        codec_info = parse_hvcc(codec_private)
+    elif codec_name == 'av1':
+        codec_info = parse_av1c(codec_private)
+    else:
+        if codec_private[:4] not in PRORES_422_FOURCCS:
+            raise UnsupportedMedia("unsupported ProRes flavour")
+        codec_info = PRORES_422
+
+    # Matroska signals the aspect ratio through display dimensions, which default to the pixel size
+    if read_uint(video.get(MKV_DISPLAY_UNIT, b'')) > 3:
+        raise UnsupportedMedia("unknown display unit")
+    display_width = read_uint(video.get(MKV_DISPLAY_WIDTH, b'')) or width
+    display_height = read_uint(video.get(MKV_DISPLAY_HEIGHT, b'')) or height
+    container_sar = av_reduce(height * display_width, width * display_height, 255)
+
+    # Matroska streams carry no duration or bitrate of their own in ffprobe's stream section
+    return build_stream(codec_name, width, height, None, 0, frame_rate, container_sar, codec_info)
+
+# Function to read the streams and container of an MP4/MOV/MKV/WebM file, shaped like
+# ffprobe -show_format -show_streams JSON ({'streams': [...], 'format': {...}}); None means "use ffprobe"
+def read_media_info(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in NATIVE_EXTENSIONS:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if extension in ('.mkv', '.webm'):
+                return read_mkv_media(f, file_size)
+            return read_mp4_media(f, file_size)
+    except (UnsupportedMedia, KeyError, IndexError, TypeError, struct.error, OSError):
+        return None
+
+# Function to sample the video packets of an MP4/MOV file (see read_mp4_packets); None means "ask the backend"
+def read_video_packets(file_path, intervals, max_packets):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in NATIVE_EXTENSIONS or extension in ('.mkv', '.webm'):
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            return read_mp4_packets(f, os.fstat(f.fileno()).st_size, intervals, max_packets) or None
+    except (UnsupportedMedia, KeyError, IndexError, TypeError, struct.error, OSError):
+        return None
@@ -0,0 +1,80 @@
+import os
+
+from .expr import (BITRATE_FIELDS, PATH_STAGE, PROBE_STAGE, STAT_STAGE, compile_predicate, conjuncts,
+                   expression_fields, make_and, stage)
+from .records import VideoInfo
+
+# Function to build the info dict reported for files that matched without being probed
+def stat_only_info(size):
+    return VideoInfo(
+        codec='Unknown',
+        width=0,
+        height=0,
+        duration=0.0,
+        bitrate=0,
+        bitrate_mode='Unknown',
+        size=size,
+        framerate=0.0,
+        display_aspect_ratio='Unknown',
+        color_space='Unknown',
+        bit_depth=0
+    )
+
+# Splits the filter expression of parsed criteria into cheap path/stat checks, run before any
+# probe, and probe-dependent ones. Each group is compiled once into a predicate.
+# Files are only bitrate-sampled (see bitrate.py) when a probe check reads a bitrate field, and only
+# once their header metadata passes the other probe checks (sample_filter).
+class ScanPlan:
+    def __init__(self, criteria):
+        self.criteria = criteria
+        self.expression = criteria['expression']
+        stages = {PATH_STAGE: [], STAT_STAGE: [], PROBE_STAGE: []}
+        for node in conjuncts(self.expression):
+            stages[stage(node)].append(node)
+        self.path_checks = stages[PATH_STAGE]
+        self.stat_checks = stages[STAT_STAGE]
+        self.probe_checks = stages[PROBE_STAGE]
+        self.needs_probe = bool(self.probe_checks)
+        bitrate_checks = [node for node in self.probe_checks if expression_fields(node) & BITRATE_FIELDS]
+        self.samples_bitrate = bool(bitrate_checks)
+        self.sample_filter = make_and([node for node in self.probe_checks if node not in bitrate_checks])
+        self.path_predicate = compile_predicate(make_and(self.path_checks))
+        self.stat_predicate = compile_predicate(make_and(self.stat_checks))
+        self.probe_predicate = compile_predicate(make_and(self.probe_checks))
+
+    # Return True when the file can still match; st may be passed in when the caller already has it
+    def prefilter(self, file_path, st=None):
+        if self.path_checks and not self.path_predicate(file_path, None, None):
+            return False
+        if self.stat_checks:
+            if st is None:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    return False
+            if not self.stat_predicate(file_path, st, None):
+                return False
+        return True
+
+    # Return True when a probed file matches the probe-dependent checks
+    def matches(self, file_path, info, st=None):
+        return self.probe_predicate(file_path, st, info)
+
+    # Return True when bitrate sampling was tried on a probed file (see probe.get_video_info)
+    def sampled(self, file_path, info):
+        return info is not None and compile_predicate(self.sample_filter)(file_path, None, info)
+
+    # Yield (index, file_path, info) for candidates when no probe-dependent criterion is enabled:
+    # cached metadata is reused when available, otherwise only the size is known
+    def stat_results(self, file_paths, cache=None):
+        for idx, item in enumerate(file_paths):
+            file_path, signature = item if isinstance(item, tuple) else (item, None)
+            info = None
+            if cache is not None:
+                _, info = cache.lookup(file_path, signature)
+            if info is None:
+                try:
+                    info = stat_only_info(signature[0] if signature else os.path.getsize(file_path))
+                except OSError:
+                    info = None
+            yield idx, file_path, info
@@ -0,0 +1,391 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .backends import FFprobeBackend, find_ffprobe
+from .bitrate import MAX_SAMPLED_PACKETS, bitrate_stats, sample_intervals
+from .config import CONFIG_PATH, load_config, save_config
+from .expr import compile_predicate
+from .native import read_media_info, read_video_packets
+from .records import VideoInfo
+from .timing import phase, record_phases
+
+# Global variable to store the path to ffprobe
+ffprobe_path = 'ffprobe'  # Default to 'ffprobe', assuming it's in PATH
+
+# Read MP4/MOV/MKV headers in Python before falling back to ffprobe
+native_parser_enabled = True
+
+# Default number of concurrent probe workers (ffprobe is I/O and process bound)
+DEFAULT_PROBE_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# Name of the ffprobe executable on this platform
+FFPROBE_EXECUTABLE = 'ffprobe.exe' if os.name == 'nt' else 'ffprobe'
+
+# Function to check if FFmpeg is installed: ffprobe_path, or else the copy install_ffmpeg installed.
+# ffprobe is only run when it changed since the last launch (see backends.find_ffprobe);
+# ffprobe_path is set to the executable found.
+def is_ffmpeg_installed(config_path=CONFIG_PATH):
+    global ffprobe_path
+    ffprobe = find_ffprobe(ffprobe_path, config_path)
+    if ffprobe is None:
+        installed = load_config(config_path).get('installed_ffprobe')
+        if installed:
+            ffprobe = find_ffprobe(installed, config_path)
+    if ffprobe is None:
+        return False
+    ffprobe_path = ffprobe['path']
+    return True
+
+# Function to install FFmpeg
+def install_ffmpeg(config_path=CONFIG_PATH):
+    # The download is a Windows build
+    if os.name != 'nt':
+        raise Exception("FFmpeg can only be installed automatically on Windows. "
+                        "Install it with your package manager (e.g. apt install ffmpeg or brew install ffmpeg).")
+
+    import urllib.request
+    import zipfile
+
+    ffmpeg_url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
+    ffmpeg_zip = "ffmpeg.zip"
+    install_path = os.path.join(os.getcwd(), "ffmpeg")
+
+    try:
+        print("Downloading FFmpeg...")
+        urllib.request.urlretrieve(ffmpeg_url, ffmpeg_zip)
+
+        print("Extracting FFmpeg...")
+        with zipfile.ZipFile(ffmpeg_zip, 'r') as zip_ref:
+            zip_ref.extractall(install_path)
+
+        # Find the bin folder inside the extracted FFmpeg directory
+        extracted_folders = os.listdir(install_path)
+        if not extracted_folders:
+            raise Exception("No files found after extracting FFmpeg.")
+        ffmpeg_root_folder = os.path.join(install_path, extracted_folders[0])
+        ffmpeg_bin = os.path.join(ffmpeg_root_folder, "bin")
+
+        if not os.path.isdir(ffmpeg_bin):
+            raise Exception(f"FFmpeg bin folder not found at {ffmpeg_bin}")
+
+        # Add FFmpeg to PATH
+        os.environ["PATH"] = ffmpeg_bin + os.pathsep + os.environ["PATH"]
+
+        # Update the global ffprobe_path variable
+        global ffprobe_path
+        ffprobe_path = os.path.join(ffmpeg_bin, FFPROBE_EXECUTABLE)
+        if not os.path.isfile(ffprobe_path):
+            raise Exception(f"ffprobe not found at {ffprobe_path}")
+
+        # Later launches find this copy through the config cache (the PATH change only lasts this run)
+        config = load_config(config_path)
+        config['installed_ffprobe'] = ffprobe_path
+        save_config(config, config_path)
+
+        # Clean up
+        os.remove(ffmpeg_zip)
+        print("FFmpeg installed and added to PATH.")
+    except Exception as e:
+        raise Exception(f"Failed to install FFmpeg: {e}")
+
+# Updated get_video_info function; backend defaults to the ffprobe executable at ffprobe_path.
+# sample_bitrate is None or a filter expression (see expr.py, TRUE for every file): files whose
+# header metadata matches it also get their bitrate measured from sampled packets (see bitrate.py).
+# Without sampling the bitrate mode is 'Unknown'.
+# Video, audio and container fields all come from a single probe of the file (see backends.py).
+def get_video_info(file_path, backend=None, sample_bitrate=None):
+    return probe_video(file_path, backend, sample_bitrate)[0]
+
+# Function to report a file that could not be probed; returns (None, reason) as probe_video does
+def probe_failure(file_path, error):
+    print(f"Error analyzing file {file_path}: {error}", file=sys.stderr)
+    return None, str(error)
+
+# Function to probe one file like get_video_info; returns (info, None), or (None, reason) when the
+# file could not be probed
+def probe_video(file_path, backend=None, sample_bitrate=None):
+    if backend is None:
+        backend = FFprobeBackend(ffprobe_path)
+    try:
+        # MP4/MOV/MKV headers are read directly when possible, which avoids running the backend
+        media = None
+        if native_parser_enabled and backend.use_native:
+            with phase('native'):
+                media = read_media_info(file_path)
+        if media is None:
+            media = backend.probe_file(file_path)
+            if media is None:
+                return probe_failure(file_path, "no metadata could be read")
+        with phase('info'):
+            info = video_info_from_media(media, file_path)
+        if sample_bitrate is not None and compile_predicate(sample_bitrate)(file_path, None, info):
+            with phase('bitrate'):
+                stats = sample_video_bitrate(file_path, info['duration'], backend)
+            if stats is not None:
+                # A container bitrate standing in for the stream's is replaced by the measured one
+                info.apply_bitrate_stats(stats, keep_bitrate=bool(first_video_stream(media).get('bit_rate')))
+        return info, None
+    except Exception as e:
+        return probe_failure(file_path, e)
+
+# Function to find the first video stream of ffprobe -show_streams output, skipping cover art
+# (attached pictures); raises ValueError when there is none
+def first_video_stream(media):
+    for stream in media.get('streams', ()):
+        if stream.get('codec_type') == 'video' and not stream.get('disposition', {}).get('attached_pic'):
+            return stream
+    raise ValueError("no video stream")
+
+# Function to read an ffprobe number field ('N/A' or missing counts as 0)
+def number_field(entry, key, kind=int):
+    try:
+        return kind(entry.get(key, 0))
+    except ValueError:
+        return kind(0)
+
+# Function to turn ffprobe -show_format -show_streams output into the VideoInfo record used for filtering
+def video_info_from_media(media, file_path):
+    stream = first_video_stream(media)
+    media_format = media.get('format', {})
+    streams = media.get('streams', ())
+    audio = [entry for entry in streams if entry.get('codec_type') == 'audio']
+    video_streams = sum(1 for entry in streams if entry.get('codec_type') == 'video'
+                        and not entry.get('disposition', {}).get('attached_pic'))
+
+    # Now extract the fields with proper handling
+    codec_name = stream.get('codec_name', 'Unknown')
+    width = int(stream.get('width', 0))
+    height = int(stream.get('height', 0))
+    container_duration = number_field(media_format, 'duration', float)
+    container_bitrate = number_field(media_format, 'bit_rate')
+    # Streams of some containers (Matroska, WebM, ...) carry no duration or bitrate of their own;
+    # those of the container stand in for them
+    duration = number_field(stream, 'duration', float) or container_duration
+    bit_rate = number_field(stream, 'bit_rate') or container_bitrate
+    r_frame_rate = stream.get('r_frame_rate', '0/1')
+    display_aspect_ratio = stream.get('display_aspect_ratio', 'Unknown')
+    sample_aspect_ratio = stream.get('sample_aspect_ratio', 'Unknown')
+    color_space = stream.get('color_space', 'Unknown')
+    bits_per_raw_sample = stream.get('bits_per_raw_sample', 'N/A')
+    pix_fmt = stream.get('pix_fmt', 'Unknown')
+
+    # Calculate framerate
+    if r_frame_rate != 'N/A':
+        num, denom = r_frame_rate.split('/')
+        framerate = float(num) / float(denom) if float(denom) != 0 else 0
+    else:
+        framerate = 0
+
+    file_size = os.path.getsize(file_path)
+    # A reported bitrate says nothing about whether it varies; only bitrate sampling can tell
+    bitrate_mode = 'Unknown'
+    # Handle missing bitrate
+    bitrate = bit_rate if bit_rate != 0 else 0
+
+    # Handle bit depth
+    if bits_per_raw_sample != 'N/A' and bits_per_raw_sample.isdigit():
+        bit_depth = int(bits_per_raw_sample)
+    else:
+        # Attempt to infer bit depth from pix_fmt
+        bit_depth = infer_bit_depth_from_pix_fmt(pix_fmt)
+
+    # Infer color space from pix_fmt
+    color_space = infer_color_space_from_pix_fmt(pix_fmt)
+
+    # Calculate display aspect ratio if it's 'Unknown' or '0:1' or 'N/A'
+    if display_aspect_ratio in ['Unknown', '0:1', 'N/A']:
+        gcd = lambda a, b: gcd(b, a % b) if b else a
+        ratio_gcd = gcd(width, height)
+        display_aspect_ratio = f"{width // ratio_gcd}:{height // ratio_gcd}"
+
+    return VideoInfo(
+        codec=codec_name,
+        width=width,
+        height=height,
+        duration=duration,
+        bitrate=bitrate,
+        bitrate_mode=bitrate_mode,
+        size=file_size,
+        framerate=framerate,
+        display_aspect_ratio=display_aspect_ratio,
+        color_space=color_space,
+        bit_depth=bit_depth,
+        container=media_format.get('format_name', 'Unknown'),
+        container_duration=container_duration,
+        container_bitrate=container_bitrate,
+        audio_codec=audio[0].get('codec_name', 'Unknown') if audio else 'none',
+        audio_channels=number_field(audio[0], 'channels') if audio else 0,
+        audio_sample_rate=number_field(audio[0], 'sample_rate') if audio else 0,
+        video_streams=video_streams,
+        audio_streams=len(audio),
+        subtitle_streams=sum(1 for entry in streams if entry.get('codec_type') == 'subtitle')
+    )
+
+# Function to measure the bitrate of a file from a bounded sample of its packets: MP4/MOV sample
+# tables are read directly, other files through the backend. Returns bitrate.bitrate_stats or None.
+def sample_video_bitrate(file_path, duration, backend):
+    intervals = sample_intervals(duration)
+    packets = None
+    if native_parser_enabled and backend.use_native:
+        packets = read_video_packets(file_path, intervals, MAX_SAMPLED_PACKETS)
+    if packets is None:
+        packets = backend.sample_packets(file_path, intervals, MAX_SAMPLED_PACKETS)
+    return bitrate_stats(packets) if packets else None
+
+# Function to infer bit depth from pixel format
+def infer_bit_depth_from_pix_fmt(pix_fmt):
+    # Common pixel formats and their bit depths
+    pix_fmt_bit_depth = {
+        'yuv420p': 8,
+        'yuv422p': 8,
+        'yuv444p': 8,
+        'yuv420p10le': 10,
+        'yuv422p10le': 10,
+        'yuv444p10le': 10,
+        'yuv420p12le': 12,
+        'yuv422p12le': 12,
+        'yuv444p12le': 12,
+        'yuv420p16le': 16,
+        'yuv422p16le': 16,
+        'yuv444p16le': 16,
+        'rgb24': 8,
+        'rgba': 8,
+        'rgb48le': 16,
+        'gbrp': 8,
+        'gbrp10le': 10,
+        'gbrp12le': 12,
+        'gbrp16le': 16,
+        # Add more mappings as needed
+    }
+    return pix_fmt_bit_depth.get(pix_fmt, 0)
+
+# Function to infer color space from pixel format
+def infer_color_space_from_pix_fmt(pix_fmt):
+    # Mapping of pix_fmt to color space
+    pix_fmt_color_space = {
+        'yuv420p': 'YUV',
+        'yuv422p': 'YUV',
+        'yuv444p': 'YUV',
+        'yuv420p10le': 'YUV',
+        'yuv422p10le': 'YUV',
+        'yuv444p10le': 'YUV',
+        'yuv420p12le': 'YUV',
+        'yuv422p12le': 'YUV',
+        'yuv444p12le': 'YUV',
+        'yuv420p16le': 'YUV',
+        'yuv422p16le': 'YUV',
+        'yuv444p16le': 'YUV',
+        'nv12': 'YUV',
+        'rgb24': 'RGB',
+        'rgba': 'RGB',
+        'rgb48le': 'RGB',
+        'gbrp': 'RGB',
+        'gbrp10le': 'RGB',
+        'gbrp12le': 'RGB',
+        'gbrp16le': 'RGB',
+        # Add more mappings as needed
+    }
+    return pix_fmt_color_space.get(pix_fmt, 'Unknown')
+
+# Function to initialize a process pool worker with the parent's probe settings
+def init_probe_worker(path, native=True):
+    global ffprobe_path, native_parser_enabled
+    ffprobe_path = path
+    native_parser_enabled = native
+
+# Function to probe one file while timing its phases (see timing.py); returns ((info, error), seconds, phases)
+def timed_video_info(file_path, backend=None, sample_bitrate=None):
+    return record_phases(probe_video, file_path, backend, sample_bitrate)
+
+# Function to probe files concurrently, yielding (index, file_path, info) as each one finishes.
+# video_files may be any iterable (it is consumed lazily) of paths or (path, stat signature) pairs.
+# backend is a ProbeBackend (see backends.py); None uses ffprobe. With a ScanTimings as timer,
+# every probe and cache lookup is timed where it runs (also in pool processes).
+# sample_bitrate selects the files whose bitrate is sampled, as in get_video_info; cached entries
+# of such files without sampled figures are probed again.
+# Probes run in a thread pool, a process pool (use_processes) or as asyncio tasks (use_async, see
+# asyncprobe.py). on_failure(file_path, reason) is called for every file that could not be probed.
+def probe_videos(video_files, workers=DEFAULT_PROBE_WORKERS, use_processes=False, cache=None, backend=None,
+                 timer=None, sample_bitrate=None, on_failure=None, use_async=False):
+    executor = None
+    # Keep a bounded number of probes in flight so huge folders don't queue everything at once
+    max_in_flight = workers * 4
+    pending = {}
+    probe = probe_video if timer is None else timed_video_info
+    task = probe
+
+    # Turn what probe returned into the info dict, recording its timings and failure
+    def probe_info(file_path, result):
+        if timer is None:
+            info, error = result
+        else:
+            (info, error), seconds, phases = result
+            timer.add_file(file_path, seconds, phases, failed=info is None)
+        if error is not None and on_failure is not None:
+            on_failure(file_path, error)
+        return info
+
+    def finished(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            idx, file_path, signature = pending.pop(future)
+            info = probe_info(file_path, future.result())
+            if cache is not None and info is not None:
+                cache.store(file_path, signature, info)
+            yield idx, file_path, info
+
+    try:
+        for idx, item in enumerate(video_files):
+            file_path, signature = item if isinstance(item, tuple) else (item, None)
+            if cache is not None:
+                lookup_started = time.perf_counter()
+                signature, info = cache.lookup(file_path, signature)
+                if (info is not None and sample_bitrate is not None and not info.bitrate_sampled
+                        and compile_predicate(sample_bitrate)(file_path, None, info)):
+                    info = None
+                if timer is not None:
+                    timer.add('cache', time.perf_counter() - lookup_started)
+                    timer.count('cache_hits' if info is not None else 'cache_misses')
+                if info is not None:
+                    yield idx, file_path, info
+                    continue
+
+            if workers <= 1:
+                info = probe_info(file_path, probe(file_path, backend, sample_bitrate))
+                if cache is not None and info is not None:
+                    cache.store(file_path, signature, info)
+                yield idx, file_path, info
+                continue
+
+            # Only start the pool once something actually needs probing
+            if executor is None:
+                if use_async:
+                    from .asyncprobe import AsyncProbeExecutor, probe_video_async, timed_probe_video_async
+                    executor = AsyncProbeExecutor(workers)
+                    task = probe_video_async if timer is None else timed_probe_video_async
+                elif use_processes:
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_probe_worker, initargs=(ffprobe_path, native_parser_enabled))
+                else:
+                    executor = ThreadPoolExecutor(max_workers=workers)
+            pending[executor.submit(task, file_path, backend, sample_bitrate)] = (idx, file_path, signature)
+            if len(pending) >= max_in_flight:
+                yield from finished(FIRST_COMPLETED)
+
+        while pending:
+            yield from finished(FIRST_COMPLETED)
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        # Keep probes that finished after the consumer stopped, so a cancelled scan doesn't redo them
+        if cache is not None:
+            for future, (idx, file_path, signature) in pending.items():
+                if not future.cancelled() and future.exception() is None:
+                    info = probe_info(file_path, future.result())
+                    if info is not None:
+                        cache.store(file_path, signature, info)
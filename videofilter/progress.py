@@ -0,0 +1,126 @@
+import json
+import sys
+import time
+from collections import deque
+
+# Seconds between two progress updates: 10 per second is smooth in the GUI and costs nothing
+DEFAULT_PROGRESS_INTERVAL = 0.1
+
+# Throughput is measured over this many recent seconds, so the ETA follows changes in speed
+# (e.g. cached files first, then files that need probing)
+RATE_WINDOW = 5.0
+
+# Collects per-file progress from the scan loop and passes it on at a fixed rate.
+#
+# The scan calls file_done() and update() for every file; emit(progress) only runs when interval
+# seconds have passed since the last emit, and once more from finish(). progress is a dict with:
+#   done, total: files processed so far and the total (an estimate while estimated is True)
+#   matches: matching files so far
+#   bytes: size of the files processed so far
+#   elapsed: seconds since the start
+#   files_per_sec, mb_per_sec: recent throughput
+#   eta: estimated seconds left, or None when unknown
+class ProgressReporter:
+    # emit may be None to only count (nothing is reported)
+    def __init__(self, emit, interval=DEFAULT_PROGRESS_INTERVAL, clock=time.monotonic):
+        self.emit = emit
+        self.interval = interval
+        self.clock = clock
+        self.started = clock()
+        self.next_emit = self.started
+        self.done = 0
+        self.total = 0
+        self.estimated = True
+        self.matches = 0
+        self.bytes = 0
+        # (time, done, bytes) of recent updates, for the throughput
+        self.samples = deque([(self.started, 0, 0)])
+
+    # Record one processed file; size is its size in bytes when known
+    def file_done(self, size=0, matched=False):
+        self.done += 1
+        self.bytes += size
+        if matched:
+            self.matches += 1
+
+    # Count files that needed no work (e.g. answered from an index) without counting them in the throughput
+    def skip(self, count):
+        self.done += count
+        self.samples = deque([(self.clock(), self.done, self.bytes)])
+
+    def set_total(self, total, estimated=False):
+        self.total = total
+        self.estimated = estimated
+
+    # Emit the current state if the interval has passed (or always with force=True)
+    def update(self, force=False):
+        if self.emit is None:
+            return
+        now = self.clock()
+        if not force and now < self.next_emit:
+            return
+        self.next_emit = now + self.interval
+        self.emit(self.snapshot(now))
+
+    def finish(self):
+        self.estimated = False
+        self.total = max(self.total, self.done)
+        self.update(force=True)
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = self.clock()
+        samples = self.samples
+        while len(samples) > 1 and now - samples[1][0] >= RATE_WINDOW:
+            samples.popleft()
+        samples.append((now, self.done, self.bytes))
+        start_time, start_done, start_bytes = samples[0]
+        span = now - start_time
+        files_per_sec = (self.done - start_done) / span if span > 0 else 0.0
+        mb_per_sec = (self.bytes - start_bytes) / 1_048_576 / span if span > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        if not remaining:
+            eta = 0.0 if not self.estimated else None
+        else:
+            eta = remaining / files_per_sec if files_per_sec > 0 else None
+        return {
+            'done': self.done,
+            'total': max(self.total, self.done),
+            'estimated': self.estimated,
+            'matches': self.matches,
+            'bytes': self.bytes,
+            'elapsed': now - self.started,
+            'files_per_sec': files_per_sec,
+            'mb_per_sec': mb_per_sec,
+            'eta': eta,
+        }
+
+# Function to format seconds as H:MM:SS or M:SS
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+# Function to describe a progress dict in one line, as shown in the GUI and in --progress log
+def format_progress(progress, action="Processing"):
+    total = f"~{progress['total']}" if progress['estimated'] else str(progress['total'])
+    eta = format_duration(progress['eta']) if progress['eta'] is not None else '?'
+    return (f"{action} {progress['done']}/{total} files... ({progress['matches']} matches, "
+            f"{progress['files_per_sec']:.1f} files/s, {progress['mb_per_sec']:.1f} MB/s, ETA {eta})")
+
+# Function to build an emit callback for command line runs: 'log' prints format_progress lines and
+# 'json' one JSON object per update, both to stream (stderr by default)
+def progress_printer(mode, stream=None):
+    stream = stream or sys.stderr
+
+    def emit(progress):
+        if mode == 'json':
+            stream.write(json.dumps(dict(progress, event='progress')) + "\n")
+        else:
+            stream.write(format_progress(progress) + "\n")
+        stream.flush()
+
+    return emit
@@ -0,0 +1,151 @@
+import sys
+from collections.abc import Mapping
+
+# Fields of a probe result, in the order of get_video_info's original dict, then the figures
+# measured by bitrate sampling (0 when the file was not sampled), then the container, its first
+# audio stream ('none' without audio) and the number of streams of each kind
+INFO_FIELDS = ('codec', 'width', 'height', 'duration', 'bitrate', 'bitrate_mode', 'size',
+               'framerate', 'display_aspect_ratio', 'color_space', 'bit_depth',
+               'peak_bitrate', 'bitrate_stddev',
+               'container', 'container_duration', 'container_bitrate',
+               'audio_codec', 'audio_channels', 'audio_sample_rate',
+               'video_streams', 'audio_streams', 'subtitle_streams')
+_INFO_FIELD_SET = frozenset(INFO_FIELDS)
+
+# Bitrate modes, stored as their index
+BITRATE_MODES = ('Unknown', 'Constant', 'Variable')
+BITRATE_MODE_CODES = {mode: code for code, mode in enumerate(BITRATE_MODES)}
+
+# Metadata of one video file (what get_video_info returns).
+#
+# A slotted record instead of a dict: a fraction of the memory per file, with codec, container,
+# color space and aspect ratio strings interned (a library has only a few distinct values) and the
+# bitrate mode kept as a small integer. It still reads like the dict it replaces: info['codec'],
+# info.get(...), keys(), items(), dict(info) and == against a dict all work.
+class VideoInfo(Mapping):
+    __slots__ = ('codec', 'width', 'height', 'duration', 'bitrate', 'bitrate_mode_code', 'size',
+                 'framerate', 'display_aspect_ratio', 'color_space', 'bit_depth',
+                 'peak_bitrate', 'bitrate_stddev',
+                 'container', 'container_duration', 'container_bitrate',
+                 'audio_codec', 'audio_channels', 'audio_sample_rate',
+                 'video_streams', 'audio_streams', 'subtitle_streams')
+
+    def __init__(self, codec, width, height, duration, bitrate, bitrate_mode, size, framerate,
+                 display_aspect_ratio, color_space, bit_depth, peak_bitrate=0, bitrate_stddev=0,
+                 container='Unknown', container_duration=0.0, container_bitrate=0,
+                 audio_codec='Unknown', audio_channels=0, audio_sample_rate=0,
+                 video_streams=0, audio_streams=0, subtitle_streams=0):
+        self.codec = sys.intern(codec)
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.bitrate = bitrate
+        self.bitrate_mode_code = BITRATE_MODE_CODES[bitrate_mode]
+        self.size = size
+        self.framerate = framerate
+        self.display_aspect_ratio = sys.intern(display_aspect_ratio)
+        self.color_space = sys.intern(color_space)
+        self.bit_depth = bit_depth
+        self.peak_bitrate = peak_bitrate
+        self.bitrate_stddev = bitrate_stddev
+        self.container = sys.intern(container)
+        self.container_duration = container_duration
+        self.container_bitrate = container_bitrate
+        self.audio_codec = sys.intern(audio_codec)
+        self.audio_channels = audio_channels
+        self.audio_sample_rate = audio_sample_rate
+        self.video_streams = video_streams
+        self.audio_streams = audio_streams
+        self.subtitle_streams = subtitle_streams
+
+    @property
+    def bitrate_mode(self):
+        return BITRATE_MODES[self.bitrate_mode_code]
+
+    # Whether the bitrate figures were measured by bitrate sampling (see bitrate.py)
+    @property
+    def bitrate_sampled(self):
+        return self.peak_bitrate > 0
+
+    # Take over the figures of bitrate.bitrate_stats; a bitrate reported for the video stream is kept
+    # as the average (keep_bitrate), since it covers the whole stream rather than the sampled windows
+    def apply_bitrate_stats(self, stats, keep_bitrate=True):
+        if not (keep_bitrate and self.bitrate):
+            self.bitrate = stats['bitrate']
+        self.bitrate_mode_code = BITRATE_MODE_CODES[stats['bitrate_mode']]
+        self.peak_bitrate = stats['peak_bitrate']
+        self.bitrate_stddev = stats['bitrate_stddev']
+
+    @classmethod
+    def from_dict(cls, info):
+        return cls(**info)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in INFO_FIELDS}
+
+    def __getitem__(self, key):
+        if key not in _INFO_FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(INFO_FIELDS)
+
+    def __len__(self):
+        return len(INFO_FIELDS)
+
+    def __reduce__(self):
+        return (VideoInfo, tuple(getattr(self, name) for name in INFO_FIELDS))
+
+    def __repr__(self):
+        return f"VideoInfo({self.to_dict()!r})"
+
+# One matching file: result['path'] and result['info'] as with the {'path', 'info'} dicts used before.
+# Results of a duplicate search also carry result['duplicate_group'], the number of their group.
+class VideoResult(Mapping):
+    __slots__ = ('path', 'info', 'duplicate_group')
+
+    def __init__(self, path, info, duplicate_group=None):
+        self.path = path
+        self.info = info
+        self.duplicate_group = duplicate_group
+
+    def keys(self):
+        return ('path', 'info') if self.duplicate_group is None else ('path', 'info', 'duplicate_group')
+
+    def to_dict(self):
+        result = {'path': self.path, 'info': as_dict(self.info)}
+        if self.duplicate_group is not None:
+            result['duplicate_group'] = self.duplicate_group
+        return result
+
+    def __getitem__(self, key):
+        if key == 'path':
+            return self.path
+        if key == 'info':
+            return self.info
+        if key == 'duplicate_group' and self.duplicate_group is not None:
+            return self.duplicate_group
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __reduce__(self):
+        return (VideoResult, (self.path, self.info, self.duplicate_group))
+
+    def __repr__(self):
+        if self.duplicate_group is not None:
+            return f"VideoResult({self.path!r}, {self.info!r}, {self.duplicate_group!r})"
+        return f"VideoResult({self.path!r}, {self.info!r})"
+
+# Function to turn a record (or a dict holding records) into plain dicts, e.g. for JSON
+def as_dict(value):
+    if isinstance(value, (VideoInfo, VideoResult)):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: as_dict(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,436 @@
+import os
+import time
+
+from .expr import format_expression, make_and, parse_date, parse_expression
+from .planner import ScanPlan
+from .probe import DEFAULT_PROBE_WORKERS, probe_videos
+from .progress import DEFAULT_PROGRESS_INTERVAL, ProgressReporter
+from .records import VideoResult
+from .walker import DEFAULT_WALK_WORKERS, DirectoryWalker, ManifestWalker, entry_signature
+
+# Extensions picked up by a scan
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv')
+
+# Criteria that can be switched on in the "Filter by" section
+FILTER_OPTIONS = (
+    'codec', 'resolution', 'duration', 'size', 'bitrate', 'bitrate_mode',
+    'framerate', 'dar', 'color_space', 'bit_depth', 'extension', 'mtime', 'path'
+)
+
+# Function to split a pattern field ('a;b' string or list) into a list
+def split_patterns(value):
+    if isinstance(value, (list, tuple)):
+        return [str(pattern).strip() for pattern in value if str(pattern).strip()]
+    return [pattern.strip() for pattern in value.split(';') if pattern.strip()]
+
+# Function to turn the raw filter form (strings as typed in the GUI) into criteria; raises ValueError
+def parse_criteria(form):
+    options = {name: bool(form.get('options', {}).get(name)) for name in FILTER_OPTIONS}
+    codec = form.get('codec', '')
+    min_resolution = form.get('min_resolution', '')
+    max_resolution = form.get('max_resolution', '')
+    min_duration = form.get('min_duration', '')
+    max_duration = form.get('max_duration', '')
+    min_size = form.get('min_size', '')
+    max_size = form.get('max_size', '')
+    min_bitrate = form.get('min_bitrate', '')
+    max_bitrate = form.get('max_bitrate', '')
+    bitrate_mode = form.get('bitrate_mode', 'Any')
+    min_framerate = form.get('min_framerate', '')
+    max_framerate = form.get('max_framerate', '')
+    dar = form.get('dar', '')
+    color_space = form.get('color_space', 'Any')
+    min_bit_depth = form.get('min_bit_depth', '')
+    max_bit_depth = form.get('max_bit_depth', '')
+    extensions = form.get('extensions', '')
+    modified_after = form.get('modified_after', '')
+    modified_before = form.get('modified_before', '')
+    include = form.get('include', '')
+    exclude = form.get('exclude', '')
+    expression = form.get('expression', '')
+
+    if options['codec'] and not codec:
+        raise ValueError("Please specify a codec.")
+
+    if options['resolution'] and not (min_resolution or max_resolution):
+        raise ValueError("Please specify minimum and/or maximum resolution.")
+
+    if options['duration']:
+        try:
+            min_duration = float(min_duration) if min_duration else 0
+            max_duration = float(max_duration) if max_duration else float('inf')
+        except ValueError:
+            raise ValueError("Invalid duration values.")
+    else:
+        min_duration = 0
+        max_duration = float('inf')
+
+    if options['size']:
+        try:
+            min_size = float(min_size) * 1_048_576 if min_size else 0  # Convert MB to bytes
+            max_size = float(max_size) * 1_048_576 if max_size else float('inf')
+        except ValueError:
+            raise ValueError("Invalid file size values.")
+    else:
+        min_size = 0
+        max_size = float('inf')
+
+    if options['bitrate']:
+        try:
+            min_bitrate = float(min_bitrate) * 1000 if min_bitrate else 0  # Convert kbps to bps
+            max_bitrate = float(max_bitrate) * 1000 if max_bitrate else float('inf')
+        except ValueError:
+            raise ValueError("Invalid bitrate values.")
+    else:
+        min_bitrate = 0
+        max_bitrate = float('inf')
+
+    # Framerate inputs
+    if options['framerate']:
+        try:
+            min_framerate = float(min_framerate) if min_framerate else 0
+            max_framerate = float(max_framerate) if max_framerate else float('inf')
+        except ValueError:
+            raise ValueError("Invalid framerate values.")
+    else:
+        min_framerate = 0
+        max_framerate = float('inf')
+
+    # Bit Depth inputs
+    if options['bit_depth']:
+        try:
+            min_bit_depth = int(min_bit_depth) if min_bit_depth else 0
+            max_bit_depth = int(max_bit_depth) if max_bit_depth else float('inf')
+        except ValueError:
+            raise ValueError("Invalid bit depth values.")
+    else:
+        min_bit_depth = 0
+        max_bit_depth = float('inf')
+
+    # Resolution inputs
+    if options['resolution']:
+        # Min resolution
+        if min_resolution:
+            try:
+                min_width, min_height = map(int, min_resolution.lower().split('x'))
+            except ValueError:
+                raise ValueError("Invalid minimum resolution format. Use 'WIDTHxHEIGHT'.")
+        else:
+            min_width, min_height = 0, 0
+        # Max resolution
+        if max_resolution:
+            try:
+                max_width, max_height = map(int, max_resolution.lower().split('x'))
+            except ValueError:
+                raise ValueError("Invalid maximum resolution format. Use 'WIDTHxHEIGHT'.")
+        else:
+            max_width, max_height = float('inf'), float('inf')
+    else:
+        min_width, min_height = 0, 0
+        max_width, max_height = float('inf'), float('inf')
+
+    # Display Aspect Ratio
+    if options['dar']:
+        if dar:
+            dar = dar.strip()
+        else:
+            raise ValueError("Please specify a Display Aspect Ratio.")
+    else:
+        dar = None
+
+    # Color Space
+    if options['color_space']:
+        if color_space == "Any":
+            color_space = None
+    else:
+        color_space = None
+
+    # File extensions
+    if options['extension']:
+        if isinstance(extensions, str):
+            extensions = extensions.replace(',', ';')
+        extensions = tuple('.' + extension.lower().lstrip('.') for extension in split_patterns(extensions))
+        if not extensions:
+            raise ValueError("Please specify at least one file extension.")
+    else:
+        extensions = None
+
+    # Modification date
+    if options['mtime']:
+        if not (modified_after or modified_before):
+            raise ValueError("Please specify a modification date range.")
+        min_mtime = parse_date(modified_after) if modified_after else float('-inf')
+        max_mtime = parse_date(modified_before) if modified_before else float('inf')
+    else:
+        min_mtime = float('-inf')
+        max_mtime = float('inf')
+
+    # Path patterns
+    if options['path']:
+        include = [os.path.normcase(pattern) for pattern in split_patterns(include)]
+        exclude = [os.path.normcase(pattern) for pattern in split_patterns(exclude)]
+        if not (include or exclude):
+            raise ValueError("Please specify an include or exclude path pattern.")
+    else:
+        include = []
+        exclude = []
+
+    criteria = {
+        'options': options,
+        'codec': codec,
+        'min_width': min_width, 'max_width': max_width,
+        'min_height': min_height, 'max_height': max_height,
+        'min_duration': min_duration, 'max_duration': max_duration,
+        'min_size': min_size, 'max_size': max_size,
+        'min_bitrate': min_bitrate, 'max_bitrate': max_bitrate,
+        'bitrate_mode': bitrate_mode,
+        'min_framerate': min_framerate, 'max_framerate': max_framerate,
+        'dar': dar,
+        'color_space': color_space,
+        'min_bit_depth': min_bit_depth, 'max_bit_depth': max_bit_depth,
+        'extensions': extensions,
+        'min_mtime': min_mtime, 'max_mtime': max_mtime,
+        'include': include, 'exclude': exclude
+    }
+
+    # The form compiles to a filter expression, ANDed with any expression typed in directly
+    criteria['expression'] = make_and([criteria_expression(criteria), parse_expression(expression)])
+    criteria['expression_text'] = format_expression(criteria['expression'])
+    return criteria
+
+# Function to express the criteria of the form as a filter expression tree (see expr.py)
+def criteria_expression(criteria):
+    options = criteria['options']
+    nodes = []
+
+    def add_range(field, low, high):
+        if low not in (0, float('-inf')):
+            nodes.append(('cmp', field, '>=', low))
+        if high != float('inf'):
+            nodes.append(('cmp', field, '<=', high))
+
+    if options['extension']:
+        nodes.append(('cmp', 'extension', 'in', tuple(criteria['extensions'])))
+    if options['path']:
+        if criteria['include']:
+            nodes.append(('cmp', 'path', 'like', tuple(criteria['include'])))
+        if criteria['exclude']:
+            nodes.append(('not', ('cmp', 'path', 'like', tuple(criteria['exclude']))))
+    if options['size']:
+        add_range('size', criteria['min_size'], criteria['max_size'])
+    if options['mtime']:
+        if criteria['min_mtime'] != float('-inf'):
+            nodes.append(('cmp', 'mtime', '>=', criteria['min_mtime']))
+        if criteria['max_mtime'] != float('inf'):
+            nodes.append(('cmp', 'mtime', '<', criteria['max_mtime']))
+    if options['codec'] and criteria['codec']:
+        nodes.append(('cmp', 'codec', '==', criteria['codec']))
+    if options['resolution']:
+        add_range('width', criteria['min_width'], criteria['max_width'])
+        add_range('height', criteria['min_height'], criteria['max_height'])
+    if options['duration']:
+        add_range('duration', criteria['min_duration'], criteria['max_duration'])
+    if options['bitrate']:
+        add_range('bitrate', criteria['min_bitrate'], criteria['max_bitrate'])
+    if options['bitrate_mode'] and criteria['bitrate_mode'] != "Any":
+        nodes.append(('cmp', 'bitrate_mode', '==', criteria['bitrate_mode'].lower()))
+    if options['framerate']:
+        add_range('framerate', criteria['min_framerate'], criteria['max_framerate'])
+    if options['dar'] and criteria['dar']:
+        nodes.append(('cmp', 'dar', '==', criteria['dar']))
+    if options['color_space'] and criteria['color_space']:
+        nodes.append(('cmp', 'color_space', '==', criteria['color_space'].lower()))
+    if options['bit_depth']:
+        add_range('bit_depth', criteria['min_bit_depth'], criteria['max_bit_depth'])
+    return make_and(nodes)
+
+# Function to walk, probe and filter a folder; shared by the GUI scan thread and the command line.
+# Files are probed while the walk is still running. on_progress receives a progress dict (see
+# ProgressReporter) at most once per progress_interval seconds, and on_total the final file count
+# once the walk has finished.
+# An incremental scan keeps directory listings in the cache and only lists directories whose
+# mtime changed; unchanged files are served from the cache, so only new or modified ones are probed.
+# When a MetadataIndex is passed, every walked file is recorded in it so later filters can be
+# answered with refilter_index instead of another scan. backend selects the ProbeBackend (ffprobe by default).
+# With a ScanTimings as timer, the walk, probes, cache lookups and matching are timed (see timing.py).
+# Files are bitrate-sampled when a criterion reads the bitrate (see ScanPlan.sample_filter), unless
+# sample_bitrate is False.
+# A scan can be split into shards that run independently (see shards.py): with shard=(index, count)
+# only that shard's files are scanned. files replaces the walk with a list of files (e.g. a manifest;
+# folder, if given, is then only the root their shards are computed from). on_probe is called as
+# on_probe(file_path, signature, key, info, matched) for every file that passed the path/stat criteria,
+# with info None when the probe failed or no criterion needed one.
+# Probes run in a thread pool, a process pool (use_processes) or as asyncio tasks (use_async);
+# on_failure(file_path, reason) is called for every file that could not be probed.
+# With a ScanJournal as journal (see checkpoint.py) the scan is checkpointed as it goes, and a
+# journal resumed from an interrupted scan supplies its directory listings and finished files.
+# Returns (results, cancelled, total_files) with results in os.walk order. With keep_results=False
+# matches only go to on_match (e.g. a ResultSink, see export.py) and results is empty, so memory
+# does not grow with the number of matches.
+def run_scan(folder, criteria, workers=DEFAULT_PROBE_WORKERS, use_processes=False, cache=None,
+             on_total=None, on_match=None, on_progress=None, cancel_event=None, resume_event=None,
+             max_depth=None, symlinks='files', walk_workers=DEFAULT_WALK_WORKERS, incremental=False,
+             index=None, backend=None, progress_interval=DEFAULT_PROGRESS_INTERVAL, timer=None,
+             keep_results=True, sample_bitrate=True, shard=None, files=None, on_probe=None,
+             on_failure=None, use_async=False, journal=None):
+    if incremental and cache is None:
+        raise ValueError("An incremental scan needs the metadata cache.")
+    snapshot = cache if incremental else None
+    if journal is not None:
+        # The journal answers before the cache and the snapshot, and passes the rest on to them
+        journal.attach(cache, snapshot)
+        cache = snapshot = journal
+    if files is not None:
+        walker = ManifestWalker(files, root=folder, shard=shard, cancel_event=cancel_event, resume_event=resume_event)
+    else:
+        # The index must hold excluded folders too, so they are only pruned from the walk without one
+        walker = DirectoryWalker(folder, extensions=VIDEO_EXTENSIONS, exclude=criteria['exclude'] if index is None else None,
+                                 max_depth=max_depth, symlinks=symlinks, workers=walk_workers,
+                                 cancel_event=cancel_event, resume_event=resume_event,
+                                 snapshot=snapshot, timer=timer, shard=shard)
+    plan = ScanPlan(criteria)
+    sample_filter = plan.sample_filter if sample_bitrate and plan.samples_bitrate else None
+    seen_paths = set()
+    keys = []
+    rows = []
+    # (key, signature) of candidates by index, until on_probe and the journal have seen them
+    probe_records = {}
+    candidate_count = 0
+    reporter = ProgressReporter(on_progress, progress_interval)
+
+    def report_progress():
+        reporter.set_total(walker.estimated_total(), estimated=not walker.finished)
+        reporter.update()
+
+    # Drop files on path and stat criteria as they are found; only the survivors are probed
+    def candidates():
+        nonlocal candidate_count
+        for key, entry in walker:
+            seen_paths.add(entry.path)
+            st = None
+            if index is not None or plan.stat_checks:
+                # A file deleted since its directory was listed is skipped
+                try:
+                    st = entry.stat()
+                except OSError:
+                    reporter.file_done()
+                    continue
+            if index is not None:
+                row = index.add(entry.path, st.st_size, st.st_mtime, key)
+            if plan.prefilter(entry.path, st):
+                if keep_results:
+                    keys.append(key)
+                if index is not None:
+                    rows.append(row)
+                signature = entry_signature(entry) if cache is not None or on_probe is not None else None
+                if on_probe is not None or journal is not None:
+                    probe_records[candidate_count] = (key, signature)
+                candidate_count += 1
+                yield (entry.path, signature) if cache is not None else entry.path
+            else:
+                reporter.file_done()
+                report_progress()
+        if on_total is not None and walker.finished:
+            on_total(walker.files_found)
+
+    # Results arrive in completion order, so keep matches keyed by candidate index
+    matched = {}
+    cancelled = False
+    if plan.needs_probe:
+        probes = probe_videos(candidates(), workers, use_processes, cache, backend, timer, sample_filter,
+                              on_failure, use_async)
+    else:
+        probes = plan.stat_results(candidates(), cache)
+    try:
+        for idx, file_path, info in probes:
+            if index is not None and plan.needs_probe:
+                index.set_info(rows[idx], info, plan.sampled(file_path, info) if sample_filter is not None else False)
+            match_started = time.perf_counter()
+            is_match = bool(info) and (not plan.needs_probe or plan.matches(file_path, info))
+            if timer is not None:
+                timer.add('match', time.perf_counter() - match_started)
+            if is_match:
+                result = VideoResult(file_path, info)
+                if keep_results:
+                    matched[idx] = result
+                if on_match is not None:
+                    on_match(result)
+            if on_probe is not None or journal is not None:
+                key, signature = probe_records.pop(idx)
+                if on_probe is not None:
+                    on_probe(file_path, signature, key, info if plan.needs_probe else None, is_match)
+                if journal is not None:
+                    journal.record(file_path, signature, info if plan.needs_probe else None, is_match)
+            reporter.file_done(info['size'] if info else 0, is_match)
+            report_progress()
+
+            if resume_event is not None:
+                resume_event.wait()
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+    finally:
+        probes.close()
+    cancelled = cancelled or not walker.finished
+    if on_total is not None and not walker.finished:
+        on_total(walker.files_found)
+    reporter.set_total(walker.files_found)
+    reporter.finish()
+    if timer is not None:
+        timer.count('files', walker.files_found)
+        timer.count('matches', reporter.matches)
+        timer.count('walk_errors', walker.errors)
+    if index is not None:
+        index.finish(complete=not cancelled)
+
+    # Forget cached files that disappeared from this folder (a shard or file list only sees part of it,
+    # and a restricted walk only the folders it listed)
+    if cache is not None and not cancelled and shard is None and files is None:
+        restricted = max_depth is not None or symlinks == 'skip' or bool(walker.exclude)
+        cache.prune(folder, seen_paths, walker.seen_dirs if incremental else None,
+                    walker.seen_dirs if restricted else None)
+
+    # Restore walk order so the result list is identical to a serial scan
+    matched_keys = sorted(matched, key=keys.__getitem__)
+    return [matched[idx] for idx in matched_keys], cancelled, walker.files_found
+
+# Function to filter the files recorded in a MetadataIndex by an earlier run_scan, without walking.
+# Only files that pass the path/stat criteria but were never probed get probed now; everything
+# else is answered from memory. Takes the same callbacks as run_scan, except that matches are
+# returned all at once instead of through on_match.
+def refilter_index(index, criteria, workers=DEFAULT_PROBE_WORKERS, use_processes=False, cache=None,
+                   on_total=None, on_progress=None, cancel_event=None, resume_event=None, backend=None,
+                   progress_interval=DEFAULT_PROGRESS_INTERVAL, timer=None, sample_bitrate=True,
+                   on_failure=None, use_async=False):
+    total_files = len(index)
+    if on_total is not None:
+        on_total(total_files)
+    plan = ScanPlan(criteria)
+    sample_filter = plan.sample_filter if sample_bitrate and plan.samples_bitrate else None
+    rows, pending = index.query(criteria, sample_bitrate)
+    reporter = ProgressReporter(on_progress, progress_interval)
+    reporter.set_total(total_files)
+    reporter.skip(total_files - len(pending))
+
+    cancelled = False
+    if pending:
+        probes = probe_videos([index.paths[row] for row in pending], workers, use_processes, cache, backend, timer,
+                              sample_filter, on_failure, use_async)
+        try:
+            for idx, file_path, info in probes:
+                index.set_info(pending[idx], info, plan.sampled(file_path, info) if sample_filter is not None else False)
+                reporter.file_done(info['size'] if info else 0)
+                reporter.update()
+
+                if resume_event is not None:
+                    resume_event.wait()
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+        finally:
+            probes.close()
+        rows, _ = index.query(criteria, sample_bitrate)
+
+    reporter.matches = len(rows)
+    reporter.finish()
+    return [index.result(row) for row in rows], cancelled, total_files
@@ -0,0 +1,201 @@
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import probe
+from .cache import CACHE_SCHEMA_VERSION, MetadataCache
+from .export import ResultSink
+from .planner import stat_only_info
+from .probe import init_probe_worker
+from .records import INFO_FIELDS, VideoInfo, VideoResult, as_dict
+from .scan import run_scan
+
+# Sharded scans: a folder (or a manifest of files) is split into shards by a hash of each file's
+# path relative to the root (see walker.shard_of), so shards can run as separate processes or on
+# other hosts against the same share. Each shard writes a shard file, and merge_shards combines
+# shard files into one result set and cache.
+#
+# A shard file is NDJSON: a header describing the scan, one record per file that passed the
+# path/stat criteria, and a footer once the shard is done:
+#
+#   {"format": "videofilter-shard", "version": 1, "shard": [2, 4], "root": ..., "criteria": ..., ...}
+#   {"path": ..., "relative_path": ..., "key": [...], "signature": [size, mtime_ns, inode], "info": {...}, "match": true}
+#   {"end": true, "files": ..., "records": ..., "matches": ..., "cancelled": false, "finished": ...}
+
+SHARD_FORMAT = 'videofilter-shard'
+SHARD_VERSION = 1
+
+# Writes the shard file of one shard; write() takes (path, signature, key, info, matched) as passed
+# to run_scan's on_probe. close() adds the footer, so a shard without one did not finish.
+class ShardWriter(ResultSink):
+    def __init__(self, target, shard, root, criteria, manifest=None):
+        self.header = {
+            'format': SHARD_FORMAT,
+            'version': SHARD_VERSION,
+            'shard': [shard[0] + 1, shard[1]] if shard else [1, 1],
+            'root': os.path.abspath(root) if root else None,
+            'manifest': manifest,
+            'criteria': criteria['expression_text'],
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'started': time.time(),
+            'cache_schema': CACHE_SCHEMA_VERSION,
+            'info_fields': list(INFO_FIELDS),
+        }
+        self.matches = 0
+        self.files = 0
+        self.cancelled = False
+        super().__init__(target)
+
+    def start(self):
+        self.file.write(json.dumps(self.header) + "\n")
+
+    def write_result(self, record):
+        file_path, signature, key, info, matched = record
+        root = self.header['root']
+        self.file.write(json.dumps({
+            'path': file_path,
+            'relative_path': os.path.relpath(file_path, root) if root else None,
+            'key': list(key),
+            'signature': list(signature) if signature else None,
+            'info': as_dict(info) if info is not None else None,
+            'match': matched,
+        }) + "\n")
+        self.matches += matched
+
+    def close(self):
+        self.file.write(json.dumps({
+            'end': True,
+            'files': self.files,
+            'records': self.count,
+            'matches': self.matches,
+            'cancelled': self.cancelled,
+            'finished': time.time(),
+        }) + "\n")
+        super().close()
+
+# Function to scan one shard into a shard file, with the metadata cache at cache_path if given;
+# other run_scan options are passed through. Returns (files, matches, cancelled).
+# Runs in the worker processes of run_local_shards.
+def run_shard(folder, criteria, shard, shard_path, cache_path=None, files=None, manifest=None, options=None):
+    cache = MetadataCache(cache_path) if cache_path else None
+    try:
+        with ShardWriter(shard_path, shard, folder, criteria, manifest) as writer:
+            _, cancelled, total_files = run_scan(
+                folder, criteria, cache=cache, shard=shard, files=files, keep_results=False,
+                on_probe=lambda *record: writer.write(record), **(options or {}))
+            writer.files = total_files
+            writer.cancelled = cancelled
+    finally:
+        if cache is not None:
+            cache.close()
+    return total_files, writer.matches, cancelled
+
+# Function to run every shard of a scan in its own process on this machine, writing the shard files
+# to shard_dir, and merge them; the same as running each shard on another host. Shards share the
+# metadata cache at cache_path (SQLite serializes their writes). Returns what merge_shards returns.
+def run_local_shards(folder, criteria, count, shard_dir, cache_path=None, files=None, manifest=None, options=None):
+    shard_paths = [os.path.join(shard_dir, f"shard-{number + 1}-of-{count}.ndjson") for number in range(count)]
+    with ProcessPoolExecutor(max_workers=count, initializer=init_probe_worker,
+                             initargs=(probe.ffprobe_path, probe.native_parser_enabled)) as executor:
+        futures = [executor.submit(run_shard, folder, criteria, (number, count), shard_path, cache_path,
+                                   files, manifest, options)
+                   for number, shard_path in enumerate(shard_paths)]
+        for future in futures:
+            future.result()
+    cache = MetadataCache(cache_path) if cache_path else None
+    try:
+        return merge_shards(shard_paths, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+# Function to read a shard file; returns (header, records, footer or None). Raises ValueError
+# for files that are not shard files of this version.
+def read_shard(shard_path):
+    with open(shard_path, encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != SHARD_FORMAT:
+            raise ValueError(f"{shard_path} is not a shard file.")
+        if header.get('version') != SHARD_VERSION:
+            raise ValueError(f"{shard_path} was written by an incompatible version (shard format {header.get('version')}).")
+        if header.get('info_fields') != list(INFO_FIELDS):
+            raise ValueError(f"{shard_path} holds metadata fields of another version; scan it again.")
+        records = []
+        footer = None
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A shard that was killed while writing ends with a partial line
+                break
+            if record.get('end'):
+                footer = record
+                break
+            records.append(record)
+    return header, records, footer
+
+# Function to combine shard files into one result set. Shards must come from the same criteria
+# (and from expression_text, the text of the criteria expected, when given).
+# A file found in several shards (overlapping or repeated shards) is kept once, from the newest
+# record: the one with the latest mtime, then a successful probe over a failed one.
+# With root, files are mapped onto it through their path relative to their shard's root, for shards
+# scanned on hosts that mount the library elsewhere. Probe results are stored in cache when given.
+# Returns (results, total_files, warnings) with results in walk order.
+def merge_shards(shard_paths, root=None, cache=None, expression_text=None):
+    warnings = []
+    criteria = expression_text
+    counts = set()
+    # Files listed by each shard number, so a repeated shard is counted once
+    shard_files = {}
+    merged = {}
+    for order, shard_path in enumerate(shard_paths):
+        header, records, footer = read_shard(shard_path)
+        if criteria is None:
+            criteria = header['criteria']
+        elif header['criteria'] != criteria:
+            raise ValueError(f"{shard_path} was scanned with the criteria {header['criteria']}, not {criteria}.")
+        number, count = header['shard']
+        counts.add(count)
+        if footer is None:
+            warnings.append(f"{shard_path} (shard {number}/{count} on {header['host']}) did not finish; merging the {len(records)} files it recorded.")
+        elif footer['cancelled']:
+            warnings.append(f"{shard_path} (shard {number}/{count} on {header['host']}) was cancelled.")
+        files = footer['files'] if footer is not None else len(records)
+        shard_files[number] = max(shard_files.get(number, 0), files)
+
+        for record in records:
+            file_path = record['path']
+            if root and record['relative_path'] is not None:
+                file_path = os.path.join(root, record['relative_path'])
+            signature = tuple(record['signature']) if record['signature'] else None
+            rank = (signature[1] if signature else -1, record['info'] is not None)
+            current = merged.get(file_path)
+            if current is not None and current[0] >= rank:
+                continue
+            merged[file_path] = (rank, (header['root'] or '', tuple(record['key']), order), signature, record)
+
+    if len(counts) > 1:
+        raise ValueError(f"The shards come from scans split into different numbers of shards ({', '.join(map(str, sorted(counts)))}).")
+    if counts:
+        missing = sorted(set(range(1, counts.pop() + 1)) - set(shard_files))
+        if missing:
+            warnings.append(f"Missing shards: {', '.join(map(str, missing))}; their files are not in the results.")
+
+    results = []
+    for file_path, (_, sort_key, signature, record) in sorted(merged.items(), key=lambda item: item[1][1]):
+        info = VideoInfo.from_dict(record['info']) if record['info'] is not None else None
+        if cache is not None and info is not None and signature is not None:
+            cache.store(file_path, signature, info)
+        if record['match']:
+            if info is None:
+                info = stat_only_info(signature[0] if signature else 0)
+            results.append(VideoResult(file_path, info))
+    if cache is not None:
+        cache.flush()
+    return results, sum(shard_files.values()), warnings
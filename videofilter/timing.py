@@ -0,0 +1,156 @@
+import heapq
+import json
+import math
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+# Number of slowest files listed in a report
+SLOWEST_FILES = 20
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+HISTOGRAM_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases recorded by the thread running a probe (see record_phases); None when nobody is listening
+_local = threading.local()
+
+# Context manager timing one phase of the current probe: native (header parsing), spawn, wait and
+# parse (ffprobe process start, output and JSON), info (building the info dict). Costs nothing
+# unless the probe runs under record_phases.
+@contextmanager
+def phase(name):
+    phases = getattr(_local, 'phases', None)
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, time.perf_counter() - start))
+
+# Function to call function(*args) while recording its phases.
+# Returns (result, elapsed seconds, [(phase, seconds), ...]); runs in probe worker threads and processes.
+def record_phases(function, *args):
+    _local.phases = phases = []
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    finally:
+        _local.phases = None
+    return result, time.perf_counter() - start, phases
+
+# Function to summarize a list of durations: count, total, mean, max, percentiles and histogram
+def summarize(samples):
+    ordered = sorted(samples)
+    count = len(ordered)
+    if not count:
+        return {'count': 0}
+
+    def percentile(fraction):
+        # Nearest rank
+        return ordered[max(0, math.ceil(fraction * count) - 1)]
+
+    histogram = []
+    position = 0
+    for bound in HISTOGRAM_BOUNDS:
+        start = position
+        while position < count and ordered[position] <= bound:
+            position += 1
+        histogram.append({'le': bound, 'count': position - start})
+    histogram.append({'le': '+Inf', 'count': count - position})
+
+    total = sum(ordered)
+    return {
+        'count': count,
+        'total': total,
+        'mean': total / count,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': ordered[-1],
+        'histogram': histogram,
+    }
+
+# Timing samples and counters of one scan, filled in by the walker, probe_videos, run_scan and the
+# output code when a ScanTimings is passed to them. Safe to use from several threads.
+#
+# Phases: walk (listing one directory), probe (one file, end to end, measured where it runs) and its
+# parts (native, spawn, wait, parse, info), cache (one cache lookup), match (checking one file
+# against the criteria) and output (writing the results).
+class ScanTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.samples = {}
+        self.counters = {}
+        self.slowest = []
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = array('d')
+            samples.append(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Record one probed file: its total time, its phases and whether it failed
+    def add_file(self, file_path, seconds, phases=(), failed=False):
+        self.add('probe', seconds)
+        for name, phase_seconds in phases:
+            self.add(name, phase_seconds)
+        with self.lock:
+            entry = (seconds, file_path)
+            if len(self.slowest) < SLOWEST_FILES:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+        self.count('probes')
+        if failed:
+            self.count('probe_errors')
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def report(self):
+        with self.lock:
+            end = self.finished if self.finished is not None else time.perf_counter()
+            return {
+                'wall_time': end - self.started,
+                'phases': {name: summarize(samples) for name, samples in self.samples.items()},
+                'counters': dict(self.counters),
+                'slowest_files': [{'path': path, 'seconds': seconds}
+                                  for seconds, path in sorted(self.slowest, reverse=True)],
+            }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write("\n")
+
+# Function to describe a report in a few lines: wall time, then count, total and p50/p95/p99 per phase
+def format_report(report):
+    lines = [f"Wall time: {report['wall_time']:.3f}s"]
+    for name, stats in sorted(report['phases'].items()):
+        if not stats['count']:
+            continue
+        lines.append(f"  {name:<8} {stats['count']:>8} x  total {stats['total']:9.3f}s  "
+                     f"p50 {stats['p50'] * 1000:8.2f}ms  p95 {stats['p95'] * 1000:8.2f}ms  "
+                     f"p99 {stats['p99'] * 1000:8.2f}ms  max {stats['max'] * 1000:8.2f}ms")
+    if report['counters']:
+        lines.append("  " + ", ".join(f"{name}: {value}" for name, value in sorted(report['counters'].items())))
+    return "\n".join(lines)
@@ -0,0 +1,299 @@
+import fnmatch
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Symlink policies: 'skip' ignores every symlink, 'files' follows links to files only (like os.walk),
+# 'follow' also descends into linked directories (each directory is visited once)
+SYMLINK_POLICIES = ('skip', 'files', 'follow')
+
+# Default number of threads listing directories at the same time
+DEFAULT_WALK_WORKERS = 4
+
+# Flags recorded for each directory entry, so a stored listing can be replayed under any policy
+ENTRY_LINK = 1
+ENTRY_DIR = 2
+ENTRY_FILE = 4
+ENTRY_LINK_DIR = 8
+
+# Function to classify a DirEntry; links are resolved once so their target type is known
+def entry_flags(entry):
+    if entry.is_symlink():
+        if entry.is_dir():
+            return ENTRY_LINK | ENTRY_LINK_DIR
+        if entry.is_file():
+            return ENTRY_LINK | ENTRY_FILE
+        return ENTRY_LINK
+    if entry.is_dir(follow_symlinks=False):
+        return ENTRY_DIR
+    if entry.is_file():
+        return ENTRY_FILE
+    return 0
+
+# Function to pick the shard (0 to count - 1) of a file from its path relative to the scan root, so
+# every process and host agrees on the split whatever the mount point or path separator
+def shard_of(relative_path, count):
+    return zlib.crc32(relative_path.replace('\\', '/').encode('utf-8', 'surrogateescape')) % count
+
+# Function to parse a shard given as "I/N" (the I-th of N, from 1) into (index from 0, count); raises ValueError
+def parse_shard(text):
+    try:
+        number, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}'. Use I/N, e.g. 2/4.")
+    if not 1 <= number <= count:
+        raise ValueError(f"Invalid shard '{text}'. I must be between 1 and N.")
+    return number - 1, count
+
+# Stand-in for os.DirEntry when a directory listing comes from a stored snapshot
+class SnapshotEntry:
+    __slots__ = ('path', 'name', '_stat')
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self):
+        return self.stat().st_ino
+
+# Function to get the stat signature (size, mtime_ns, inode) of a DirEntry, reusing its cached stat
+def entry_signature(entry):
+    try:
+        st = entry.stat()
+        return (st.st_size, st.st_mtime_ns, entry.inode() or os.stat(entry.path).st_ino)
+    except OSError:
+        return None
+
+# Streaming directory walker built on os.scandir.
+#
+# Iterating yields (key, DirEntry) for every matching file as soon as its directory has been
+# listed. Keys sort in the same order os.walk would produce (a directory's files, then its
+# subdirectories in listing order), even when subtrees are listed in parallel.
+#
+# With a snapshot store (see MetadataCache.lookup_dir/store_dir), directories whose mtime has not
+# changed since the previous walk are replayed from the stored listing instead of being listed.
+# With a ScanTimings as timer, the time spent on each directory is recorded as the 'walk' phase.
+# With shard=(index, count), only the files of that shard (see shard_of) are yielded; every shard
+# still lists the whole tree, which costs little next to probing.
+class DirectoryWalker:
+    def __init__(self, root, extensions=None, exclude=None, max_depth=None, symlinks='files',
+                 workers=DEFAULT_WALK_WORKERS, cancel_event=None, resume_event=None, snapshot=None, timer=None,
+                 shard=None):
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"Invalid symlink policy: {symlinks}")
+        self.root = root
+        self.extensions = tuple(extensions) if extensions else None
+        self.exclude = [os.path.normcase(pattern) for pattern in (exclude or [])]
+        self.max_depth = max_depth
+        self.symlinks = symlinks
+        self.workers = max(1, workers)
+        self.cancel_event = cancel_event
+        self.resume_event = resume_event
+        self.snapshot = snapshot
+        self.timer = timer
+        self.shard = shard
+        self.visited_dirs = set()
+        self.seen_dirs = set()
+        self.files_found = 0
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+        self.dirs_pending = 0
+        self.errors = 0
+        self.finished = False
+
+    # Estimate of the final file count: files per listed directory times all known directories
+    def estimated_total(self):
+        if self.finished or not self.dirs_listed:
+            return self.files_found
+        return round(self.files_found * (self.dirs_listed + self.dirs_pending) / self.dirs_listed)
+
+    def __iter__(self):
+        if self.workers == 1:
+            return self._walk_serial()
+        return self._walk_parallel()
+
+    def _stopped(self):
+        if self.resume_event is not None:
+            self.resume_event.wait()
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _excluded_dir(self, path):
+        path = os.path.normcase(os.path.join(path, ''))
+        return any(fnmatch.fnmatch(path, pattern) for pattern in self.exclude)
+
+    # Read one directory as (position, name, flags, DirEntry or None) rows, from the snapshot
+    # when the directory is unchanged, otherwise with os.scandir
+    def _read_dir(self, path):
+        if self.snapshot is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.errors += 1
+                return []
+            listing = self.snapshot.lookup_dir(path, st.st_mtime_ns, st.st_ino)
+            if listing is not None:
+                self.dirs_reused += 1
+                return [(position, name, flags, None) for position, name, flags in listing]
+            listed_at = time.time_ns()
+
+        rows = []
+        try:
+            with os.scandir(path) as entries:
+                for position, entry in enumerate(entries):
+                    try:
+                        flags = entry_flags(entry)
+                    except OSError:
+                        self.errors += 1
+                        continue
+                    if flags:
+                        rows.append((position, entry.name, flags, entry))
+        except OSError:
+            self.errors += 1
+            return rows
+        if self.snapshot is not None:
+            self.snapshot.store_dir(path, st.st_mtime_ns, st.st_ino, listed_at,
+                                    [(position, name, flags) for position, name, flags, _ in rows])
+        return rows
+
+    # List one directory; returns (files, subdirs) with their keys. Runs on walker threads.
+    def _list_dir(self, path, key, depth):
+        files = []
+        subdirs = []
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return files, subdirs
+        self.seen_dirs.add(path)
+        started = time.perf_counter()
+        if self.shard is not None:
+            relative_dir = os.path.relpath(path, self.root)
+            prefix = '' if relative_dir == os.curdir else relative_dir + '/'
+        for position, name, flags, entry in self._read_dir(path):
+            if flags & ENTRY_LINK and self.symlinks == 'skip':
+                continue
+            if flags & ENTRY_DIR or (flags & ENTRY_LINK_DIR and self.symlinks == 'follow'):
+                if self.max_depth is not None and depth >= self.max_depth:
+                    continue
+                sub_path = os.path.join(path, name)
+                if self._excluded_dir(sub_path):
+                    continue
+                subdirs.append((key + (1, position), sub_path))
+            elif flags & ENTRY_FILE:
+                if self.extensions and not name.lower().endswith(self.extensions):
+                    continue
+                if self.shard is not None and shard_of(prefix + name, self.shard[1]) != self.shard[0]:
+                    continue
+                if entry is None:
+                    entry = SnapshotEntry(os.path.join(path, name), name)
+                files.append((key + (0, position), entry))
+        if self.timer is not None:
+            self.timer.add('walk', time.perf_counter() - started)
+        return files, subdirs
+
+    # Remember real directories when following links so cycles are walked once
+    def _first_visit(self, path):
+        if self.symlinks != 'follow':
+            return True
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        identity = (st.st_dev, st.st_ino)
+        if identity in self.visited_dirs:
+            return False
+        self.visited_dirs.add(identity)
+        return True
+
+    def _walk_serial(self):
+        stack = [((), self.root, 0)]
+        self.dirs_pending = 1
+        self._first_visit(self.root)
+        while stack:
+            if self._stopped():
+                return
+            key, path, depth = stack.pop()
+            files, subdirs = self._list_dir(path, key, depth)
+            self.dirs_listed += 1
+            self.dirs_pending -= 1
+            # Depth first in listing order: push subdirectories in reverse
+            for sub_key, sub_path in reversed(subdirs):
+                if self._first_visit(sub_path):
+                    stack.append((sub_key, sub_path, depth + 1))
+                    self.dirs_pending += 1
+            for file_key, entry in files:
+                self.files_found += 1
+                yield file_key, entry
+        self.finished = True
+
+    def _walk_parallel(self):
+        results = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        def submit(key, path, depth):
+            self.dirs_pending += 1
+            future = executor.submit(self._list_dir, path, key, depth)
+            future.add_done_callback(lambda f: results.put((f, depth)))
+
+        try:
+            self._first_visit(self.root)
+            submit((), self.root, 0)
+            while self.dirs_pending:
+                if self._stopped():
+                    return
+                future, depth = results.get()
+                self.dirs_listed += 1
+                self.dirs_pending -= 1
+                files, subdirs = future.result()
+                for sub_key, sub_path in subdirs:
+                    if self._first_visit(sub_path):
+                        submit(sub_key, sub_path, depth + 1)
+                for file_key, entry in files:
+                    self.files_found += 1
+                    yield file_key, entry
+            self.finished = True
+        finally:
+            executor.shutdown(wait=False)
+
+# Walker over a list of files (e.g. a manifest) instead of a folder tree, with the same interface
+# as DirectoryWalker: yields ((position,), entry) in list order for the files that exist. Shards are
+# picked from the paths relative to root, or from the paths as listed without one.
+class ManifestWalker:
+    def __init__(self, paths, root=None, shard=None, cancel_event=None, resume_event=None):
+        self.paths = paths
+        self.root = root
+        self.shard = shard
+        self.cancel_event = cancel_event
+        self.resume_event = resume_event
+        self.seen_dirs = set()
+        self.files_found = 0
+        self.errors = 0
+        self.finished = False
+
+    def estimated_total(self):
+        return self.files_found
+
+    def __iter__(self):
+        for position, path in enumerate(self.paths):
+            if self.resume_event is not None:
+                self.resume_event.wait()
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return
+            if self.shard is not None:
+                relative_path = os.path.relpath(path, self.root) if self.root else path
+                if shard_of(relative_path, self.shard[1]) != self.shard[0]:
+                    continue
+            entry = SnapshotEntry(path, os.path.basename(path))
+            try:
+                entry.stat()
+            except OSError:
+                self.errors += 1
+                continue
+            self.files_found += 1
+            yield (position,), entry
+        self.finished = True